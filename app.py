@@ -1,17 +1,26 @@
-import streamlit as st
-import firebase_admin
-from firebase_config import initialize_firebase
-
-from modules.authentication import AuthenticationSystem
-from modules.stores import StoreManagement
-from modules.employees import EmployeeManagement
-from dashboards.owner_dashboard import owner_dashboard
-from dashboards.employee_dashboard import employee_dashboard
-from modules.theme import load_theme, apply_theme
-
-# Inicializar Firebase
-if not firebase_admin._apps:
-    initialize_firebase()
+import logging
+
+from modules import perf
+
+with perf.timed_import("streamlit"):
+    import streamlit as st
+
+# El cliente de almacenamiento (Firebase o SQLite) se crea en el primer acceso a
+# `firebase_config.db`, no al importar: ver firebase_config.get_firestore_client.
+with perf.timed_import("modules.authentication"):
+    from modules.authentication import AuthenticationSystem
+with perf.timed_import("modules.stores"):
+    from modules.stores import StoreManagement
+with perf.timed_import("modules.employees"):
+    from modules.employees import EmployeeManagement
+with perf.timed_import("dashboards.owner_dashboard"):
+    from dashboards.owner_dashboard import owner_dashboard
+with perf.timed_import("dashboards.employee_dashboard"):
+    from dashboards.employee_dashboard import employee_dashboard
+with perf.timed_import("modules.theme"):
+    from modules.theme import load_theme, apply_theme
+from modules.cache import request_scope
+from modules import journal
 
 def main():
     st.set_page_config(page_title="Sistema de Gestión de Tiendas", layout="wide")
@@ -76,17 +85,9 @@ def main():
 
         if st.button("Registrar Tienda"):
             if owner_email and owner_password and store_name:
-                if auth_system.register_user(owner_email, owner_password, 'owner'):
-                    store_id = store_mgmt.create_store(store_name, store_address, owner_email)
-                    if store_id:
-                        user_ref = store_mgmt.db.collection('users').where('email', '==', owner_email).limit(1).get()
-                        if user_ref:
-                            store_mgmt.db.collection('users').document(user_ref[0].id).update({'store_id': store_id})
-                        st.success("¡Tienda registrada exitosamente! Ahora puedes iniciar sesión.")
-                    else:
-                        st.error("Error creando la tienda")
-                else:
-                    st.error("Error registrando el usuario")
+                # Usuario, tienda y enlace en un solo batch (register_owner muestra el error)
+                if auth_system.register_owner(owner_email, owner_password, store_name, store_address):
+                    st.success("¡Tienda registrada exitosamente! Ahora puedes iniciar sesión.")
             else:
                 st.error("Por favor completa todos los campos")
 
@@ -118,4 +119,11 @@ def main():
             st.warning("Rol no reconocido")
 
 if __name__ == "__main__":
-    main()
+    # Una lectura idéntica (documento o consulta) se resuelve una vez por ejecución
+    with request_scope() as read_scope, perf.trace_run() as run_trace:
+        main()
+    logging.getLogger(__name__).debug("Lecturas coalescidas en esta ejecución: %d", read_scope.saved)
+    journal.render_status(st)
+    perf.render_perf_panel(st, run_trace, read_scope.saved)
+    perf.mark_first_render()
+    perf.render_startup_panel(st)
@@ -1,5 +1,113 @@
+import datetime
+
 import streamlit as st
 
+from modules.products import ProductManagement
+from modules.reports import get_report
+from modules.sales import SalesManagement
+
+
+def point_of_sale(user, store_id):
+    """Carrito en session_state: sólo se escribe en la base de datos al cobrar."""
+    st.subheader("🛒 Punto de Venta")
+    cart = st.session_state.setdefault('pos_cart', {})
+    # Catálogo desde la caché/réplica compartida; precios y stock se validan al cobrar
+    products = {p['id']: p for p in ProductManagement().get_products_by_store(store_id) if p.get('active', True)}
+    if not products:
+        st.info("No hay productos en esta tienda")
+        return
+
+    # Lector de código de barras: un SKU se resuelve con una lectura de sku_index
+    with st.form("pos_scan_form", clear_on_submit=True):
+        scanned = st.text_input("Escanear código (SKU)")
+        if st.form_submit_button("Agregar escaneado") and scanned:
+            hit = ProductManagement().get_product_by_sku(store_id, scanned)
+            if hit and hit.get('active', True):
+                cart[hit['id']] = cart.get(hit['id'], 0) + 1
+            else:
+                st.error(f"SKU {scanned} no encontrado")
+
+    with st.form("pos_add_form", clear_on_submit=True):
+        labels = {f"{p.get('name')} ({p.get('sku')}) — ${float(p.get('price', 0)):.2f}": pid for pid, p in products.items()}
+        sel = st.selectbox("Producto", options=list(labels.keys()))
+        qty = st.number_input("Cantidad", min_value=1, value=1, step=1)
+        if st.form_submit_button("Agregar al ticket"):
+            pid = labels[sel]
+            cart[pid] = cart.get(pid, 0) + int(qty)
+
+    if not cart:
+        st.info("El ticket está vacío")
+        return
+
+    total = 0.0
+    for pid, qty in list(cart.items()):
+        p = products.get(pid, {})
+        subtotal = float(p.get('price', 0)) * qty
+        total += subtotal
+        col1, col2, col3 = st.columns([4, 2, 1])
+        with col1:
+            st.write(f"**{p.get('name', pid)}** × {qty}")
+        with col2:
+            st.write(f"${subtotal:.2f}")
+        with col3:
+            if st.button("Quitar", key=f"pos_rm_{pid}"):
+                cart.pop(pid, None)
+                st.rerun()
+    st.metric("Total", f"${total:.2f}")
+
+    col_pay, col_clear = st.columns(2)
+    with col_pay:
+        if st.button("Cobrar", type="primary"):
+            lines = [{'product_id': pid, 'quantity': qty} for pid, qty in cart.items()]
+            sale_id, error = SalesManagement().checkout(store_id, lines, user['email'])
+            if sale_id:
+                cart.clear()
+                st.success(f"Venta registrada (id: {sale_id})")
+            else:
+                st.error(error)
+    with col_clear:
+        if st.button("Vaciar ticket"):
+            cart.clear()
+            st.rerun()
+
+
+def sales_reports(store_id):
+    """Ventas y movimientos de un rango de fechas (ver modules.reports)."""
+    st.subheader("📈 Reportes de Ventas")
+    today = datetime.date.today()
+    col1, col2 = st.columns(2)
+    start = col1.date_input("Desde", today - datetime.timedelta(days=29), key="report_start")
+    end = col2.date_input("Hasta", today, key="report_end")
+    if start > end:
+        st.warning("La fecha inicial es posterior a la final")
+        return
+    with st.spinner("Calculando reporte..."):
+        report = get_report(store_id, start, end)
+    if report is None:
+        st.error("No se pudo generar el reporte")
+        return
+    if not report['movements']:
+        st.info("No hay movimientos en ese rango")
+        return
+
+    col1, col2 = st.columns(2)
+    col1.metric("Movimientos", report['movements'])
+    col2.metric("Unidades vendidas", report['units_sold'])
+
+    period = st.radio("Agrupar ventas por", ["Día", "Semana"], horizontal=True, key="report_period")
+    sales = report['daily'] if period == "Día" else report['weekly']
+    if len(sales):
+        st.bar_chart(sales.groupby('period')['units'].sum())
+        st.dataframe(sales, use_container_width=True, hide_index=True)
+
+    st.write("**Productos con más movimiento**")
+    st.dataframe(report['top_movers'], use_container_width=True, hide_index=True)
+    st.write("**Rotación (vendido / stock medio)**")
+    st.dataframe(report['turnover'], use_container_width=True, hide_index=True)
+    st.write("**Por motivo**")
+    st.dataframe(report['reasons'], use_container_width=True, hide_index=True)
+
+
 def employee_dashboard(user, store_mgmt):
     st.title("👨‍💼 Dashboard del Empleado")
 
@@ -10,9 +118,12 @@ def employee_dashboard(user, store_mgmt):
 
         if user['role'] == 'manager':
             st.write("**Funciones de Gerente:**")
-            st.button("Ver Reportes de Ventas")
+            if st.button("Ver Reportes de Ventas"):
+                st.session_state.show_reports = not st.session_state.get('show_reports', False)
             st.button("Gestionar Inventario")
             st.button("Ver Horarios")
+            if st.session_state.get('show_reports'):
+                sales_reports(user['store_id'])
 
         elif user['role'] == 'employee':
             st.write("**Funciones de Empleado:**")
@@ -22,5 +133,5 @@ def employee_dashboard(user, store_mgmt):
 
         elif user['role'] == 'cashier':
             st.write("**Funciones de Cajero:**")
-            st.button("Punto de Venta")
             st.button("Corte de Caja")
+            point_of_sale(user, user['store_id'])
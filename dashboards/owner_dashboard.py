@@ -1,39 +1,101 @@
+import csv
+import io
+
+import pandas as pd
 import streamlit as st
 
 from modules.autenticacion import AuthenticationSystem
+from modules.catalog_import import import_products, iter_rows
+from modules.concurrency import parallel_load
+from modules.employees import EMPLOYEE_ROLES
 from modules.products import ProductManagement
+from modules.replica import attach_session
+from modules.search import search_products
+from modules.stats import LOW_STOCK_THRESHOLD, get_store_stats
 from modules.theme import save_theme, load_theme, apply_theme
 
+MOVEMENTS_PAGE_SIZE = 25
+EMPLOYEES_PAGE_SIZE = 25
+EMPLOYEE_STATUS_FILTERS = {"Activos": True, "Inactivos": False, "Todos": None}
+SECTIONS = ["📊 Resumen", "👥 Gestión de Empleados", "⚙️ Configuración", "🛒 Productos"]
+
 
 def owner_dashboard(user, store_mgmt, employee_mgmt):
     st.title("🏪 Dashboard del Propietario")
 
-    stores = store_mgmt.get_store_by_owner(user['email'])
+    store_id = user['store_id']
+    prod_mgmt = ProductManagement()
+    # Con APP_REALTIME_REPLICA=1 mantiene viva la réplica en memoria de la tienda
+    attach_session(st.session_state, store_id)
+
+    # Sólo se renderiza (y consulta) la sección activa, a diferencia de st.tabs
+    section = st.radio("Sección", SECTIONS, horizontal=True, key="owner_section", label_visibility="collapsed")
+
+    # Paginación por cursor del historial: pila de tokens de las páginas visitadas
+    if st.session_state.get('mov_pages_store') != store_id:
+        st.session_state.mov_pages_store = store_id
+        st.session_state.mov_page_tokens = [None]
+    page_tokens = st.session_state.mov_page_tokens
+
+    # Directorio de empleados: los filtros se leen del estado de sus widgets y al
+    # cambiar reinician la pila de cursores
+    emp_active = EMPLOYEE_STATUS_FILTERS[st.session_state.get('emp_status_filter', "Activos")]
+    emp_role = st.session_state.get('emp_role_filter', "Todos")
+    emp_role = None if emp_role == "Todos" else emp_role
+    if st.session_state.get('emp_pages_filters') != (store_id, emp_active, emp_role):
+        st.session_state.emp_pages_filters = (store_id, emp_active, emp_role)
+        st.session_state.emp_page_tokens = [None]
+    emp_tokens = st.session_state.emp_page_tokens
+
+    # Lecturas independientes de la sección lanzadas a la vez; las secciones vuelven a
+    # pedir los mismos datos y los obtienen de la coalescencia de la ejecución.
+    loaders = {'stores': lambda: store_mgmt.get_store_by_owner(user['email'])}
+    if section == SECTIONS[0]:
+        loaders['stats'] = lambda: get_store_stats(store_id)
+    elif section == SECTIONS[1]:
+        loaders['employees'] = lambda: employee_mgmt.get_employees_page(
+            store_id, active=emp_active, role=emp_role, page_size=EMPLOYEES_PAGE_SIZE, page_token=emp_tokens[-1])
+        loaders['employee_total'] = lambda: employee_mgmt.count_employees(store_id)
+        loaders['employee_matches'] = lambda: employee_mgmt.count_employees(store_id, active=emp_active, role=emp_role)
+    elif section == SECTIONS[2]:
+        loaders['theme'] = lambda: load_theme(store_id)
+    else:
+        # Sin el catálogo completo: la búsqueda usa su índice y el inventario lee
+        # sólo los productos que tienen entrada
+        loaders['inventory'] = lambda: prod_mgmt.get_inventory_for_store(store_id)
+        loaders['movements'] = lambda: prod_mgmt.get_movements_page(store_id, page_size=MOVEMENTS_PAGE_SIZE, page_token=page_tokens[-1])
+    loaded = parallel_load(loaders)
+
+    stores = loaded['stores']
     if not stores:
         st.warning("No tienes tiendas registradas")
         return
 
     store = stores[0]
-    store_id = user['store_id']
 
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Resumen", "👥 Gestión de Empleados", "⚙️ Configuración", "🛒 Productos"])
-
-    with tab1:
+    if section == SECTIONS[0]:
         st.subheader(f"Tienda: {store['name']}")
         st.write(f"**Dirección:** {store['address']}")
         st.write(f"**Estado:** {'Activa' if store.get('active', True) else 'Inactiva'}")
 
-        employees = employee_mgmt.get_employees_by_store(store_id)
-        st.metric("Total Empleados", len(employees))
+        # Un solo documento (store_stats) en lugar de recorrer empleados e inventario
+        summary = loaded['stats']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Empleados", summary['employee_count'])
+        col2.metric("Productos", summary['sku_count'])
+        col3.metric("Unidades en stock", summary['total_units'])
+        col4, col5 = st.columns(2)
+        col4.metric("Valor del inventario", f"${summary['stock_value']:,.2f}")
+        col5.metric(f"Con stock bajo (≤ {LOW_STOCK_THRESHOLD})", summary['low_stock_count'])
 
-    with tab2:
+    if section == SECTIONS[1]:
         st.subheader("Gestión de Empleados")
         # Formulario para crear usuario + empleado (con contraseña opcional)
         with st.form("create_user_employee_form"):
             st.write("Crear Usuario y Agregar como Empleado")
             cu_email = st.text_input("Email del usuario")
             cu_password = st.text_input("Password (opcional)", type="password")
-            cu_role = st.selectbox("Rol", ["manager", "employee", "cashier"]) 
+            cu_role = st.selectbox("Rol", EMPLOYEE_ROLES)
             if st.form_submit_button("Crear y Agregar"):
                 if cu_email:
                     ok = employee_mgmt.add_employee(cu_email, cu_role, store_id, user['email'], password=cu_password if cu_password else None)
@@ -44,23 +106,58 @@ def owner_dashboard(user, store_mgmt, employee_mgmt):
                 else:
                     st.error("Por favor ingresa un email")
 
+        with st.expander("Alta masiva de empleados (CSV)"):
+            st.caption("Columnas: email, role y opcionalmente password. Sin password se crea con la contraseña temporal; los emails que ya son empleados de la tienda se omiten.")
+            employees_file = st.file_uploader("Archivo de empleados", type=["csv"], key="employees_upload")
+            if employees_file is not None and st.button("Agregar empleados"):
+                stream = io.TextIOWrapper(employees_file, encoding='utf-8-sig', newline='')
+                with st.spinner("Agregando empleados..."):
+                    results = employee_mgmt.add_employees_bulk(store_id, csv.DictReader(stream), user['email'])
+                counts = {status: sum(1 for r in results if r['status'] == status) for status in ('added', 'skipped', 'error')}
+                if counts['error']:
+                    st.error(f"{counts['error']} filas no se pudieron guardar")
+                st.success(f"{counts['added']} empleados agregados, {counts['skipped']} filas omitidas")
+                if results:
+                    st.dataframe(pd.DataFrame(results), use_container_width=True, hide_index=True)
+
         st.subheader("Lista de Empleados")
-        employees = employee_mgmt.get_employees_by_store(store_id)
-        if employees:
-            for emp in employees:
-                col1, col2, col3 = st.columns([3, 2, 1])
-                with col1:
-                    st.write(f"**Email:** {emp['email']}")
-                with col2:
-                    st.write(f"**Rol:** {emp['role']}")
-                with col3:
-                    status = "Activo" if emp.get('active', True) else "Inactivo"
-                    st.write(f"**{status}**")
-                st.divider()
+        filter_status, filter_role = st.columns(2)
+        filter_status.selectbox("Estado", list(EMPLOYEE_STATUS_FILTERS), key="emp_status_filter")
+        filter_role.selectbox("Rol", ["Todos"] + EMPLOYEE_ROLES, key="emp_role_filter")
+
+        # Conteos y página se vuelven a pedir por si el formulario de arriba agregó empleados
+        total = employee_mgmt.count_employees(store_id)
+        matches = employee_mgmt.count_employees(store_id, active=emp_active, role=emp_role)
+        col1, col2 = st.columns(2)
+        col1.metric("Total Empleados", total)
+        col2.metric("Con estos filtros", matches)
+
+        page = employee_mgmt.get_employees_page(
+            store_id, active=emp_active, role=emp_role, page_size=EMPLOYEES_PAGE_SIZE, page_token=emp_tokens[-1])
+        if page['items']:
+            rows = [{
+                'Email': emp.get('email'),
+                'Rol': emp.get('role'),
+                'Estado': "Activo" if emp.get('active', True) else "Inactivo",
+                'Agregado por': emp.get('added_by'),
+            } for emp in page['items']]
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
         else:
-            st.info("No hay empleados registrados")
+            st.info("No hay empleados registrados" if not total else "Ningún empleado coincide con los filtros")
 
-    with tab3:
+        nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+        with nav_prev:
+            if len(emp_tokens) > 1 and st.button("← Anteriores", key="emp_prev"):
+                emp_tokens.pop()
+                st.rerun()
+        with nav_info:
+            st.caption(f"Página {len(emp_tokens)} de {max(1, -(-matches // EMPLOYEES_PAGE_SIZE))}")
+        with nav_next:
+            if page['next_page_token'] and st.button("Siguientes →", key="emp_next"):
+                emp_tokens.append(page['next_page_token'])
+                st.rerun()
+
+    if section == SECTIONS[2]:
         st.subheader("Configuración de la Tienda")
         st.write("Configuraciones adicionales de la tienda...")
         # Theme settings
@@ -97,9 +194,8 @@ def owner_dashboard(user, store_mgmt, employee_mgmt):
         if 'theme_logo' in st.session_state:
             st.image(st.session_state['theme_logo'], use_column_width=False, caption="Logo actual", output_format='PNG', clamp=False)
     # Productos: crear/listar y ajustar stock
-    with tab4:
+    if section == SECTIONS[3]:
         st.subheader("Gestión de Productos y Stock")
-        prod_mgmt = ProductManagement()
 
         with st.form("add_product_form"):
             st.write("Agregar Nuevo Producto")
@@ -110,7 +206,9 @@ def owner_dashboard(user, store_mgmt, employee_mgmt):
             p_initial = st.number_input("Cantidad inicial", min_value=0, value=0)
 
             if st.form_submit_button("Crear Producto"):
-                if p_name and p_sku:
+                if p_name and p_sku and prod_mgmt.get_product_by_sku(store_id, p_sku):
+                    st.error(f"Ya existe un producto con el SKU {p_sku.strip()}")
+                elif p_name and p_sku:
                     product_id = prod_mgmt.create_product(store_id, p_sku, p_name, p_price, p_description, int(p_initial))
                     if product_id:
                         st.success(f"Producto '{p_name}' creado (id: {product_id})")
@@ -119,61 +217,119 @@ def owner_dashboard(user, store_mgmt, employee_mgmt):
                 else:
                     st.error("SKU y Nombre son obligatorios")
 
+        with st.expander("Importar catálogo (CSV / JSONL)"):
+            st.caption("Columnas: sku, name, price y opcionalmente description, quantity. Para catálogos muy grandes usa `tools/import_products.py`.")
+            catalog_file = st.file_uploader("Archivo de catálogo", type=["csv", "jsonl"], key="catalog_upload")
+            if catalog_file is not None and st.button("Importar catálogo"):
+                fmt = 'jsonl' if catalog_file.name.lower().endswith('.jsonl') else 'csv'
+                progress = st.empty()
+
+                def show_progress(report):
+                    progress.write(f"{report.rows} filas procesadas — {report.imported} importadas — {report.rows_per_sec:.0f} filas/s")
+
+                stream = io.TextIOWrapper(catalog_file, encoding='utf-8-sig', newline='')
+                report = import_products(store_id, iter_rows(stream, fmt), user_email=user['email'], on_progress=show_progress)
+                if report.failed_writes:
+                    st.error(f"{report.failed_writes} escrituras fallaron; revisa los logs")
+                else:
+                    st.success(f"{report.imported} productos importados en {report.elapsed:.1f}s")
+                for err in report.errors:
+                    st.warning(err)
+
         # Edición de producto
         st.markdown("---")
         st.subheader("Editar Producto")
-        prods = prod_mgmt.get_products_by_store(store_id)
+        # Búsqueda en el índice en memoria: sólo se listan las coincidencias
+        query = st.text_input("Buscar producto (nombre o SKU)", key="edit_product_query")
+        prods = search_products(store_id, query) if query else []
         if prods:
-            prod_options = {f"{p.get('name')} ({p.get('sku')})": p.get('id') for p in prods}
+            prod_options = {f"{p.get('name')} ({p.get('sku')})": p['id'] for p in prods}
             sel = st.selectbox("Selecciona producto", options=list(prod_options.keys()))
             sel_id = prod_options.get(sel)
-            if sel_id:
-                p_data = prod_mgmt.get_product_by_id(sel_id)
-                if p_data:
-                    with st.form("edit_product_form"):
-                        e_name = st.text_input("Nombre", value=p_data.get('name'))
-                        e_sku = st.text_input("SKU", value=p_data.get('sku'))
-                        e_price = st.number_input("Precio", min_value=0.0, value=float(p_data.get('price', 0.0)), format="%.2f")
-                        e_desc = st.text_area("Descripción", value=p_data.get('description', ''))
-                        if st.form_submit_button("Guardar Cambios"):
-                            updates = {'name': e_name, 'sku': e_sku, 'price': float(e_price), 'description': e_desc}
-                            if prod_mgmt.update_product(sel_id, updates):
-                                st.success("Producto actualizado")
-                            else:
-                                st.error("Error actualizando producto")
-        else:
-            st.info("No hay productos para editar")
+            # El índice de búsqueda puede ir atrasado: el formulario se llena con el
+            # documento actual (una lectura), para no pisar cambios de otra sesión
+            p_data = prod_mgmt.get_product_by_id(sel_id, fresh=True) if sel_id else None
+            if sel_id and not p_data:
+                st.warning("El producto ya no existe")
+            if p_data:
+                with st.form("edit_product_form"):
+                    e_name = st.text_input("Nombre", value=p_data.get('name'))
+                    e_sku = st.text_input("SKU", value=p_data.get('sku'))
+                    e_price = st.number_input("Precio", min_value=0.0, value=float(p_data.get('price', 0.0)), format="%.2f")
+                    e_desc = st.text_area("Descripción", value=p_data.get('description', ''))
+                    if st.form_submit_button("Guardar Cambios"):
+                        updates = {'name': e_name, 'sku': e_sku, 'price': float(e_price), 'description': e_desc}
+                        if prod_mgmt.update_product(sel_id, updates, store_id=store_id):
+                            st.success("Producto actualizado")
+                        else:
+                            st.error("Error actualizando producto (¿SKU ya usado por otro producto?)")
+        elif query:
+            st.info("Ningún producto coincide con la búsqueda")
 
         st.markdown("---")
         st.subheader("Inventario actual")
         inv = prod_mgmt.get_inventory_for_store(store_id)
         if inv:
-            for item in inv:
-                cols = st.columns([3, 1, 1, 2])
-                with cols[0]:
-                    st.write(f"**{item.get('name') or item.get('sku')}**")
-                    st.write(f"SKU: {item.get('sku')}")
-                with cols[1]:
-                    st.write(f"Cantidad: {item.get('quantity')}")
-                with cols[2]:
-                    change = st.number_input(f"Ajuste {item.get('product_id')}", value=0, step=1, key=f"chg_{item.get('product_id')}")
-                with cols[3]:
-                    if st.button("Aplicar", key=f"btn_{item.get('product_id')}"):
-                        if change != 0:
-                            ok = prod_mgmt.adjust_stock(item['product_id'], store_id, change, 'manual_adjust', user['email'])
-                            if ok:
-                                st.success("Ajuste aplicado")
-                            else:
-                                st.error("Error aplicando ajuste")
+            # Tabla editable: sólo se envían las filas con ajuste distinto de 0, en un único envío
+            grid = pd.DataFrame([{
+                'product_id': item['product_id'],
+                'Producto': item.get('name') or item.get('sku'),
+                'SKU': item.get('sku'),
+                'Cantidad': item.get('quantity'),
+                'Ajuste': 0,
+            } for item in inv])
+            with st.form("bulk_adjust_form"):
+                edited = st.data_editor(
+                    grid,
+                    hide_index=True,
+                    use_container_width=True,
+                    disabled=['product_id', 'Producto', 'SKU', 'Cantidad'],
+                    column_config={
+                        'product_id': None,
+                        'Ajuste': st.column_config.NumberColumn("Ajuste", step=1, format="%d"),
+                    },
+                    key="inventory_grid",
+                )
+                submitted = st.form_submit_button("Aplicar todos los ajustes")
+            if submitted:
+                changed = edited[edited['Ajuste'].fillna(0).astype(int) != 0]
+                if changed.empty:
+                    st.info("Ingrese una cantidad distinta de 0 para ajustar")
+                else:
+                    changes = [
+                        {'product_id': row['product_id'], 'change': int(row['Ajuste']), 'product_name': row['Producto']}
+                        for _, row in changed.iterrows()
+                    ]
+                    applied = prod_mgmt.adjust_stock_bulk(store_id, changes, 'manual_adjust', user['email'])
+                    if applied == len(changes):
+                        st.success(f"{applied} ajustes aplicados")
+                    else:
+                        st.error(f"Se aplicaron {applied} de {len(changes)} ajustes; revisa los logs")
+
+            with st.expander("Contador distribuido (productos con muchas ventas simultáneas)"):
+                st.caption("Reparte los ajustes de stock de un producto entre varios documentos para soportar muchas escrituras por segundo.")
+                inv_options = {f"{item.get('name') or item.get('sku')} ({'distribuido, ' + str(item['shards']) + ' shards' if item.get('shards') else 'simple'})": item for item in inv}
+                inv_sel = inv_options[st.selectbox("Producto", options=list(inv_options.keys()), key="shard_product")]
+                if inv_sel.get('shards'):
+                    if st.button("Volver a contador simple", key="shard_disable"):
+                        if prod_mgmt.disable_sharding(inv_sel['product_id'], store_id):
+                            st.success("Contador simple restaurado")
                         else:
-                            st.info("Ingrese una cantidad distinta de 0 para ajustar")
-                st.divider()
+                            st.error("Error cambiando el contador")
+                else:
+                    n_shards = st.number_input("Shards", min_value=2, max_value=100, value=10, key="shard_count")
+                    if st.button("Activar contador distribuido", key="shard_enable"):
+                        if prod_mgmt.enable_sharding(inv_sel['product_id'], store_id, int(n_shards)):
+                            st.success("Contador distribuido activado")
+                        else:
+                            st.error("Error cambiando el contador")
         else:
             st.info("No hay inventario registrado para esta tienda")
 
         st.markdown("---")
         st.subheader("Historial de Movimientos")
-        movements = prod_mgmt.get_movements_by_store(store_id, limit=100)
+        page = prod_mgmt.get_movements_page(store_id, page_size=MOVEMENTS_PAGE_SIZE, page_token=page_tokens[-1])
+        movements = page['items']
         if movements:
             for m in movements:
                 t = m.get('timestamp')
@@ -184,3 +340,15 @@ def owner_dashboard(user, store_mgmt, employee_mgmt):
                 st.divider()
         else:
             st.info("No hay movimientos registrados")
+
+        nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+        with nav_prev:
+            if len(page_tokens) > 1 and st.button("← Anteriores", key="mov_prev"):
+                page_tokens.pop()
+                st.rerun()
+        with nav_info:
+            st.caption(f"Página {len(page_tokens)}")
+        with nav_next:
+            if page['next_page_token'] and st.button("Siguientes →", key="mov_next"):
+                page_tokens.append(page['next_page_token'])
+                st.rerun()
@@ -1,14 +1,59 @@
+import importlib
 import os
 import logging
-from typing import Optional
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Optional
 
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
+if TYPE_CHECKING:  # pragma: no cover
+    import firebase_admin
 
 logger = logging.getLogger(__name__)
 
 
-def initialize_firebase() -> firebase_admin.App:
+class _LazyModule:
+    """Módulo que se importa al acceder al primer atributo.
+
+    `firebase_admin.firestore` arrastra gRPC y google-cloud-firestore (cientos de ms);
+    los módulos sólo necesitan sus constantes (SERVER_TIMESTAMP, Increment, Query)
+    al escribir, no al importarse.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+class _LazyClient:
+    """Proxy del cliente de almacenamiento: lo crea en el primer uso y lo comparte."""
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(get_firestore_client(), attr)
+
+
+# `from firebase_config import db, firestore` no inicializa nada al importarse
+firestore = _LazyModule("firebase_admin.firestore")
+db = _LazyClient()
+
+# Backend de almacenamiento: 'firestore' (por defecto) o 'sqlite' (archivo local,
+# ver sqlite_storage.py). SQLITE_DB_PATH indica el archivo del backend local.
+DEFAULT_SQLITE_PATH = "local_store.db"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def storage_backend() -> str:
+    """Nombre del backend configurado en la variable de entorno STORAGE_BACKEND."""
+    return os.environ.get("STORAGE_BACKEND", "firestore").strip().lower()
+
+
+def initialize_firebase() -> "firebase_admin.App":
     """Inicializa la conexión con Firebase usando credenciales de cuenta de servicio.
 
     Busca la ruta de las credenciales en la variable de entorno
@@ -18,6 +63,9 @@ def initialize_firebase() -> firebase_admin.App:
     Devuelve la instancia de `firebase_admin.App` si la inicialización es exitosa.
     Lanza RuntimeError si no puede inicializarse.
     """
+    import firebase_admin
+    from firebase_admin import credentials
+
     cred_path = (
         os.environ.get("FIREBASE_CREDENTIALS")
         or os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
@@ -49,13 +97,68 @@ def initialize_firebase() -> firebase_admin.App:
         raise
 
 
-def get_firestore_client():
-    """Devuelve una instancia del cliente Firestore asegurando que Firebase esté inicializado."""
+def _create_client():
+    if storage_backend() == "sqlite":
+        from sqlite_storage import SQLiteClient
+
+        path = os.environ.get("SQLITE_DB_PATH", DEFAULT_SQLITE_PATH)
+        logger.info("Usando backend SQLite local: %s", path)
+        return SQLiteClient(path)
     initialize_firebase()
     return firestore.client()
 
 
+def get_firestore_client():
+    """Devuelve el cliente de almacenamiento configurado, creado una sola vez por proceso.
+
+    Con STORAGE_BACKEND=sqlite es un `sqlite_storage.SQLiteClient`, que implementa la
+    misma interfaz sobre un archivo local; en otro caso el cliente Firestore,
+    inicializando Firebase si hace falta. Los módulos usan el proxy `db`, que llama
+    a esta función en su primer acceso.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                started = time.perf_counter()
+                _client = _create_client()
+                from modules import perf
+
+                if perf.TRACE_FIRESTORE:
+                    _client = perf.instrument(_client)
+                perf.record_startup("cliente de almacenamiento", time.perf_counter() - started)
+    return _client
+
+
+def run_transaction(fn):
+    """Ejecuta `fn(transaction)` en una transacción del backend configurado.
+
+    Firestore reintenta `fn` si otra escritura toca lo leído antes del commit;
+    el backend SQLite la ejecuta con el archivo bloqueado.
+    """
+    transaction = db.transaction()
+    # El envoltorio de `modules.perf` define `run` siempre: se mira el objeto envuelto
+    if hasattr(getattr(transaction, '_target', transaction), 'run'):
+        return transaction.run(fn)
+    return firestore.transactional(fn)(transaction)
+
+
+def already_exists_error() -> type:
+    """Excepción `AlreadyExists` del backend, importada al usarla.
+
+    `google.api_core` arrastra gRPC: los módulos la piden en su cláusula `except`
+    (`except already_exists_error():`), que sólo se evalúa si hay una excepción.
+    """
+    try:
+        from google.api_core.exceptions import AlreadyExists
+    except Exception:  # pragma: no cover - backend SQLite sin google-cloud
+        from sqlite_storage import AlreadyExists
+    return AlreadyExists
+
+
 def get_auth_client():
     """Devuelve el módulo de autenticación de Firebase (requiere inicialización)."""
     initialize_firebase()
+    from firebase_admin import auth
+
     return auth
@@ -1,24 +1,92 @@
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+import logging
+
 import streamlit as st
-from firebase_admin import firestore
-from firebase_config import get_firestore_client
+from firebase_config import already_exists_error, db, firestore
+from modules.cache import invalidate
+from modules.passwords import hash_password, needs_rehash, verify_password
+
+logger = logging.getLogger(__name__)
+
+# Usuarios creados antes de indexar por email (id automático): se buscan con una
+# consulta si el documento por email no existe. Con APP_LEGACY_USER_LOOKUP=0, tras
+# ejecutar tools/migrate_user_ids.py, un login es siempre una sola lectura.
+LEGACY_USER_LOOKUP = os.environ.get('APP_LEGACY_USER_LOOKUP', '1') != '0'
+
+
+def normalize_email(email: str) -> str:
+    return (email or '').strip().lower()
+
+
+def user_doc_id(email: str) -> str:
+    """Id del documento de usuario: el email normalizado ('/' no es válido en un id)."""
+    return quote(normalize_email(email), safe='@+')
+
+
+def user_ref(email: str):
+    return db.collection('users').document(user_doc_id(email))
+
+
+def find_user(email: str):
+    """Snapshot del usuario con ese email, o None.
+
+    Una lectura directa de `users/{email}`; para usuarios antiguos con id automático
+    hace además una consulta por email (ver LEGACY_USER_LOOKUP).
+    """
+    snap = user_ref(email).get()
+    if snap.exists:
+        return snap
+    if LEGACY_USER_LOOKUP:
+        for candidate in {email.strip(), normalize_email(email)}:
+            legacy = db.collection('users').where('email', '==', candidate).limit(1).get()
+            if legacy:
+                return legacy[0]
+    return None
+
+
+def user_document(email: str, password: Optional[str], role: str, store_id: Optional[str] = None,
+                  password_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Datos de un usuario nuevo, tal como se guardan en `users/{email}` (contraseña hasheada).
+
+    `password_hash` evita recalcular el hash si ya se calculó (ver `hash_passwords`).
+    """
+    return {
+        'email': normalize_email(email),
+        'password': password_hash or hash_password(password),
+        'role': role,
+        'store_id': store_id,
+        'created_at': firestore.SERVER_TIMESTAMP
+    }
 
-db = get_firestore_client()
 
 class AuthenticationSystem:
     def __init__(self):
         self.current_user = None
 
     def login(self, email, password):
-        """Simula un login básico (sin Auth REST API)."""
+        """Login contra `users/{email}` (sin Auth REST API): una lectura y un hash.
+
+        Si la contraseña guardada está en texto plano o con otros parámetros de hash,
+        se reemplaza por el hash actual (ver modules.passwords).
+        """
         try:
-            user_ref = db.collection('users').where('email', '==', email).limit(1).get()
+            snap = find_user(email)
 
-            if user_ref:
-                user_data = user_ref[0].to_dict()
-                if user_data.get('password') == password:  # En producción usar hash
+            if snap is not None:
+                user_data = snap.to_dict()
+                stored = user_data.get('password')
+                if verify_password(password, stored):
+                    if needs_rehash(stored):
+                        try:
+                            snap.reference.update({'password': hash_password(password)})
+                        except Exception:
+                            logger.exception("No se pudo actualizar el hash de contraseña de %s", snap.id)
                     self.current_user = {
-                        'uid': user_ref[0].id,
-                        'email': email,
+                        'uid': snap.id,
+                        'email': user_data.get('email', email),
                         'role': user_data.get('role', 'user'),
                         'store_id': user_data.get('store_id')
                     }
@@ -29,20 +97,47 @@ class AuthenticationSystem:
             return False
 
     def register_user(self, email, password, role, store_id=None):
+        """Crea `users/{email}`; con `create`, dos registros simultáneos no se pisan."""
         try:
-            user_data = {
-                'email': email,
-                'password': password,  # En producción: hashear
-                'role': role,
-                'store_id': store_id,
-                'created_at': firestore.SERVER_TIMESTAMP
-            }
-            db.collection('users').add(user_data)
+            if LEGACY_USER_LOOKUP and find_user(email) is not None:
+                st.error("Ya existe un usuario con ese email")
+                return False
+            user_ref(email).create(user_document(email, password, role, store_id))
             return True
+        except already_exists_error():
+            st.error("Ya existe un usuario con ese email")
+            return False
         except Exception as e:
             st.error(f"Error registrando usuario: {e}")
             return False
 
+    def register_owner(self, email, password, store_name, store_address) -> Optional[str]:
+        """Registra propietario y tienda en un solo batch; devuelve el id de la tienda.
+
+        El usuario se crea con `create` y ya enlazado a la tienda: si el email existe
+        el batch entero falla y no queda una tienda huérfana.
+        """
+        from modules.stores import new_store_data
+
+        try:
+            if LEGACY_USER_LOOKUP and find_user(email) is not None:
+                st.error("Ya existe un usuario con ese email")
+                return None
+            owner_email = normalize_email(email)
+            store_ref = db.collection('stores').document()
+            batch = db.batch()
+            batch.create(user_ref(email), user_document(email, password, 'owner', store_ref.id))
+            batch.set(store_ref, new_store_data(store_name, store_address, owner_email))
+            batch.commit()
+            invalidate(('stores_by_owner', owner_email))
+            return store_ref.id
+        except already_exists_error():
+            st.error("Ya existe un usuario con ese email")
+            return None
+        except Exception as e:
+            st.error(f"Error registrando la tienda: {e}")
+            return None
+
     def logout(self):
         self.current_user = None
         st.session_state.clear()
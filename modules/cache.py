@@ -0,0 +1,185 @@
+"""Caché de lecturas compartida entre sesiones (LRU + TTL, por proceso).
+
+Streamlit re-ejecuta el script en cada interacción, así que las lecturas de tienda,
+tema, catálogo, inventario y empleados se sirven desde aquí. Las claves son tuplas
+`(espacio, id)`, p. ej. ('products', store_id), y cada escritura invalida
+exactamente las claves que afecta. No usamos `st.cache_data` porque sólo permite
+vaciar una función entera, no una tienda concreta.
+
+APP_CACHE_TTL (segundos, por defecto 60) acota cuánto puede verse un cambio hecho
+por otro proceso; APP_CACHE_MAX_ENTRIES (por defecto 1024) acota la memoria.
+
+Además, `request_scope()` abre un contexto por ejecución del script: dentro de él
+cada clave se resuelve una sola vez aunque la caché compartida caduque o no aplique
+(p. ej. la misma lectura en dos pestañas del dashboard), y `ReadScope.saved` cuenta
+las lecturas ahorradas.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+DEFAULT_TTL = float(os.environ.get('APP_CACHE_TTL', '60'))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('APP_CACHE_MAX_ENTRIES', '1024'))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU con caducidad por entrada, seguro entre hilos (una sesión = un hilo)."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Aumenta con cada invalidación: un valor cargado antes de una invalidación
+        # concurrente (p. ej. desde el hilo del journal) no debe guardarse después.
+        self.epoch = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, epoch: Optional[int] = None):
+        """Guarda `value`; con `epoch`, sólo si no hubo invalidaciones desde entonces."""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable):
+        with self._lock:
+            self.epoch += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def invalidate_namespace(self, namespace: str):
+        """Elimina todas las claves `(namespace, ...)`; para cuando no se conoce el id."""
+        with self._lock:
+            self.epoch += 1
+            for key in [k for k in self._data if isinstance(k, tuple) and k and k[0] == namespace]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._data.clear()
+
+
+cache = TTLCache()
+
+
+class ReadScope:
+    """Lecturas ya resueltas durante una ejecución del script."""
+
+    def __init__(self):
+        self.values: Dict[Hashable, Any] = {}
+        self.saved = 0
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Valor ya leído en esta ejecución (sin copiar, sólo lectura) o `default`."""
+        return self.values.get(key, default)
+
+
+_scope: ContextVar[Optional[ReadScope]] = ContextVar('read_scope', default=None)
+
+
+@contextmanager
+def request_scope() -> Iterator[ReadScope]:
+    """Abre el contexto de coalescencia de lecturas de una ejecución del script."""
+    scope = ReadScope()
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Optional[ReadScope]:
+    return _scope.get()
+
+
+def read_through(key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+    """Devuelve una copia del valor en caché o lo carga con `loader` y lo guarda.
+
+    Dentro de `request_scope()` la primera resolución de la clave se reutiliza durante
+    toda la ejecución. Las excepciones de `loader` se propagan y no se cachean, de modo
+    que un error transitorio nunca queda guardado como "lista vacía". Se devuelven
+    copias para que el llamador pueda modificar el resultado sin alterar la caché.
+    """
+    scope = _scope.get()
+    if scope is not None and key in scope.values:
+        scope.saved += 1
+        return copy.deepcopy(scope.values[key])
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        epoch = cache.epoch
+        value = loader()
+        cache.set(key, value, ttl, epoch=epoch)
+    if scope is not None:
+        scope.values[key] = value
+    return copy.deepcopy(value)
+
+
+def coalesce(key: Hashable, loader: Callable[[], Any]) -> Any:
+    """Como `read_through` pero sólo dentro de la ejecución actual, sin caché compartida.
+
+    Para lecturas que deben verse siempre frescas entre ejecuciones (p. ej. una
+    página del historial) pero que varias partes de una misma ejecución repiten.
+    """
+    scope = _scope.get()
+    if scope is None:
+        return loader()
+    if key in scope.values:
+        scope.saved += 1
+    else:
+        scope.values[key] = loader()
+    return copy.deepcopy(scope.values[key])
+
+
+def invalidate(*keys: Hashable):
+    """Invalida las claves en la caché compartida y en la ejecución en curso."""
+    cache.invalidate(*keys)
+    scope = _scope.get()
+    if scope is not None:
+        for key in keys:
+            scope.values.pop(key, None)
+
+
+def forget_in_scope(*keys: Hashable):
+    """Olvida claves sólo en la ejecución en curso; la próxima lectura va a la caché compartida.
+
+    Para cuando otro hilo pudo invalidar la caché compartida después de que esta
+    ejecución leyera el valor.
+    """
+    scope = _scope.get()
+    if scope is not None:
+        for key in keys:
+            scope.values.pop(key, None)
+
+
+def invalidate_namespace(namespace: str):
+    cache.invalidate_namespace(namespace)
+    scope = _scope.get()
+    if scope is not None:
+        for key in [k for k in scope.values if isinstance(k, tuple) and k and k[0] == namespace]:
+            del scope.values[key]
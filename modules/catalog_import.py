@@ -0,0 +1,322 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from firebase_config import db, firestore
+from modules import search, stats
+from modules.cache import invalidate, invalidate_namespace
+from modules.products import BATCH_LIMIT, PRODUCT_FETCH_CHUNK, inventory_doc_id, sku_index_entry, sku_index_id
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántas filas se vacía el writer y se guarda el checkpoint
+CHECKPOINT_EVERY = 500
+# Máximo de errores de validación que se conservan en el reporte (el contador es exacto)
+MAX_REPORTED_ERRORS = 100
+
+
+def product_doc_id(store_id: str, sku: str) -> str:
+    """Id determinista de un producto importado: reimportar la misma fila no duplica."""
+    digest = hashlib.sha1(f"{store_id}\x00{sku}".encode('utf-8')).hexdigest()[:20]
+    return f"imp_{digest}"
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    imported: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    failed_writes: int = 0
+    errors: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, msg: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(msg)
+
+
+def iter_rows(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Itera (número de fila, dict) leyendo el archivo fila a fila, sin cargarlo entero.
+
+    `fmt` es 'csv' (con cabecera sku,name,price,description,quantity) o 'jsonl'.
+    Las líneas JSON inválidas se devuelven como {'_error': mensaje}.
+    """
+    if fmt == 'csv':
+        for line_no, row in enumerate(csv.DictReader(stream), start=1):
+            yield line_no, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, {'_error': f"JSON inválido: {e}"}
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def validate_row(row: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Normaliza una fila. Devuelve (datos, None) o (None, motivo del rechazo)."""
+    if row.get('_error'):
+        return None, row['_error']
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        return None, "SKU vacío"
+    name = str(row.get('name') or '').strip()
+    if not name:
+        return None, f"SKU {sku}: nombre vacío"
+    try:
+        price = float(row.get('price'))
+    except (TypeError, ValueError):
+        return None, f"SKU {sku}: precio inválido {row.get('price')!r}"
+    if price < 0:
+        return None, f"SKU {sku}: precio negativo"
+    try:
+        quantity = int(float(row.get('quantity') or 0))
+    except (TypeError, ValueError):
+        return None, f"SKU {sku}: cantidad inválida {row.get('quantity')!r}"
+    if quantity < 0:
+        return None, f"SKU {sku}: cantidad negativa"
+    return {
+        'sku': sku,
+        'name': name,
+        'price': price,
+        'description': str(row.get('description') or ''),
+        'quantity': quantity,
+    }, None
+
+
+class _ChunkedBatchWriter:
+    """Misma interfaz mínima que BulkWriter (set/flush/close) usando batches de BATCH_LIMIT."""
+
+    def __init__(self, client):
+        self._client = client
+        self._batch = client.batch()
+        self._ops = 0
+        self.failed = 0
+
+    def set(self, ref, data, merge: bool = False):
+        if self._ops >= BATCH_LIMIT:
+            self.flush()
+        self._batch.set(ref, data, merge=merge)
+        self._ops += 1
+
+    def flush(self):
+        if not self._ops:
+            return
+        try:
+            self._batch.commit()
+        except Exception:
+            logger.exception("Error confirmando batch de importación (%d escrituras)", self._ops)
+            self.failed += self._ops
+        self._batch = self._client.batch()
+        self._ops = 0
+
+    def close(self):
+        self.flush()
+
+
+def _open_writer():
+    """BulkWriter de Firestore si el cliente lo ofrece; si no, batches en bloques."""
+    if hasattr(db, 'bulk_writer'):
+        writer = db.bulk_writer()
+        writer.failed = 0
+
+        def on_error(error, _writer) -> bool:
+            # BulkWriter reintenta con backoff hasta 10 veces antes de rendirse
+            if error.attempts < 10:
+                return True
+            writer.failed += 1
+            logger.error("Escritura fallida en importación: %s", error.message)
+            return False
+
+        writer.on_write_error(on_error)
+        return writer
+    return _ChunkedBatchWriter(db)
+
+
+def read_checkpoint(path: Optional[str]) -> int:
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return int(json.load(f).get('last_row', 0))
+    except Exception:
+        logger.exception("Checkpoint ilegible en %s; se empieza desde el principio", path)
+        return 0
+
+
+def write_checkpoint(path: Optional[str], last_row: int):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'last_row': last_row}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _existing_docs(refs) -> Dict[str, Dict[str, Any]]:
+    """{ruta: datos} de los documentos de `refs` que existen, con get_all en bloques."""
+    found: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(refs), PRODUCT_FETCH_CHUNK):
+        for snap in db.get_all(refs[i:i + PRODUCT_FETCH_CHUNK]):
+            if snap.exists:
+                found[snap.reference.path] = snap.to_dict()
+    return found
+
+
+def _write_rows(writer, store_id: str, rows: List[Tuple[int, Dict[str, Any]]], user_email: str, report: ImportReport):
+    """Encola las escrituras de un bloque de filas válidas.
+
+    Productos y entradas de `sku_index` del bloque se leen antes en una sola tanda.
+    Una fila cuyo SKU ya pertenece a otro producto de la tienda (p. ej. creado a mano)
+    se rechaza como duplicada. Los productos que ya existen (reimportación) sólo
+    actualizan sku, nombre, precio y descripción; inventario, movimiento 'initial',
+    `created_at` y `active` se escriben únicamente al crearlos.
+    """
+    products = db.collection('products')
+    sku_index = db.collection('sku_index')
+    refs = []
+    for _, data in rows:
+        refs.append(products.document(product_doc_id(store_id, data['sku'])))
+        refs.append(sku_index.document(sku_index_id(store_id, data['sku'])))
+    existing = _existing_docs(refs)
+    for line_no, data in rows:
+        product_id = product_doc_id(store_id, data['sku'])
+        prod_ref = products.document(product_id)
+        index_ref = sku_index.document(sku_index_id(store_id, data['sku']))
+        entry = existing.get(index_ref.path)
+        if entry is not None and entry.get('product_id') != product_id:
+            report.add_error(f"Fila {line_no}: SKU duplicado")
+            continue
+        fields = {
+            'store_id': store_id,
+            'sku': data['sku'],
+            'name': data['name'],
+            'price': data['price'],
+            'description': data['description'],
+        }
+        if prod_ref.path in existing:
+            product = {**existing[prod_ref.path], **fields}
+            writer.set(prod_ref, fields, merge=True)
+        else:
+            product = {**fields, 'created_at': firestore.SERVER_TIMESTAMP, 'active': True}
+            writer.set(prod_ref, product)
+            # Una fila repetida más abajo en el mismo bloque ya no es un alta
+            existing[prod_ref.path] = product
+            if data['quantity']:
+                writer.set(db.collection('inventory').document(inventory_doc_id(store_id, product_id)), {
+                    'product_id': product_id,
+                    'store_id': store_id,
+                    'quantity': data['quantity'],
+                    'updated_at': firestore.SERVER_TIMESTAMP,
+                }, merge=True)
+                writer.set(db.collection('movements').document(f"{product_id}__initial"), {
+                    'product_id': product_id,
+                    'product_name': data['name'],
+                    'store_id': store_id,
+                    'change': data['quantity'],
+                    'reason': 'initial',
+                    'user': user_email,
+                    'timestamp': firestore.SERVER_TIMESTAMP,
+                })
+        # `set` y no `create`: la entrada no existe o ya es de este producto
+        writer.set(index_ref, sku_index_entry(product_id, product))
+        report.imported += 1
+
+
+def import_products(
+    store_id: str,
+    rows: Iterator[Tuple[int, Dict[str, Any]]],
+    user_email: str = 'system',
+    checkpoint_path: Optional[str] = None,
+    on_progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """Importa productos, inventario inicial y movimientos 'initial' en streaming.
+
+    Las filas se procesan en bloques de CHECKPOINT_EVERY con ids deterministas
+    (producto, inventario y movimiento): reimportar una fila sólo actualiza los
+    datos del producto, sin tocar su stock ni su movimiento inicial. Al terminar se
+    recalcula el resumen de la tienda (`modules.stats`). Con `checkpoint_path` se
+    guarda la última fila confirmada tras cada bloque y, al reanudar, las filas
+    anteriores se saltan; si un bloque tuvo escrituras fallidas el checkpoint deja de
+    avanzar, así que reanudar las reintenta. La memoria no depende del tamaño del archivo.
+    """
+    report = ImportReport()
+    resume_after = read_checkpoint(checkpoint_path)
+    writer = _open_writer()
+    started = time.perf_counter()
+    last_row = resume_after
+    block: List[Tuple[int, Dict[str, Any]]] = []
+    block_start: Optional[int] = None
+    failed_from: Optional[int] = None
+
+    def commit_block(block_end: int):
+        nonlocal last_row, block_start, failed_from
+        failed_before = writer.failed
+        if block:
+            _write_rows(writer, store_id, block, user_email, report)
+            block.clear()
+        writer.flush()
+        if writer.failed != failed_before and failed_from is None:
+            failed_from = block_start
+        # Tras la primera escritura fallida el checkpoint no pasa de ese bloque
+        if failed_from is None and block_end > last_row:
+            last_row = block_end
+            write_checkpoint(checkpoint_path, last_row)
+        block_start = None
+
+    line_no = resume_after
+    for line_no, row in rows:
+        report.rows += 1
+        if line_no <= resume_after:
+            report.skipped += 1
+            continue
+        if block_start is None:
+            block_start = line_no
+        data, error = validate_row(row)
+        if error:
+            report.add_error(f"Fila {line_no}: {error}")
+        else:
+            block.append((line_no, data))
+
+        if report.rows % CHECKPOINT_EVERY == 0:
+            commit_block(line_no)
+            report.elapsed = time.perf_counter() - started
+            if on_progress:
+                on_progress(report)
+
+    commit_block(line_no)
+    writer.close()
+    if failed_from is not None:
+        report.errors.append(f"Escrituras fallidas desde la fila {failed_from}: el checkpoint quedó antes; "
+                             "repite la importación para reintentarlas")
+    invalidate(('products', store_id), ('inventory', store_id))
+    invalidate_namespace('movements')
+    invalidate_namespace('sku')
+    search.drop(store_id)
+    # La importación no lleva la cuenta de cambios por fila: el resumen se recalcula entero
+    try:
+        stats.recompute_store_stats(store_id)
+    except Exception:
+        logger.exception("Error recalculando el resumen de la tienda %s", store_id)
+    report.failed_writes = writer.failed
+    report.elapsed = time.perf_counter() - started
+    if on_progress:
+        on_progress(report)
+    return report
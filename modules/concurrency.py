@@ -0,0 +1,50 @@
+"""Ejecución en paralelo de lecturas independientes.
+
+Las lecturas de una página (tienda, empleados, catálogo, inventario, movimientos...)
+son round trips independientes; lanzadas a la vez la página tarda lo que la más
+lenta y no la suma de todas. Cada tarea corre con una copia del contexto del
+llamador, de modo que comparte la coalescencia de lecturas de la ejecución
+(`modules.cache.request_scope`) y las trazas (`modules.perf.trace_run`), y con el
+ScriptRunContext de Streamlit, para que `st.error` desde un hilo siga funcionando.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# Un pool por proceso compartido por todas las sesiones
+FANOUT_WORKERS = int(os.environ.get('APP_FANOUT_WORKERS', '8'))
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+
+
+def _script_run_ctx():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except Exception:  # pragma: no cover - fuera de Streamlit
+        return None
+    return get_script_run_ctx()
+
+
+def _run(context: contextvars.Context, script_ctx, fn: Callable[[], Any]) -> Any:
+    if script_ctx is not None:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+        add_script_run_ctx(threading.current_thread(), script_ctx)
+    return context.run(fn)
+
+
+def parallel_load(loaders: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """Ejecuta `loaders` a la vez y devuelve {nombre: resultado}.
+
+    Si una carga lanza una excepción se propaga al llamador (los métodos de los
+    módulos ya capturan sus errores y devuelven valores vacíos).
+    """
+    if len(loaders) <= 1:
+        return {name: fn() for name, fn in loaders.items()}
+    script_ctx = _script_run_ctx()
+    futures = {
+        name: _executor.submit(_run, contextvars.copy_context(), script_ctx, fn)
+        for name, fn in loaders.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
@@ -1,9 +1,66 @@
+from typing import Any, Dict, Iterable, List, Optional
+
 import streamlit as st
-from firebase_admin import firestore
-from firebase_config import get_firestore_client
-from modules.authentication import AuthenticationSystem
+from firebase_config import db, firestore
+from modules import stats
+from modules.autenticacion import LEGACY_USER_LOOKUP, find_user, normalize_email, user_document, user_ref
+from modules.cache import coalesce, invalidate, invalidate_namespace, read_through
+from modules.passwords import hash_passwords
+
+EMPLOYEE_ROLES = ["manager", "employee", "cashier"]
+TEMP_PASSWORD = "temp_password"
+BATCH_LIMIT = 500
+# Usuario + empleado por fila y el contador de la tienda por batch
+ROWS_PER_BATCH = (BATCH_LIMIT - 1) // 2
+# Firestore admite como máximo 30 valores en un filtro 'in'
+IN_QUERY_LIMIT = 30
+# Campos que muestra el directorio (el resto del documento no se descarga)
+DIRECTORY_FIELDS = ['email', 'role', 'active', 'added_at', 'added_by']
+
+
+def _chunks(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _existing_users(emails: List[str]) -> Dict[str, Any]:
+    """{email normalizado: snapshot} de los usuarios ya registrados.
+
+    Los documentos `users/{email}` se leen por id con `get_all`; los emails que no
+    aparecen se buscan entre los usuarios antiguos con consultas 'in' de 30 valores.
+    """
+    found: Dict[str, Any] = {}
+    by_id = {user_ref(email).id: normalize_email(email) for email in emails}
+    ids = list(by_id)
+    for chunk in _chunks(ids, BATCH_LIMIT):
+        for snap in db.get_all([db.collection('users').document(doc_id) for doc_id in chunk]):
+            if snap.exists:
+                found[by_id[snap.id]] = snap
+    if LEGACY_USER_LOOKUP:
+        missing = sorted({candidate for email in emails if normalize_email(email) not in found
+                          for candidate in (email.strip(), normalize_email(email))})
+        for chunk in _chunks(missing, IN_QUERY_LIMIT):
+            for snap in db.collection('users').where('email', 'in', chunk).get():
+                found.setdefault(normalize_email(snap.to_dict().get('email')), snap)
+    return found
+
+
+def _employees_query(store_id: str, active: Optional[bool] = None, role: Optional[str] = None):
+    """Empleados de la tienda filtrados en el servidor (ver índices en firestore.indexes.json)."""
+    query = db.collection('employees').where('store_id', '==', store_id)
+    if active is not None:
+        query = query.where('active', '==', active)
+    if role:
+        query = query.where('role', '==', role)
+    return query
+
+
+def _invalidate_employees(store_id: str):
+    invalidate(('employees', store_id))
+    invalidate_namespace('employee_pages')
+    invalidate_namespace('employee_count')
+    stats.invalidate_stats(store_id)
 
-db = get_firestore_client()
 
 class EmployeeManagement:
     def add_employee(self, email, role, store_id, added_by, password: str | None = None):
@@ -11,8 +68,13 @@ class EmployeeManagement:
 
         password: si se proporciona, se usará para crear el usuario;
         de lo contrario se crea con una contraseña temporal.
+        Usuario, empleado y contador de la tienda van en un solo batch.
         """
         try:
+            # Verificar si el usuario existe (lectura directa por email; los usuarios
+            # antiguos se buscan con el email tal cual se escribió)
+            existing = find_user(email)
+            email = normalize_email(email)
             employee_data = {
                 'email': email,
                 'role': role,
@@ -22,32 +84,163 @@ class EmployeeManagement:
                 'active': True
             }
 
-            # Verificar si el usuario existe
-            user_ref = db.collection('users').where('email', '==', email).limit(1).get()
-
-            if user_ref:
+            batch = db.batch()
+            if existing is not None:
                 # Actualizar usuario existente
-                db.collection('users').document(user_ref[0].id).update({
+                batch.update(existing.reference, {
                     'store_id': store_id,
                     'role': role
                 })
             else:
                 # Crear nuevo usuario
-                auth_system = AuthenticationSystem()
-                passwd = password if password else "temp_password"
-                auth_system.register_user(email, passwd, role, store_id)
+                passwd = password if password else TEMP_PASSWORD
+                batch.create(user_ref(email), user_document(email, passwd, role, store_id))
 
-            # Agregar a la colección de empleados
-            db.collection('employees').add(employee_data)
+            # Agregar a la colección de empleados junto con el contador de la tienda
+            batch.set(db.collection('employees').document(), employee_data)
+            stats.queue_delta(batch, store_id, employee_count=1)
+            batch.commit()
+            _invalidate_employees(store_id)
             return True
         except Exception as e:
             st.error(f"Error agregando empleado: {e}")
             return False
 
+    def add_employees_bulk(self, store_id: str, rows: Iterable[Dict[str, Any]], added_by: str) -> List[Dict[str, Any]]:
+        """Alta masiva de empleados (p. ej. desde un CSV con email, role y password opcional).
+
+        Devuelve una entrada por fila: {'row', 'email', 'status', 'message'} con status
+        'added', 'skipped' (email inválido, rol inválido, repetido o ya empleado de la
+        tienda) o 'error' (falló la escritura). Los usuarios existentes se leen de una
+        vez, los hashes se calculan en paralelo en el pool y las escrituras van en
+        batches de 500 operaciones, cada uno con su incremento de `employee_count`.
+        """
+        results: List[Dict[str, Any]] = []
+        pending = []
+        try:
+            current = {
+                normalize_email(snap.to_dict().get('email'))
+                for snap in db.collection('employees').where('store_id', '==', store_id).select(['email']).get()
+            }
+        except Exception as e:
+            st.error(f"Error obteniendo empleados: {e}")
+            return results
+
+        seen = set()
+        for row_no, row in enumerate(rows, start=1):
+            raw = (row.get('email') or '').strip()
+            email = normalize_email(raw)
+            role = (row.get('role') or 'employee').strip().lower()
+            result = {'row': row_no, 'email': email, 'status': 'skipped', 'message': ''}
+            results.append(result)
+            if not email or '@' not in email:
+                result['message'] = "Email inválido"
+            elif role not in EMPLOYEE_ROLES:
+                result['message'] = f"Rol inválido: {role}"
+            elif email in current:
+                result['message'] = "Ya es empleado de la tienda"
+            elif email in seen:
+                result['message'] = "Email repetido en el archivo"
+            else:
+                seen.add(email)
+                pending.append((result, raw, role, (row.get('password') or '').strip() or TEMP_PASSWORD))
+        if not pending:
+            return results
+
+        try:
+            users = _existing_users([raw for _, raw, _, _ in pending])
+            new_rows = [item for item in pending if item[0]['email'] not in users]
+            hashes = dict(zip((item[0]['email'] for item in new_rows), hash_passwords([item[3] for item in new_rows])))
+        except Exception as e:
+            for result, _, _, _ in pending:
+                result.update(status='error', message=f"Error preparando el alta: {e}")
+            st.error(f"Error preparando el alta de empleados: {e}")
+            return results
+
+        added = 0
+        for chunk in _chunks(pending, ROWS_PER_BATCH):
+            batch = db.batch()
+            for result, _, role, _ in chunk:
+                email = result['email']
+                existing = users.get(email)
+                if existing is not None:
+                    batch.update(existing.reference, {'store_id': store_id, 'role': role})
+                else:
+                    batch.create(user_ref(email), user_document(email, None, role, store_id, password_hash=hashes[email]))
+                batch.set(db.collection('employees').document(), {
+                    'email': email,
+                    'role': role,
+                    'store_id': store_id,
+                    'added_by': added_by,
+                    'added_at': firestore.SERVER_TIMESTAMP,
+                    'active': True
+                })
+            stats.queue_delta(batch, store_id, employee_count=len(chunk))
+            try:
+                batch.commit()
+            except Exception as e:
+                for result, _, _, _ in chunk:
+                    result.update(status='error', message=f"Error guardando el lote: {e}")
+                continue
+            added += len(chunk)
+            for result, _, _, _ in chunk:
+                result.update(status='added', message="Usuario existente" if result['email'] in users else "Usuario creado")
+
+        if added:
+            _invalidate_employees(store_id)
+        return results
+
     def get_employees_by_store(self, store_id):
+        """Compatibilidad: todos los empleados de la tienda (el directorio usa `get_employees_page`)."""
         try:
-            employees_ref = db.collection('employees').where('store_id', '==', store_id).get()
-            return [emp.to_dict() for emp in employees_ref]
+            return read_through(
+                ('employees', store_id),
+                lambda: [emp.to_dict() for emp in db.collection('employees').where('store_id', '==', store_id).get()],
+            )
         except Exception as e:
             st.error(f"Error obteniendo empleados: {e}")
             return []
+
+    def _employees_page(self, query, page_size: int, page_token: Optional[str]) -> Dict[str, Any]:
+        query = query.order_by('email')
+        if page_token:
+            cursor = db.collection('employees').document(page_token).get()
+            if cursor.exists:
+                query = query.start_after(cursor)
+        # Un documento extra indica si hay página siguiente
+        snaps = list(query.select(DIRECTORY_FIELDS).limit(page_size + 1).get())
+        has_more = len(snaps) > page_size
+        snaps = snaps[:page_size]
+        return {
+            'items': [{'id': snap.id, **snap.to_dict()} for snap in snaps],
+            'next_page_token': snaps[-1].id if has_more and snaps else None,
+        }
+
+    def get_employees_page(self, store_id: str, active: Optional[bool] = None, role: Optional[str] = None,
+                           page_size: int = 25, page_token: Optional[str] = None) -> Dict[str, Any]:
+        """Página del directorio de empleados ordenada por email, filtrada en el servidor.
+
+        `active` (True/False/None) y `role` (None = todos) se aplican en la consulta.
+        `page_token` es el id del último empleado de la página anterior (o None para
+        la primera). Devuelve {'items': [...], 'next_page_token': str | None}; cuesta
+        page_size + 1 lecturas, más una por el cursor.
+        """
+        try:
+            return coalesce(
+                ('employee_pages', store_id, active, role, page_size, page_token),
+                lambda: self._employees_page(_employees_query(store_id, active, role), page_size, page_token),
+            )
+        except Exception as e:
+            st.error(f"Error obteniendo empleados: {e}")
+            return {'items': [], 'next_page_token': None}
+
+    def count_employees(self, store_id: str, active: Optional[bool] = None, role: Optional[str] = None) -> int:
+        """Número de empleados con esos filtros: agregación count() en el servidor, sin descargar documentos."""
+        try:
+            return read_through(
+                ('employee_count', store_id, active, role),
+                lambda: int(_employees_query(store_id, active, role).count().get()[0][0].value),
+            )
+        except Exception as e:
+            st.error(f"Error contando empleados: {e}")
+            return 0
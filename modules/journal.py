@@ -0,0 +1,408 @@
+"""Journal local de movimientos de stock con sincronización en segundo plano.
+
+Con APP_WRITE_JOURNAL=<ruta> los ajustes de stock y las ventas se guardan primero en
+un SQLite local (append-only, `synchronous=FULL`, así que cada alta queda en disco
+con fsync) y la llamada vuelve enseguida. Un hilo los reenvía a la base de datos en
+batches de a lo sumo BATCH_LIMIT escrituras, con reintentos y backoff exponencial
+si la red falla.
+
+Idempotencia: cada entrada tiene un id aleatorio y sus movimientos se crean con
+ids derivados de él (`{id}__{n}`) usando `create`, que falla si el documento ya
+existe. Si un commit llegó al servidor pero se perdió la respuesta, el reintento
+falla con AlreadyExists sin aplicar nada (el batch es atómico); entonces se
+reenvía entrada por entrada y las que ya existen se marcan como sincronizadas, así
+que el incremento de inventario se aplica exactamente una vez.
+
+Errores permanentes (p. ej. una validación que el servidor rechaza siempre): si un
+grupo falla por algo que no es de red, se reenvía entrada por entrada y la que
+falle APP_JOURNAL_MAX_ATTEMPTS veces pasa a "fallida" (`failed = 1`): deja de
+bloquear a las siguientes, no cuenta en el inventario y la barra lateral la
+muestra con su error y un botón para reintentarla. Los errores de red no cuentan
+como intento: sin conexión la cola sólo espera.
+
+Mientras haya entradas pendientes, el inventario que ve la app suma sus cambios
+(`pending_deltas`). De un grupo que se está enviando no se sabe si la caché ya lo
+incluye, así que sólo se cuentan sus descuentos: el stock mostrado nunca supera al
+real y una venta nunca se acepta por contar dos veces lo mismo.
+"""
+import datetime
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = os.environ.get('APP_WRITE_JOURNAL', '').strip()
+# Entradas leídas del journal por intento de sincronización
+SYNC_CHUNK = 200
+MAX_BACKOFF = 60.0
+# Intentos fallidos (sin contar errores de red) antes de apartar una entrada
+MAX_ATTEMPTS = int(os.environ.get('APP_JOURNAL_MAX_ATTEMPTS', '5'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    store_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    inflight INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    synced REAL,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS journal_pending ON journal (synced, seq);
+"""
+
+
+def enabled() -> bool:
+    return bool(JOURNAL_PATH)
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Errores de red o de disponibilidad: se reintentan sin límite."""
+    if isinstance(exc, (ConnectionError, TimeoutError, sqlite3.OperationalError)):
+        return True
+    try:
+        from google.api_core import exceptions as gexc
+    except Exception:  # pragma: no cover - backend SQLite sin google-cloud
+        return False
+    return isinstance(exc, (gexc.ServiceUnavailable, gexc.DeadlineExceeded, gexc.InternalServerError,
+                            gexc.Aborted, gexc.TooManyRequests, gexc.ResourceExhausted, gexc.Unknown))
+
+
+def _ops(payload: Dict[str, Any]) -> int:
+    """Escrituras que genera una entrada: inventario, movimiento y bucket de rollup por
+    línea, la venta y el resumen."""
+    return 3 * len(payload['movements']) + (1 if payload.get('sale') else 0) + 1
+
+
+class WriteJournal:
+    """Cola persistente de movimientos y el hilo que la vacía."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.executescript(_SCHEMA)
+        # Journals creados antes de la columna `failed`
+        if 'failed' not in {row[1] for row in self._conn.execute('PRAGMA table_info(journal)')}:
+            self._conn.execute('ALTER TABLE journal ADD COLUMN failed INTEGER NOT NULL DEFAULT 0')
+        self._wake = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.last_sync: Optional[float] = None
+        # Aumenta con cada grupo sincronizado; permite detectar lecturas que lo cruzaron
+        self.generation = 0
+
+    # -- escritura local ----------------------------------------------------
+
+    def append(self, store_id: str, movements: List[Dict[str, Any]], reason: str, user_email: str,
+               sale: Optional[Dict[str, Any]] = None) -> str:
+        """Guarda una entrada (uno o varios movimientos y opcionalmente la venta) y devuelve su id."""
+        return self.append_many([{
+            'store_id': store_id, 'movements': movements, 'reason': reason, 'user': user_email, 'sale': sale,
+        }])[0]
+
+    def append_many(self, entries: List[Dict[str, Any]]) -> List[str]:
+        """Guarda varias entradas en una sola transacción local (un único fsync)."""
+        now = time.time()
+        rows = []
+        for entry in entries:
+            entry_id = uuid.uuid4().hex
+            rows.append((entry_id, entry['store_id'], json.dumps({**entry, 'ts': now}), now))
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.executemany('INSERT INTO journal (id, store_id, payload, created) VALUES (?, ?, ?, ?)', rows)
+            self._conn.execute('COMMIT')
+        self.start()
+        self._wake.set()
+        return [row[0] for row in rows]
+
+    # -- estado ---------------------------------------------------------------
+
+    def pending_deltas(self, store_id: str) -> Dict[str, int]:
+        """Cambio de stock por producto aún no sincronizado de la tienda."""
+        deltas: Dict[str, int] = {}
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT payload, inflight FROM journal WHERE synced IS NULL AND failed = 0 AND store_id = ?', (store_id,)
+            ).fetchall()
+        for payload, inflight in rows:
+            for mov in json.loads(payload)['movements']:
+                change = int(mov['change'])
+                if inflight and change > 0:
+                    continue
+                deltas[mov['product_id']] = deltas.get(mov['product_id'], 0) + change
+        return deltas
+
+    def status(self) -> Dict[str, Any]:
+        """Profundidad de la cola, retraso de sincronización (s), último error y entradas fallidas."""
+        with self._lock:
+            pending, oldest = self._conn.execute(
+                'SELECT COUNT(*), MIN(created) FROM journal WHERE synced IS NULL AND failed = 0'
+            ).fetchone()
+            failed = self._conn.execute(
+                'SELECT id, store_id, attempts, last_error FROM journal WHERE failed = 1 ORDER BY seq'
+            ).fetchall()
+        return {
+            'pending': pending,
+            'lag': time.time() - oldest if oldest else 0.0,
+            'last_error': self.last_error,
+            'last_sync': self.last_sync,
+            'failed': [{'id': row[0], 'store_id': row[1], 'attempts': row[2], 'error': row[3]} for row in failed],
+        }
+
+    def retry_failed(self) -> int:
+        """Devuelve las entradas fallidas a la cola (p. ej. tras corregir la causa)."""
+        with self._lock:
+            count = self._conn.execute('UPDATE journal SET failed = 0, attempts = 0 WHERE failed = 1').rowcount
+        if count:
+            self.start()
+            self._wake.set()
+        return count
+
+    # -- sincronización -------------------------------------------------------
+
+    def start(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(target=self._run, name='journal-sync', daemon=True)
+        self._worker.start()
+        # Lo pendiente de una ejecución anterior se envía al arrancar
+        self._wake.set()
+
+    def _pending(self) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT seq, id, payload FROM journal WHERE synced IS NULL AND failed = 0 ORDER BY seq LIMIT ?', (SYNC_CHUNK,)
+            ).fetchall()
+
+    def _applied(self, group: List[tuple]):
+        """Invalida la caché de las tiendas del grupo y marca sus entradas como sincronizadas.
+
+        El orden importa: quien lea inventario y pendientes y vea `generation`
+        igual antes y después sabe que no cruzó este punto (ver `SalesManagement`).
+        """
+        from modules.cache import invalidate, invalidate_namespace
+
+        store_ids = {payload['store_id'] for _, payload in group}
+        invalidate(*[('inventory', store_id) for store_id in store_ids], *[('store_stats', store_id) for store_id in store_ids])
+        invalidate_namespace('movements')
+        invalidate_namespace('rollups')
+        self.generation += 1
+        self._mark([entry_id for entry_id, _ in group])
+
+    def _mark(self, entry_ids: List[str], error: Optional[str] = None, inflight: bool = False, attempt: bool = True):
+        """Marca entradas como enviándose, sincronizadas o con error (`attempt`: cuenta un intento)."""
+        with self._lock:
+            if inflight:
+                self._conn.executemany('UPDATE journal SET inflight = 1 WHERE id = ?',
+                                       [(entry_id,) for entry_id in entry_ids])
+            elif error is None:
+                self._conn.executemany('UPDATE journal SET synced = ?, inflight = 0 WHERE id = ?',
+                                       [(time.time(), entry_id) for entry_id in entry_ids])
+            else:
+                self._conn.executemany('UPDATE journal SET attempts = attempts + ?, inflight = 0, last_error = ? WHERE id = ?',
+                                       [(1 if attempt else 0, error, entry_id) for entry_id in entry_ids])
+
+    def _fail(self, entry_id: str, error: Exception) -> bool:
+        """Registra el error de una entrada; True si agotó MAX_ATTEMPTS y quedó apartada."""
+        transient = _is_transient(error)
+        self._mark([entry_id], error=str(error), attempt=not transient)
+        if transient:
+            return False
+        with self._lock:
+            attempts = self._conn.execute('SELECT attempts FROM journal WHERE id = ?', (entry_id,)).fetchone()[0]
+            if attempts < MAX_ATTEMPTS:
+                return False
+            self._conn.execute('UPDATE journal SET failed = 1 WHERE id = ?', (entry_id,))
+        logger.error("Entrada %s del journal apartada tras %d intentos: %s", entry_id, attempts, error)
+        return True
+
+    def _run(self):
+        failures = 0
+        while True:
+            self._wake.wait(timeout=MAX_BACKOFF)
+            self._wake.clear()
+            while True:
+                try:
+                    synced = self.sync_once()
+                except Exception as e:
+                    failures += 1
+                    self.last_error = str(e)
+                    delay = min(MAX_BACKOFF, 2 ** failures) * random.uniform(0.5, 1.0)
+                    logger.warning("Sincronización del journal fallida (%d): %s; reintento en %.1fs", failures, e, delay)
+                    time.sleep(delay)
+                    continue
+                failures = 0
+                if not synced:
+                    break
+
+    def sync_once(self) -> int:
+        """Envía las entradas pendientes más antiguas; devuelve cuántas quedaron sincronizadas o apartadas."""
+        from firebase_config import db
+        from modules.products import BATCH_LIMIT
+
+        rows = self._pending()
+        if not rows:
+            return 0
+        done = 0
+        group: List[tuple] = []
+        ops = 0
+        for row in rows:
+            payload = json.loads(row[2])
+            if group and ops + _ops(payload) > BATCH_LIMIT:
+                done += self._commit_group(db, group)
+                group, ops = [], 0
+            group.append((row[1], payload))
+            ops += _ops(payload)
+        done += self._commit_group(db, group)
+        self.last_sync = time.time()
+        self.last_error = None
+        return done
+
+    def _commit_group(self, db, group: List[tuple]) -> int:
+        try:
+            from google.api_core.exceptions import AlreadyExists
+        except Exception:  # pragma: no cover
+            from sqlite_storage import AlreadyExists
+
+        self._mark([entry_id for entry_id, _ in group], inflight=True)
+        try:
+            batch = db.batch()
+            basis = self._group_basis(group)
+            for entry_id, payload in group:
+                self._queue(batch, entry_id, payload, basis)
+            batch.commit()
+            self._applied(group)
+            return len(group)
+        except AlreadyExists:
+            # Alguna entrada ya se aplicó (respuesta perdida): reenviar una por una
+            pass
+        except Exception as e:
+            if _is_transient(e):
+                self._mark([entry_id for entry_id, _ in group], error=str(e), attempt=False)
+                raise
+            # Puede ser una sola entrada inválida: reenviar una por una para aislarla
+            logger.warning("Grupo del journal rechazado (%s); se reenvía entrada por entrada", e)
+        try:
+            basis = self._group_basis(group)
+        except Exception as e:
+            self._mark([entry_id for entry_id, _ in group], error=str(e), attempt=False)
+            raise
+        done = 0
+        for n, (entry_id, payload) in enumerate(group):
+            batch = db.batch()
+            try:
+                self._queue(batch, entry_id, payload, basis)
+                batch.commit()
+            except AlreadyExists:
+                logger.info("Entrada %s del journal ya estaba aplicada", entry_id)
+            except Exception as e:
+                if self._fail(entry_id, e):
+                    # Apartada: cuenta como procesada para que el hilo siga con la cola
+                    done += 1
+                    continue
+                # Las siguientes no llegaron a enviarse
+                with self._lock:
+                    self._conn.executemany('UPDATE journal SET inflight = 0 WHERE id = ?', [(eid,) for eid, _ in group[n + 1:]])
+                raise
+            self._applied([(entry_id, payload)])
+            done += 1
+        return done
+
+    @staticmethod
+    def _group_basis(group: List[tuple]) -> Dict[str, Dict[str, tuple]]:
+        """Precio y cantidad anterior de los productos del grupo, por tienda (ver `_stock_basis`)."""
+        from modules.products import ProductManagement
+
+        pm = ProductManagement()
+        product_ids: Dict[str, set] = {}
+        for _, payload in group:
+            product_ids.setdefault(payload['store_id'], set()).update(mov['product_id'] for mov in payload['movements'])
+        return {store_id: pm._stock_basis(store_id, pids) for store_id, pids in product_ids.items()}
+
+    def _queue(self, batch, entry_id: str, payload: Dict[str, Any], basis: Dict[str, Dict[str, tuple]]):
+        from firebase_config import db
+        from modules import rollups
+        from modules.products import ProductManagement
+
+        pm = ProductManagement()
+        store_id = payload['store_id']
+        ts = datetime.datetime.fromtimestamp(payload['ts'], datetime.timezone.utc)
+        shard_counts = pm._shard_counts(store_id)
+        changes: Dict[str, int] = {}
+        for n, mov in enumerate(payload['movements']):
+            changes[mov['product_id']] = changes.get(mov['product_id'], 0) + int(mov['change'])
+            pm._increment_stock(batch, mov['product_id'], store_id, int(mov['change']), shard_counts.get(mov['product_id'], 0))
+            batch.create(db.collection('movements').document(f"{entry_id}__{n}"), {
+                'product_id': mov['product_id'],
+                'product_name': mov.get('product_name'),
+                'store_id': store_id,
+                'change': int(mov['change']),
+                'reason': payload['reason'],
+                'user': payload['user'],
+                'timestamp': ts,
+                'journal_id': entry_id,
+            })
+        if payload.get('sale'):
+            batch.create(db.collection('sales').document(entry_id), {**payload['sale'], 'created_at': ts})
+        # Si el batch falla por AlreadyExists no se aplica nada, tampoco estos incrementos.
+        # Los movimientos del journal llevan la hora original y pueden quedar detrás de
+        # la marca de agua de los rollups: sus buckets se suman aquí.
+        store_basis = basis.setdefault(store_id, {})
+        pm._queue_stock_stats(batch, store_id, changes, store_basis)
+        # La siguiente entrada del grupo parte de la cantidad que deja esta
+        for pid, change in changes.items():
+            price, quantity = store_basis.get(pid, (0.0, None))
+            store_basis[pid] = (price, None if quantity is None else quantity + change)
+        rollups.queue_buckets(batch, store_id, [
+            (mov['product_id'], mov.get('product_name'), int(mov['change']), payload['reason'], ts)
+            for mov in payload['movements']
+        ])
+
+
+_journal: Optional[WriteJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> Optional[WriteJournal]:
+    """Journal del proceso (None si APP_WRITE_JOURNAL no está definida)."""
+    global _journal
+    if not enabled():
+        return None
+    with _journal_lock:
+        if _journal is None:
+            _journal = WriteJournal(JOURNAL_PATH)
+            _journal.start()
+    return _journal
+
+
+def render_status(st):
+    """Cola y retraso de sincronización en la barra lateral."""
+    journal = get_journal()
+    if journal is None:
+        return
+    status = journal.status()
+    if status['pending']:
+        st.sidebar.warning(f"⏳ {status['pending']} movimientos sin sincronizar (retraso {status['lag']:.0f}s)")
+        if status['last_error']:
+            st.sidebar.caption(f"Último error: {status['last_error']}")
+    else:
+        st.sidebar.caption("✅ Movimientos sincronizados")
+    if status['failed']:
+        st.sidebar.error(f"❌ {len(status['failed'])} movimientos no se pudieron sincronizar")
+        for entry in status['failed'][:5]:
+            st.sidebar.caption(f"{entry['id'][:8]} ({entry['attempts']} intentos): {entry['error']}")
+        if st.sidebar.button("Reintentar fallidos", key="journal_retry_failed"):
+            journal.retry_failed()
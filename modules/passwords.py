@@ -0,0 +1,156 @@
+"""Hash de contraseñas con scrypt o PBKDF2 (stdlib) y un pool acotado de hilos.
+
+Formato guardado en `users.password`:
+- `scrypt$n=16384,r=8,p=1$<salt b64>$<hash b64>`
+- `pbkdf2_sha256$<iteraciones>$<salt b64>$<hash b64>`
+Cualquier otro valor es una contraseña antigua en texto plano: se compara en tiempo
+constante y, si coincide, el login la reemplaza por el hash actual (`needs_rehash`).
+Lo mismo pasa con hashes de parámetros distintos a los configurados, así que subir
+o bajar el coste se aplica solo a medida que la gente entra.
+
+Parámetros: APP_PASSWORD_SCHEME (scrypt | pbkdf2_sha256), APP_SCRYPT_N/R/P,
+APP_PBKDF2_ITERATIONS. scrypt usa 128·n·r bytes por hash (16 MiB por defecto).
+El cálculo corre en APP_HASH_WORKERS hilos compartidos por todas las sesiones
+(hashlib libera el GIL), así que una ráfaga de logins hace cola ahí en lugar de
+ocupar todos los núcleos; `tools/benchmark_password_hashing.py` mide logins/s y p95
+de cada configuración en la máquina real.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+SALT_BYTES = 16
+HASH_WORKERS = int(os.environ.get('APP_HASH_WORKERS', '2'))
+# Espera máxima de un login por su hash (cola + cálculo)
+HASH_TIMEOUT = float(os.environ.get('APP_HASH_TIMEOUT', '15'))
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+@dataclass(frozen=True)
+class PasswordHasher:
+    """Esquema y parámetros de coste; `label()` los describe para logs y benchmarks."""
+
+    scheme: str = 'scrypt'
+    params: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.scheme not in ('scrypt', 'pbkdf2_sha256'):
+            raise ValueError(f"Esquema de contraseña desconocido: {self.scheme}")
+
+    def label(self) -> str:
+        return f"{self.scheme}(" + ",".join(f"{k}={v}" for k, v in sorted(self.params.items())) + ")"
+
+    def _derive(self, password: str, salt: bytes, params: Dict[str, int]) -> bytes:
+        secret = password.encode('utf-8')
+        if self.scheme == 'scrypt':
+            n, r, p = params['n'], params['r'], params['p']
+            return hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+        return hashlib.pbkdf2_hmac('sha256', secret, salt, params['iterations'], dklen=32)
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(SALT_BYTES)
+        digest = self._derive(password, salt, self.params)
+        if self.scheme == 'scrypt':
+            encoded = ",".join(f"{k}={self.params[k]}" for k in ('n', 'r', 'p'))
+        else:
+            encoded = str(self.params['iterations'])
+        return f"{self.scheme}${encoded}${_b64(salt)}${_b64(digest)}"
+
+    def matches(self, stored: str) -> bool:
+        """True si `stored` usa este esquema con estos mismos parámetros."""
+        parsed = _parse(stored)
+        return parsed is not None and parsed[0] == self.scheme and parsed[1] == self.params
+
+
+def _parse(stored: Optional[str]):
+    """(esquema, parámetros, salt, hash) o None si no es un hash reconocido."""
+    parts = (stored or '').split('$')
+    if len(parts) != 4:
+        return None
+    scheme, encoded, salt, digest = parts
+    try:
+        if scheme == 'scrypt':
+            params = {k: int(v) for k, v in (item.split('=') for item in encoded.split(','))}
+            if set(params) != {'n', 'r', 'p'}:
+                return None
+        elif scheme == 'pbkdf2_sha256':
+            params = {'iterations': int(encoded)}
+        else:
+            return None
+        return scheme, params, _unb64(salt), _unb64(digest)
+    except ValueError:
+        return None
+
+
+def configured_hasher() -> PasswordHasher:
+    scheme = os.environ.get('APP_PASSWORD_SCHEME', 'scrypt')
+    if scheme == 'scrypt':
+        return PasswordHasher('scrypt', {
+            'n': int(os.environ.get('APP_SCRYPT_N', '16384')),
+            'r': int(os.environ.get('APP_SCRYPT_R', '8')),
+            'p': int(os.environ.get('APP_SCRYPT_P', '1')),
+        })
+    return PasswordHasher(scheme, {'iterations': int(os.environ.get('APP_PBKDF2_ITERATIONS', '600000'))})
+
+
+HASHER = configured_hasher()
+
+
+def is_hashed(stored: Optional[str]) -> bool:
+    return _parse(stored) is not None
+
+
+def _verify(password: str, stored: Optional[str]) -> bool:
+    parsed = _parse(stored)
+    if parsed is None:
+        # Texto plano de antes del hash
+        return stored is not None and hmac.compare_digest((stored or '').encode('utf-8'), password.encode('utf-8'))
+    scheme, params, salt, digest = parsed
+    return hmac.compare_digest(PasswordHasher(scheme, params)._derive(password, salt, params), digest)
+
+
+def needs_rehash(stored: Optional[str], hasher: PasswordHasher = HASHER) -> bool:
+    return not hasher.matches(stored or '')
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+        return _pool
+
+
+def hash_password(password: str, hasher: PasswordHasher = HASHER) -> str:
+    """Hash con los parámetros configurados, calculado en el pool compartido."""
+    return _executor().submit(hasher.hash, password).result(timeout=HASH_TIMEOUT)
+
+
+def hash_passwords(passwords: List[str], hasher: PasswordHasher = HASHER) -> List[str]:
+    """Varios hashes a la vez (altas masivas): se encolan todos y usan todo el pool."""
+    futures = [_executor().submit(hasher.hash, password) for password in passwords]
+    # La cola entera tarda a lo sumo lo que len/HASH_WORKERS hashes seguidos
+    timeout = HASH_TIMEOUT * max(1, -(-len(futures) // HASH_WORKERS))
+    return [future.result(timeout=timeout) for future in futures]
+
+
+def verify_password(password: str, stored: Optional[str]) -> bool:
+    """Compara `password` con el valor guardado (hash o texto plano antiguo) en el pool."""
+    return _executor().submit(_verify, password, stored).result(timeout=HASH_TIMEOUT)
@@ -0,0 +1,398 @@
+"""Medición de rendimiento de la app.
+
+Perfil de arranque: con APP_PROFILE_STARTUP=1 se registra cuánto tarda cada import
+pesado de `app.py`, la creación del cliente de almacenamiento y el tiempo hasta el
+primer render completo. El informe se escribe en el log y en la barra lateral.
+
+Trazas de acceso a datos: con APP_TRACE_FIRESTORE=1 el cliente que devuelve
+`get_firestore_client()` se envuelve con `instrument()`, que anota cada lectura y
+escritura (operación, colección, duración, documentos y función de negocio que la
+hizo). Se agregan por ejecución del script (`trace_run()`) y por función. Con
+APP_PERF_PANEL=1 se muestran en la barra lateral y con APP_PERF_LOG=<ruta> cada
+ejecución se añade como una línea JSON al archivo.
+
+Este módulo no importa nada pesado para poder cargarse antes que el resto.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes')
+
+
+PROFILE_STARTUP = _env_flag('APP_PROFILE_STARTUP')
+PERF_PANEL = _env_flag('APP_PERF_PANEL')
+PERF_LOG = os.environ.get('APP_PERF_LOG') or None
+TRACE_FIRESTORE = _env_flag('APP_TRACE_FIRESTORE') or PERF_PANEL or bool(PERF_LOG)
+
+# Instante de la primera carga de este módulo: inicio de la primera ejecución del script
+_STARTED_AT = time.perf_counter()
+_startup: List[Tuple[str, float]] = []
+_startup_lock = threading.Lock()
+_first_render: List[float] = []
+
+
+def record_startup(label: str, seconds: float):
+    """Anota una etapa del arranque (sólo la primera vez que ocurre)."""
+    if not PROFILE_STARTUP:
+        return
+    with _startup_lock:
+        if not _first_render and all(name != label for name, _ in _startup):
+            _startup.append((label, seconds))
+
+
+@contextmanager
+def timed_import(label: str):
+    """Mide el bloque de import envuelto; en ejecuciones posteriores cuesta ~0."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_startup(f"import {label}", time.perf_counter() - started)
+
+
+def mark_first_render():
+    """Cierra el perfil de arranque al terminar el primer render y lo reporta una vez."""
+    if not PROFILE_STARTUP:
+        return
+    with _startup_lock:
+        if _first_render:
+            return
+        _first_render.append(time.perf_counter() - _STARTED_AT)
+    lines = [f"  {label:<40} {seconds * 1000:8.1f} ms" for label, seconds in startup_report()]
+    lines.append(f"  {'tiempo hasta el primer render':<40} {_first_render[0] * 1000:8.1f} ms")
+    logger.info("Perfil de arranque:\n%s", '\n'.join(lines))
+
+
+def startup_report() -> List[Tuple[str, float]]:
+    """Etapas del arranque ordenadas de la más lenta a la más rápida."""
+    with _startup_lock:
+        return sorted(_startup, key=lambda item: item[1], reverse=True)
+
+
+def render_startup_panel(st):
+    """Muestra el perfil de arranque en la barra lateral si el modo está activo."""
+    if not PROFILE_STARTUP or not _first_render:
+        return
+    with st.sidebar.expander("⏱️ Perfil de arranque"):
+        for label, seconds in startup_report():
+            st.write(f"{label}: {seconds * 1000:.1f} ms")
+        st.write(f"**Primer render:** {_first_render[0] * 1000:.1f} ms")
+
+
+# -- Trazas de acceso a datos ------------------------------------------------
+
+_READ_OPS = {'get', 'stream', 'get_all', 'count'}
+_WRITE_OPS = {'add', 'set', 'update', 'create', 'delete', 'commit'}
+# Métodos que devuelven otra referencia o consulta (se siguen envolviendo)
+_CHAIN_OPS = {'collection', 'document', 'where', 'order_by', 'limit', 'offset', 'start_after',
+              'start_at', 'end_before', 'end_at', 'select', 'collection_group'}
+# Módulos cuyas funciones se atribuyen las llamadas (el resto de la pila se salta)
+_CALLER_PREFIXES = ('modules.', 'dashboards.', 'tools.', '__main__')
+_SKIP_MODULES = {__name__, 'modules.cache'}
+
+
+@dataclass
+class CallRecord:
+    op: str
+    collection: str
+    seconds: float
+    docs: int
+    caller: str
+
+
+@dataclass
+class RunTrace:
+    """Llamadas de una ejecución del script."""
+    calls: List[CallRecord] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def billed_reads(self) -> int:
+        # Firestore factura al menos una lectura por consulta, aunque no devuelva nada
+        return sum(max(c.docs, 1) for c in self.calls if c.op in _READ_OPS)
+
+    @property
+    def writes(self) -> int:
+        return sum(c.docs for c in self.calls if c.op in _WRITE_OPS)
+
+    def slowest(self, n: int = 10) -> List[CallRecord]:
+        return sorted(self.calls, key=lambda c: c.seconds, reverse=True)[:n]
+
+    def by_caller(self) -> Dict[str, Dict[str, float]]:
+        stats: Dict[str, Dict[str, float]] = {}
+        for c in self.calls:
+            entry = stats.setdefault(c.caller, {'calls': 0, 'seconds': 0.0, 'reads': 0, 'writes': 0})
+            entry['calls'] += 1
+            entry['seconds'] += c.seconds
+            if c.op in _READ_OPS:
+                entry['reads'] += max(c.docs, 1)
+            else:
+                entry['writes'] += c.docs
+        return stats
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'calls': len(self.calls),
+            'billed_reads': self.billed_reads,
+            'writes': self.writes,
+            'db_ms': round(sum(c.seconds for c in self.calls) * 1000, 1),
+            'by_caller': {k: {**v, 'seconds': round(v['seconds'], 4)} for k, v in self.by_caller().items()},
+            'slowest': [
+                {'op': c.op, 'collection': c.collection, 'ms': round(c.seconds * 1000, 1), 'docs': c.docs, 'caller': c.caller}
+                for c in self.slowest()
+            ],
+        }
+
+
+_run_trace: ContextVar[Optional[RunTrace]] = ContextVar('run_trace', default=None)
+_process_totals: Dict[str, Dict[str, float]] = {}
+_totals_lock = threading.Lock()
+
+
+def _caller() -> str:
+    """Método público de negocio más cercano en la pila, como `Clase.método`.
+
+    Los helpers privados, lambdas y closures se atribuyen al método público que
+    los llamó; si no hay ninguno se usa la primera función de negocio.
+    """
+    fallback = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module not in _SKIP_MODULES and module.startswith(_CALLER_PREFIXES):
+            owner = frame.f_locals.get('self')
+            name = frame.f_code.co_name
+            if owner is not None and not name.startswith(('_', '<')):
+                return f"{type(owner).__name__}.{name}"
+            if fallback is None:
+                fallback = f"{module}.{name}"
+        frame = frame.f_back
+    return fallback or '?'
+
+
+def _record(op: str, collection: str, seconds: float, docs: int):
+    record = CallRecord(op, collection, seconds, docs, _caller())
+    trace = _run_trace.get()
+    if trace is not None:
+        trace.calls.append(record)
+    with _totals_lock:
+        entry = _process_totals.setdefault(record.caller, {'calls': 0, 'seconds': 0.0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+
+
+def _unwrap(obj: Any) -> Any:
+    return obj._target if isinstance(obj, _Traced) else obj
+
+
+def _doc_count(op: str, result: Any) -> int:
+    if op == 'get' and isinstance(result, list):
+        return len(result)
+    if op in ('set', 'update', 'create', 'delete', 'add', 'get'):
+        return 1
+    return 0
+
+
+class _Traced:
+    """Envuelve referencias y consultas del cliente para medir sus llamadas."""
+
+    def __init__(self, target: Any, collection: str):
+        self._target = target
+        self._collection = collection
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+        if name in _CHAIN_OPS or name == 'count':
+            def chained(*args, **kwargs):
+                result = attr(*[_unwrap(a) for a in args], **kwargs)
+                collection = self._collection
+                if name in ('collection', 'collection_group') and args:
+                    collection = f"{collection}/{args[0]}" if name == 'collection' else args[0]
+                return _Traced(result, collection)
+            return chained
+        if name == 'stream':
+            def stream(*args, **kwargs):
+                started = time.perf_counter()
+                docs = 0
+                try:
+                    for snap in attr(*args, **kwargs):
+                        docs += 1
+                        yield snap
+                finally:
+                    _record('stream', self._collection, time.perf_counter() - started, docs)
+            return stream
+        if name in _READ_OPS or name in _WRITE_OPS:
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                result = attr(*[_unwrap(a) for a in args], **kwargs)
+                _record(name, self._collection, time.perf_counter() - started, _doc_count(name, result))
+                return result
+            return timed
+        return attr
+
+
+class _TracedBatch:
+    """Batch que cuenta las escrituras encoladas y mide el commit."""
+
+    def __init__(self, target: Any):
+        self._target = target
+        self._ops = 0
+
+    def set(self, reference, *args, **kwargs):
+        self._ops += 1
+        return self._target.set(_unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self._ops += 1
+        return self._target.update(_unwrap(reference), *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        self._ops += 1
+        return self._target.create(_unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._ops += 1
+        return self._target.delete(_unwrap(reference), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._target.commit(*args, **kwargs)
+        finally:
+            _record('commit', 'batch', time.perf_counter() - started, self._ops)
+            self._ops = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+
+class _TracedTransaction(_TracedBatch):
+    """Transacción: escrituras como en un batch y lecturas con las referencias desenvueltas."""
+
+    def get_all(self, references, *args, **kwargs) -> Iterator[Any]:
+        refs = [_unwrap(r) for r in references]
+        collection = refs[0].parent.id if refs else '?'
+        started = time.perf_counter()
+        snaps = list(self._target.get_all(refs, *args, **kwargs))
+        _record('get_all', collection, time.perf_counter() - started, len(refs))
+        return iter(snaps)
+
+    def run(self, fn):
+        # Backend local (sqlite_storage.Transaction): `fn` recibe el envoltorio
+        return self._target.run(lambda _transaction: fn(self))
+
+    def _commit(self, *args, **kwargs):
+        # `firestore.transactional` confirma con el método privado
+        started = time.perf_counter()
+        try:
+            return self._target._commit(*args, **kwargs)
+        finally:
+            _record('commit', 'transaction', time.perf_counter() - started, self._ops)
+            self._ops = 0
+
+
+class InstrumentedClient:
+    """Cliente con la misma interfaz que el envuelto que anota cada llamada."""
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def collection(self, *path: str) -> _Traced:
+        return _Traced(self._client.collection(*path), '/'.join(path))
+
+    def collection_group(self, collection_id: str) -> _Traced:
+        return _Traced(self._client.collection_group(collection_id), collection_id)
+
+    def document(self, *path: str) -> _Traced:
+        return _Traced(self._client.document(*path), '/'.join(path).rsplit('/', 1)[0])
+
+    def batch(self) -> _TracedBatch:
+        return _TracedBatch(self._client.batch())
+
+    def transaction(self, **kwargs) -> _TracedTransaction:
+        return _TracedTransaction(self._client.transaction(**kwargs))
+
+    def get_all(self, references, *args, **kwargs) -> Iterator[Any]:
+        refs = [_unwrap(r) for r in references]
+        collection = refs[0].parent.id if refs else '?'
+        started = time.perf_counter()
+        snaps = list(self._client.get_all(refs, *args, **kwargs))
+        _record('get_all', collection, time.perf_counter() - started, len(refs))
+        return iter(snaps)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def instrument(client: Any) -> InstrumentedClient:
+    logger.info("Trazas de acceso a datos activadas")
+    return InstrumentedClient(client)
+
+
+@contextmanager
+def trace_run() -> Iterator[Optional[RunTrace]]:
+    """Agrupa las llamadas de una ejecución del script; no hace nada sin trazas."""
+    if not TRACE_FIRESTORE:
+        yield None
+        return
+    trace = RunTrace()
+    token = _run_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _run_trace.reset(token)
+        if PERF_LOG:
+            _write_log(trace)
+
+
+def current_trace() -> Optional[RunTrace]:
+    return _run_trace.get()
+
+
+def process_totals() -> Dict[str, Dict[str, float]]:
+    """Llamadas y tiempo acumulados por función desde que arrancó el proceso."""
+    with _totals_lock:
+        return {k: dict(v) for k, v in _process_totals.items()}
+
+
+def _write_log(trace: RunTrace):
+    try:
+        line = json.dumps({'ts': time.time(), **trace.summary()}, ensure_ascii=False)
+        with open(PERF_LOG, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    except Exception:
+        logger.exception("No se pudo escribir el log de rendimiento en %s", PERF_LOG)
+
+
+def render_perf_panel(st, trace: Optional[RunTrace], reads_saved: int = 0):
+    """Panel de depuración en la barra lateral con el coste de la ejecución actual."""
+    if not PERF_PANEL or trace is None:
+        return
+    summary = trace.summary()
+    with st.sidebar.expander("🔍 Rendimiento de esta ejecución"):
+        st.write(f"**Llamadas:** {summary['calls']} — **Lecturas facturables:** {summary['billed_reads']} "
+                 f"— **Escrituras:** {summary['writes']}")
+        st.write(f"**Tiempo en base de datos:** {summary['db_ms']} ms de {summary['elapsed_ms']} ms")
+        st.write(f"**Lecturas coalescidas:** {reads_saved}")
+        st.write("**Por función:**")
+        for caller, stats in sorted(summary['by_caller'].items(), key=lambda kv: kv[1]['seconds'], reverse=True):
+            st.write(f"- `{caller}`: {stats['calls']} llamadas, {stats['seconds'] * 1000:.1f} ms, "
+                     f"{stats['reads']} lecturas, {stats['writes']} escrituras")
+        st.write("**Más lentas:**")
+        for c in summary['slowest']:
+            st.write(f"- {c['ms']} ms `{c['op']}` {c['collection']} ({c['docs']} docs) ← `{c['caller']}`")
@@ -1,12 +1,52 @@
 import logging
-from typing import Optional, Dict, Any
+import random
+from typing import Optional, Dict, Any, Iterable, Tuple
+from urllib.parse import quote
 
-from firebase_admin import firestore
-from firebase_config import get_firestore_client
+from firebase_config import already_exists_error, db, firestore, run_transaction
+from modules import search, stats
+from modules.cache import coalesce, current_scope, invalidate, invalidate_namespace, read_through
+from modules.journal import get_journal
+from modules.replica import replica_for
 
 logger = logging.getLogger(__name__)
 
-db = get_firestore_client()
+# Número máximo de referencias por llamada a `get_all` (una sola RPC BatchGetDocuments)
+PRODUCT_FETCH_CHUNK = 100
+# Límite de operaciones por batch/commit de Firestore
+BATCH_LIMIT = 500
+# Shards por defecto de un contador de stock distribuido (~1 escritura/s sostenida por shard)
+DEFAULT_STOCK_SHARDS = 10
+
+
+def inventory_doc_id(store_id: str, product_id: str) -> str:
+    """Id determinista del documento `inventory` de un producto en una tienda."""
+    return f"{store_id}__{product_id}"
+
+
+def normalize_sku(sku: str) -> str:
+    return str(sku or '').strip()
+
+
+def sku_index_id(store_id: str, sku: str) -> str:
+    """Id del documento `sku_index` de un SKU en una tienda ('/' no es válido en un id)."""
+    return f"{store_id}:{quote(normalize_sku(sku), safe='')}"
+
+
+def sku_index_entry(product_id: str, product: Dict[str, Any]) -> Dict[str, Any]:
+    """Datos del índice: lo que necesita la caja para cobrar sin leer el producto."""
+    return {
+        'product_id': product_id,
+        'store_id': product.get('store_id'),
+        'sku': normalize_sku(product.get('sku')),
+        'name': product.get('name'),
+        'price': product.get('price'),
+        'active': product.get('active', True),
+    }
+
+
+class DuplicateSkuError(Exception):
+    """Ya existe otro producto con ese SKU en la tienda."""
 
 
 class ProductManagement:
@@ -14,12 +54,24 @@ class ProductManagement:
 
     Colecciones usadas:
     - products: metadatos del producto
-    - inventory: entradas por store_id/product_id con cantidad
+    - inventory: una entrada por store_id/product_id con cantidad, con id
+      `inventory_doc_id(store_id, product_id)` (ver tools/migrate_inventory_ids.py)
+    - inventory/{id}/shards: shards del contador de stock de productos con mucha
+      concurrencia; el stock es `quantity` de la entrada más la suma de sus shards
     - movements: historial de cambios de stock
+    - sku_index: `{store_id}:{sku}` -> producto, para resolver un escaneo con una
+      lectura y rechazar SKUs duplicados (ver tools/rebuild_sku_index.py)
+    - store_stats: resumen por tienda que cada escritura ajusta (ver modules.stats)
     """
 
     def create_product(self, store_id: str, sku: str, name: str, price: float, description: str = "", initial_quantity: int = 0) -> Optional[str]:
+        """Crea el producto y, si hay cantidad inicial, su inventario y movimiento en un solo commit.
+
+        La entrada de `sku_index` se crea con `create` en el mismo batch: si el SKU ya
+        existe en la tienda el commit entero falla y no se crea nada.
+        """
         try:
+            sku = normalize_sku(sku)
             product_data = {
                 'store_id': store_id,
                 'sku': sku,
@@ -29,123 +81,425 @@ class ProductManagement:
                 'created_at': firestore.SERVER_TIMESTAMP,
                 'active': True,
             }
-            prod_ref = db.collection('products').add(product_data)
-            product_id = prod_ref[1].id
+            prod_ref = db.collection('products').document()
+            product_id = prod_ref.id
 
-            # Si se indica cantidad inicial, crear/actualizar inventario y movimiento
-            if initial_quantity and int(initial_quantity) != 0:
-                self._set_inventory(product_id, store_id, int(initial_quantity))
-                self._add_movement(product_id, store_id, int(initial_quantity), 'initial', 'system')
+            batch = db.batch()
+            batch.set(prod_ref, product_data)
+            batch.create(db.collection('sku_index').document(sku_index_id(store_id, sku)), sku_index_entry(product_id, product_data))
+            # Si se indica cantidad inicial, crear inventario y movimiento
+            quantity = int(initial_quantity or 0)
+            if quantity != 0:
+                self._set_inventory(product_id, store_id, quantity, batch=batch)
+                self._add_movement(product_id, store_id, quantity, 'initial', 'system', product_name=name, batch=batch)
+            stats.queue_delta(batch, store_id, sku_count=1, total_units=quantity,
+                              stock_value=round(float(price) * quantity, 2),
+                              low_stock_count=stats.low_stock_delta(None, quantity))
+            batch.commit()
+            invalidate(('products', store_id), ('inventory', store_id), ('sku', store_id, sku))
+            stats.invalidate_stats(store_id)
+            invalidate_namespace('movements')
+            search.product_changed(store_id, {**product_data, 'id': product_id})
 
             return product_id
+        except already_exists_error():
+            logger.warning("SKU duplicado %r en la tienda %s", sku, store_id)
+            return None
         except Exception as e:
             logger.exception("Error creando producto: %s", e)
             return None
 
     def get_products_by_store(self, store_id: str) -> list:
+        replica = replica_for(store_id)
+        if replica is not None:
+            return replica.product_list()
         try:
-            products_ref = db.collection('products').where('store_id', '==', store_id).get()
-            return [{**p.to_dict(), 'id': p.id} for p in products_ref]
+            return read_through(
+                ('products', store_id),
+                lambda: [{**p.to_dict(), 'id': p.id} for p in db.collection('products').where('store_id', '==', store_id).get()],
+            )
         except Exception as e:
             logger.exception("Error obteniendo productos: %s", e)
             return []
 
-    def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
-        try:
+    def get_product_by_id(self, product_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Producto por id (con 'id'), o None. Con `fresh` se lee del servidor saltando la caché."""
+        def load():
             p = db.collection('products').document(product_id).get()
             if p.exists:
                 data = p.to_dict()
                 data['id'] = p.id
                 return data
             return None
+
+        try:
+            if fresh:
+                invalidate(('product', product_id))
+            return read_through(('product', product_id), load)
         except Exception:
             logger.exception("Error obteniendo producto por id")
             return None
 
-    def update_product(self, product_id: str, updates: Dict[str, Any]) -> bool:
+    def get_product_by_sku(self, store_id: str, sku: str) -> Optional[Dict[str, Any]]:
+        """Producto de la tienda con ese SKU (un documento de `sku_index`), o None.
+
+        Devuelve los campos del índice (sku, name, price, active) con 'id' = product_id.
+        """
+        sku = normalize_sku(sku)
+        if not sku:
+            return None
+
+        def load():
+            entry = db.collection('sku_index').document(sku_index_id(store_id, sku)).get()
+            if not entry.exists:
+                return None
+            data = entry.to_dict()
+            data['id'] = data['product_id']
+            return data
+
         try:
-            db.collection('products').document(product_id).update(updates)
-            return True
+            return read_through(('sku', store_id, sku), load)
+        except Exception:
+            logger.exception("Error buscando producto por SKU")
+            return None
+
+    def _update_product_txn(self, transaction, product_id: str, updates: Dict[str, Any], store_id: Optional[str]) -> Dict[str, Any]:
+        prod_ref = db.collection('products').document(product_id)
+        new_sku = normalize_sku(updates['sku']) if 'sku' in updates else None
+        if new_sku is not None:
+            updates = {**updates, 'sku': new_sku}
+        # Con la tienda conocida, producto, entrada del SKU nuevo e inventario (si cambia
+        # el precio) van en una sola lectura
+        refs = [prod_ref]
+        if store_id and new_sku is not None:
+            refs.append(db.collection('sku_index').document(sku_index_id(store_id, new_sku)))
+        if store_id and 'price' in updates:
+            refs.append(self._inventory_ref(product_id, store_id))
+        snaps = {snap.reference.path: snap for snap in transaction.get_all(refs)}
+        prod = snaps.get(prod_ref.path)
+        if prod is None or not prod.exists:
+            raise ValueError(f"Producto {product_id} no existe")
+        old = prod.to_dict()
+        store_id = old['store_id']
+        old_sku = normalize_sku(old.get('sku'))
+        sku = old_sku if new_sku is None else new_sku
+        index_ref = db.collection('sku_index').document(sku_index_id(store_id, sku))
+        taken = None
+        if sku != old_sku:
+            taken = snaps.get(index_ref.path)
+            if taken is None:
+                taken = next(iter(transaction.get_all([index_ref])), None)
+        price_change = float(updates['price']) - float(old.get('price', 0.0)) if 'price' in updates else 0.0
+        quantity = self._entry_stock(transaction, product_id, store_id, snaps) if price_change else 0
+
+        # Firestore exige leer todo antes de la primera escritura de la transacción
+        if sku != old_sku:
+            if taken is not None and taken.exists and taken.to_dict().get('product_id') != product_id:
+                raise DuplicateSkuError(sku)
+            transaction.delete(db.collection('sku_index').document(sku_index_id(store_id, old_sku)))
+        transaction.update(prod_ref, updates)
+        transaction.set(index_ref, sku_index_entry(product_id, {**old, **updates}))
+        if price_change:
+            stats.queue_delta(transaction, store_id, stock_value=round(price_change * quantity, 2))
+        return {'store_id': store_id, 'skus': {old_sku, sku}, 'product': {**old, **updates, 'id': product_id}}
+
+    def update_product(self, product_id: str, updates: Dict[str, Any], store_id: Optional[str] = None) -> bool:
+        """Actualiza campos del producto y su entrada de `sku_index` en una transacción.
+
+        Si cambia el SKU se mueve la entrada del índice; si el nuevo ya pertenece a
+        otro producto de la tienda no se cambia nada y devuelve False. Con `store_id`
+        la comprobación del SKU nuevo va en la misma lectura que el producto.
+        """
+        try:
+            changed = run_transaction(lambda transaction: self._update_product_txn(transaction, product_id, updates, store_id))
+        except DuplicateSkuError as e:
+            logger.warning("SKU duplicado %r al actualizar el producto %s", str(e), product_id)
+            return False
         except Exception:
             logger.exception("Error actualizando producto")
             return False
+        store_id = changed['store_id']
+        invalidate(('product', product_id), ('products', store_id), ('inventory', store_id),
+                   *[('sku', store_id, sku) for sku in changed['skus']])
+        stats.invalidate_stats(store_id)
+        search.product_changed(store_id, changed['product'])
+        return True
+
+    def _inventory_ref(self, product_id: str, store_id: str):
+        return db.collection('inventory').document(inventory_doc_id(store_id, product_id))
+
+    def _set_inventory(self, product_id: str, store_id: str, quantity: int, batch=None):
+        """Fija la cantidad absoluta del inventario (sin consultas: id determinista).
 
-    def _set_inventory(self, product_id: str, store_id: str, quantity: int):
-        # Guardar/actualizar el documento inventory identificado por product_id+store_id
+        Con `batch` sólo encola la escritura; el llamador hace el commit.
+        """
+        data = {
+            'product_id': product_id,
+            'store_id': store_id,
+            'quantity': int(quantity),
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        }
         try:
-            q = db.collection('inventory').where('product_id', '==', product_id).where('store_id', '==', store_id).limit(1).get()
-            if q:
-                db.collection('inventory').document(q[0].id).update({'quantity': quantity})
+            if batch is not None:
+                batch.set(self._inventory_ref(product_id, store_id), data, merge=True)
             else:
-                inv = {
-                    'product_id': product_id,
-                    'store_id': store_id,
-                    'quantity': quantity,
-                    'updated_at': firestore.SERVER_TIMESTAMP,
-                }
-                db.collection('inventory').add(inv)
+                self._inventory_ref(product_id, store_id).set(data, merge=True)
         except Exception:
             logger.exception("Error seteando inventario")
 
-    def adjust_stock(self, product_id: str, store_id: str, change: int, reason: str, user_email: str) -> bool:
-        """Ajusta el stock (positivo o negativo) y registra un movimiento."""
+    def _shard_ref(self, product_id: str, store_id: str, index: int):
+        return self._inventory_ref(product_id, store_id).collection('shards').document(str(index))
+
+    def _shard_counts(self, store_id: str) -> Dict[str, int]:
+        """Productos de la tienda en modo distribuido y su número de shards.
+
+        Una consulta sobre las entradas con `shards > 0` (pocas), cacheada aparte del
+        inventario: los ajustes de stock no la invalidan, sólo `enable_sharding` y
+        `disable_sharding`. Si otro proceso acaba de cambiar el modo, las escrituras
+        pueden ir un rato al documento "equivocado", pero la lectura suma entrada y
+        shards siempre, así que el stock sigue siendo correcto.
+        """
+        def load():
+            query = db.collection('inventory').where('store_id', '==', store_id).where('shards', '>', 0)
+            return {d['product_id']: int(d['shards']) for d in (snap.to_dict() for snap in query.get())}
+
+        return read_through(('shard_counts', store_id), load)
+
+    def _entry_stock(self, transaction, product_id: str, store_id: str, snaps: Dict[str, Any]) -> int:
+        """Stock de un producto dentro de una transacción: su entrada (ya leída en `snaps`
+        o leída ahora) más sus shards si tiene contador distribuido."""
+        entry_ref = self._inventory_ref(product_id, store_id)
+        entry = snaps.get(entry_ref.path)
+        if entry is None:
+            entry = next(iter(transaction.get_all([entry_ref])), None)
+        data = (entry.to_dict() or {}) if entry is not None and entry.exists else {}
+        quantity = int(data.get('quantity', 0))
+        if data.get('shards'):
+            for shard in entry_ref.collection('shards').get(transaction=transaction):
+                quantity += int(shard.to_dict().get('quantity', 0))
+        return quantity
+
+    def _stock_basis(self, store_id: str, product_ids: Iterable[str]) -> Dict[str, Tuple[float, Optional[int]]]:
+        """{producto: (precio, cantidad anterior)} leídos de sus propios documentos.
+
+        Un `get_all` (en bloques de PRODUCT_FETCH_CHUNK) de cada producto y su entrada de
+        inventario, sin recorrer catálogo ni inventario. La cantidad es None con contador
+        distribuido (el stock está repartido en shards) y no cuenta entradas antiguas con
+        id automático: en esos casos low_stock_count puede derivar y
+        `tools/recompute_store_stats.py` lo corrige.
+        """
+        ids = list(dict.fromkeys(product_ids))
+        docs: Dict[str, Optional[Dict[str, Any]]] = {}
+        step = PRODUCT_FETCH_CHUNK // 2
+        for i in range(0, len(ids), step):
+            chunk = ids[i:i + step]
+            refs = [db.collection('products').document(pid) for pid in chunk]
+            refs += [self._inventory_ref(pid, store_id) for pid in chunk]
+            for snap in db.get_all(refs):
+                docs[snap.reference.path] = (snap.to_dict() or {}) if snap.exists else None
+        basis: Dict[str, Tuple[float, Optional[int]]] = {}
+        for pid in ids:
+            product = docs.get(db.collection('products').document(pid).path) or {}
+            entry = docs.get(self._inventory_ref(pid, store_id).path) or {}
+            basis[pid] = (float(product.get('price', 0.0)), None if entry.get('shards') else int(entry.get('quantity', 0)))
+        return basis
+
+    def _queue_stock_stats(self, batch, store_id: str, changes: Dict[str, int],
+                           basis: Optional[Dict[str, Tuple[float, Optional[int]]]] = None):
+        """Encola en `batch` el efecto de `changes` (producto -> cambio) en `store_stats`.
+
+        `basis` es {producto: (precio, cantidad anterior)} (ver `_stock_basis`); si no
+        se pasa, se lee de los documentos de los productos afectados.
+        """
+        if basis is None:
+            basis = self._stock_basis(store_id, changes)
+        stats.queue_delta(batch, store_id, **stats.stock_deltas(
+            (change, *basis.get(pid, (0.0, None))) for pid, change in changes.items()
+        ))
+
+    def _increment_stock(self, batch, product_id: str, store_id: str, change: int, shards: int = 0, shard: Optional[int] = None):
+        """Encola `Increment(change)` en la entrada de inventario o en un shard (`shard` o uno al azar)."""
+        if shards > 1:
+            index = shard if shard is not None else random.randrange(shards)
+            batch.set(self._shard_ref(product_id, store_id, index), {
+                'product_id': product_id,
+                'store_id': store_id,
+                'quantity': firestore.Increment(change),
+            }, merge=True)
+        else:
+            batch.set(self._inventory_ref(product_id, store_id), {
+                'product_id': product_id,
+                'store_id': store_id,
+                'quantity': firestore.Increment(change),
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            }, merge=True)
+
+    def adjust_stock(self, product_id: str, store_id: str, change: int, reason: str, user_email: str, product_name: Optional[str] = None) -> bool:
+        """Ajusta el stock (positivo o negativo) y registra un movimiento.
+
+        El inventario se actualiza con `firestore.Increment` (seguro con varios
+        cajeros en paralelo) y se confirma junto con el movimiento en un único batch.
+        En productos con contador distribuido el incremento va a un shard al azar.
+        Con el journal local activo (`modules.journal`) sólo se escribe en disco y
+        el envío lo hace el hilo de sincronización.
+        """
+        journal = get_journal()
+        if journal is not None:
+            try:
+                journal.append(store_id, [{'product_id': product_id, 'change': int(change), 'product_name': product_name}], reason, user_email)
+                return True
+            except Exception:
+                logger.exception("Error guardando ajuste en el journal")
+                return False
         try:
-            # obtener inventario actual
-            q = db.collection('inventory').where('product_id', '==', product_id).where('store_id', '==', store_id).limit(1).get()
-            if q:
-                doc = q[0]
-                current = doc.to_dict().get('quantity', 0)
-                new_qty = int(current) + int(change)
-                db.collection('inventory').document(doc.id).update({'quantity': new_qty, 'updated_at': firestore.SERVER_TIMESTAMP})
-            else:
-                # crear con la cantidad indicada
-                db.collection('inventory').add({
-                    'product_id': product_id,
-                    'store_id': store_id,
-                    'quantity': int(change),
-                    'updated_at': firestore.SERVER_TIMESTAMP,
-                })
-
-            # Registrar movimiento
-            self._add_movement(product_id, store_id, int(change), reason, user_email)
+            shards = self._shard_counts(store_id).get(product_id, 0)
+            batch = db.batch()
+            self._increment_stock(batch, product_id, store_id, int(change), shards)
+            self._add_movement(product_id, store_id, int(change), reason, user_email, product_name=product_name, batch=batch)
+            self._queue_stock_stats(batch, store_id, {product_id: int(change)})
+            batch.commit()
+            invalidate(('inventory', store_id))
+            invalidate_namespace('movements')
+            stats.invalidate_stats(store_id)
             return True
         except Exception:
             logger.exception("Error ajustando stock")
             return False
 
-    def _add_movement(self, product_id: str, store_id: str, change: int, reason: str, user_email: str):
+    def adjust_stock_bulk(self, store_id: str, changes: Iterable[Dict[str, Any]], reason: str, user_email: str) -> int:
+        """Aplica muchos ajustes de stock con batches de a lo sumo BATCH_LIMIT operaciones.
+
+        `changes` son dicts con 'product_id', 'change' y opcionalmente 'product_name';
+        los cambios en 0 se ignoran. Cada ajuste son dos escrituras (inventario y
+        movimiento) que siempre van en el mismo batch. Devuelve cuántos ajustes se
+        confirmaron; si un batch falla se registra y se continúa con el siguiente.
+        """
+        journal = get_journal()
+        if journal is not None:
+            entries = [{
+                'store_id': store_id,
+                'movements': [{'product_id': item['product_id'], 'change': int(item.get('change') or 0), 'product_name': item.get('product_name')}],
+                'reason': reason,
+                'user': user_email,
+            } for item in changes if int(item.get('change') or 0)]
+            try:
+                return len(journal.append_many(entries)) if entries else 0
+            except Exception:
+                logger.exception("Error guardando ajustes en el journal")
+                return 0
+        applied = 0
+        pending = 0
+        batch_changes: Dict[str, int] = {}
+        shard_counts = self._shard_counts(store_id)
+        batch = db.batch()
+
+        def flush():
+            nonlocal applied, pending, batch, batch_changes
+            if not pending:
+                return
+            try:
+                self._queue_stock_stats(batch, store_id, batch_changes)
+                batch.commit()
+                applied += pending
+            except Exception:
+                logger.exception("Error confirmando batch de ajustes de stock (%d ajustes)", pending)
+            pending = 0
+            batch_changes = {}
+            batch = db.batch()
+
+        for item in changes:
+            change = int(item.get('change') or 0)
+            if change == 0:
+                continue
+            # Dos escrituras por ajuste más la de store_stats
+            if (pending + 1) * 2 + 1 > BATCH_LIMIT:
+                flush()
+            product_id = item['product_id']
+            self._increment_stock(batch, product_id, store_id, change, shard_counts.get(product_id, 0))
+            self._add_movement(product_id, store_id, change, reason, user_email, product_name=item.get('product_name'), batch=batch)
+            batch_changes[product_id] = batch_changes.get(product_id, 0) + change
+            pending += 1
+        flush()
+        if applied:
+            invalidate(('inventory', store_id))
+            invalidate_namespace('movements')
+            stats.invalidate_stats(store_id)
+        return applied
+
+    def _add_movement(self, product_id: str, store_id: str, change: int, reason: str, user_email: str, product_name: Optional[str] = None, batch=None):
+        """Registra un movimiento. Con `batch` sólo encola la escritura."""
         try:
             mov = {
                 'product_id': product_id,
+                'product_name': product_name,
                 'store_id': store_id,
                 'change': int(change),
                 'reason': reason,
                 'user': user_email,
                 'timestamp': firestore.SERVER_TIMESTAMP,
             }
-            db.collection('movements').add(mov)
+            if batch is not None:
+                batch.set(db.collection('movements').document(), mov)
+            else:
+                db.collection('movements').add(mov)
         except Exception:
             logger.exception("Error registrando movimiento")
 
-    def get_movements_by_store(self, store_id: str, limit: int = 50) -> list:
+    def _movement_rows(self, snaps) -> list:
+        """Convierte snapshots de movimientos en dicts para la UI.
+
+        Los movimientos antiguos sin `product_name` desnormalizado se resuelven
+        con una única lectura en bloque (`_get_products_map`), no una por fila.
+        """
+        docs = [(m.id, m.to_dict()) for m in snaps]
+        missing = [d.get('product_id') for _, d in docs if not d.get('product_name')]
+        products = self._get_products_map(missing) if missing else {}
+        results = []
+        for mov_id, d in docs:
+            prod_name = d.get('product_name') or products.get(d.get('product_id'), {}).get('name')
+            results.append({
+                'id': mov_id,
+                'product_id': d.get('product_id'),
+                'product_name': prod_name,
+                'change': d.get('change'),
+                'reason': d.get('reason'),
+                'user': d.get('user'),
+                'timestamp': d.get('timestamp'),
+            })
+        return results
+
+    def _movements_page(self, query, collection, page_size: int, page_token: Optional[str]) -> Dict[str, Any]:
+        """Ejecuta `query` paginada; `collection` es donde vive el documento cursor."""
+        query = query.order_by('timestamp', direction=firestore.Query.DESCENDING)
+        if page_token:
+            cursor = collection.document(page_token).get()
+            if cursor.exists:
+                query = query.start_after(cursor)
+        # Pedimos un documento extra para saber si existe una página siguiente
+        snaps = list(query.limit(page_size + 1).get())
+        has_more = len(snaps) > page_size
+        snaps = snaps[:page_size]
+        return {
+            'items': self._movement_rows(snaps),
+            'next_page_token': snaps[-1].id if has_more and snaps else None,
+        }
+
+    def get_movements_page(self, store_id: str, page_size: int = 25, page_token: Optional[str] = None) -> Dict[str, Any]:
+        """Página de movimientos de la tienda, del más reciente al más antiguo.
+
+        `page_token` es el id del último movimiento de la página anterior (o None
+        para la primera). Devuelve {'items': [...], 'next_page_token': str | None}.
+        Cuesta page_size + 1 lecturas, más una por el cursor y una por cada
+        producto distinto sin `product_name` desnormalizado.
+        """
+        empty = {'items': [], 'next_page_token': None}
         try:
-            mov_ref = db.collection('movements').where('store_id', '==', store_id).order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit).get()
-            results = []
-            for m in mov_ref:
-                d = m.to_dict()
-                # attach product name if available
-                prod = db.collection('products').document(d.get('product_id')).get() if d.get('product_id') else None
-                prod_name = prod.to_dict().get('name') if prod and prod.exists else None
-                results.append({
-                    'id': m.id,
-                    'product_id': d.get('product_id'),
-                    'product_name': prod_name,
-                    'change': d.get('change'),
-                    'reason': d.get('reason'),
-                    'user': d.get('user'),
-                    'timestamp': d.get('timestamp'),
-                })
-            return results
+            movements = db.collection('movements')
+            query = movements.where('store_id', '==', store_id)
+            return coalesce(
+                ('movements', store_id, page_size, page_token),
+                lambda: self._movements_page(query, movements, page_size, page_token),
+            )
         except Exception as exc:
             # Manejar errores de índice de Firestore (requiere index compuesto)
             try:
@@ -157,49 +511,164 @@ class ProductManagement:
                 logger.error("Firestore requiere un índice compuesto para esta consulta: %s", exc)
                 # Intentar lectura alternativa: movimientos como subcolección bajo stores/{store_id}/movements
                 try:
-                    alt_ref = db.collection('stores').document(store_id).collection('movements').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit).get()
-                    results = []
-                    for m in alt_ref:
-                        d = m.to_dict()
-                        prod = db.collection('products').document(d.get('product_id')).get() if d.get('product_id') else None
-                        prod_name = prod.to_dict().get('name') if prod and prod.exists else None
-                        results.append({
-                            'id': m.id,
-                            'product_id': d.get('product_id'),
-                            'product_name': prod_name,
-                            'change': d.get('change'),
-                            'reason': d.get('reason'),
-                            'user': d.get('user'),
-                            'timestamp': d.get('timestamp'),
-                        })
-                    if results:
+                    alt = db.collection('stores').document(store_id).collection('movements')
+                    page = self._movements_page(alt, alt, page_size, page_token)
+                    if page['items']:
                         logger.info("Movements leídos desde subcolección stores/%s/movements como fallback", store_id)
-                        return results
+                        return page
                 except Exception:
                     logger.exception("Error intentando leer movimientos desde subcolección como fallback")
 
-                # Devolver lista vacía para evitar crash en la UI; el mensaje detallado se mostrará en logs.
-                return []
+                # Devolver página vacía para evitar crash en la UI; el mensaje detallado se mostrará en logs.
+                return empty
 
             logger.exception("Error obteniendo movimientos: %s", exc)
-            return []
+            return empty
+
+    def get_movements_by_store(self, store_id: str, limit: int = 50) -> list:
+        """Compatibilidad: primeros `limit` movimientos (ver `get_movements_page`)."""
+        return self.get_movements_page(store_id, page_size=limit)['items']
+
+    def _get_products_map(self, product_ids) -> Dict[str, Dict[str, Any]]:
+        """Lee varios productos con `get_all` en bloques de PRODUCT_FETCH_CHUNK.
+
+        Devuelve {product_id: datos}; los productos inexistentes no aparecen.
+        Cuesta una lectura por producto distinto y ceil(n / PRODUCT_FETCH_CHUNK) RPCs.
+        """
+        ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+        products: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(ids), PRODUCT_FETCH_CHUNK):
+            refs = [db.collection('products').document(pid) for pid in ids[i:i + PRODUCT_FETCH_CHUNK]]
+            for snap in db.get_all(refs):
+                if snap.exists:
+                    products[snap.id] = snap.to_dict()
+        return products
+
+    def _load_inventory(self, store_id: str) -> list:
+        # Mientras existan documentos con id automático (previos a la migración)
+        # puede haber dos entradas por producto: sus cantidades se suman.
+        # Los shards de los contadores distribuidos se leen en una sola consulta de grupo.
+        inventory_docs = [inv.to_dict() for inv in db.collection('inventory').where('store_id', '==', store_id).get()]
+        inventory_docs += [sh.to_dict() for sh in db.collection_group('shards').where('store_id', '==', store_id).get()]
+        quantities = self._sum_quantities(inventory_docs)
+        # Si el catálogo de la tienda ya se leyó en esta ejecución, se reutiliza y
+        # sólo se piden los productos que falten.
+        products: Dict[str, Dict[str, Any]] = {}
+        scope = current_scope()
+        catalog = scope.peek(('products', store_id)) if scope else None
+        if catalog:
+            products = {p['id']: p for p in catalog if p.get('id') in quantities}
+            scope.saved += len(products)
+        missing = [pid for pid in quantities if pid not in products]
+        if missing:
+            products.update(self._get_products_map(missing))
+        return self._inventory_rows(quantities, products, self._shards_by_product(inventory_docs))
+
+    @staticmethod
+    def _shards_by_product(inventory_docs) -> Dict[str, int]:
+        return {d['product_id']: int(d['shards']) for d in inventory_docs if d.get('shards')}
+
+    @staticmethod
+    def _sum_quantities(inventory_docs) -> Dict[str, int]:
+        quantities: Dict[str, int] = {}
+        for d in inventory_docs:
+            quantities[d['product_id']] = quantities.get(d['product_id'], 0) + int(d.get('quantity', 0))
+        return quantities
+
+    @staticmethod
+    def _inventory_rows(quantities: Dict[str, int], products: Dict[str, Dict[str, Any]], shards: Dict[str, int]) -> list:
+        results = []
+        for product_id, quantity in quantities.items():
+            prod_data = products.get(product_id, {})
+            results.append({
+                'product_id': product_id,
+                'sku': prod_data.get('sku'),
+                'name': prod_data.get('name'),
+                'quantity': quantity,
+                'shards': shards.get(product_id, 0),
+            })
+        return results
 
     def get_inventory_for_store(self, store_id: str) -> list:
+        """Inventario de la tienda unido con sku/nombre del producto.
+
+        Lecturas en el peor caso: N documentos de inventario + P productos distintos,
+        en 1 + ceil(P / PRODUCT_FETCH_CHUNK) round trips (antes eran N + 1 secuenciales).
+        El resultado se cachea por tienda y los ajustes de stock lo invalidan. Con la
+        réplica en tiempo real activa (`modules.replica`) se arma desde memoria. Los
+        movimientos del journal local aún sin sincronizar se suman a las cantidades.
+        """
+        replica = replica_for(store_id)
+        if replica is not None:
+            inventory_docs, products = replica.inventory_snapshot()
+            rows = self._inventory_rows(self._sum_quantities(inventory_docs), products, self._shards_by_product(inventory_docs))
+        else:
+            try:
+                rows = read_through(('inventory', store_id), lambda: self._load_inventory(store_id))
+            except Exception:
+                logger.exception("Error obteniendo inventario")
+                return []
+        journal = get_journal()
+        if journal is not None:
+            deltas = journal.pending_deltas(store_id)
+            for item in rows:
+                item['quantity'] += deltas.get(item['product_id'], 0)
+        return rows
+
+    def get_stock(self, product_id: str, store_id: str) -> int:
+        """Stock actual de un producto leído del servidor (entrada + shards), sin caché."""
+        entry = self._inventory_ref(product_id, store_id).get()
+        total = int((entry.to_dict() or {}).get('quantity', 0)) if entry.exists else 0
+        for shard in self._inventory_ref(product_id, store_id).collection('shards').get():
+            total += int(shard.to_dict().get('quantity', 0))
+        return total
+
+    def enable_sharding(self, product_id: str, store_id: str, shards: int = DEFAULT_STOCK_SHARDS) -> bool:
+        """Pasa el contador de stock del producto a modo distribuido con `shards` shards.
+
+        No mueve cantidades: lo que ya está en la entrada sigue contando y los nuevos
+        ajustes se reparten entre los shards, que se crean con el primer incremento.
+        """
+        if shards < 2:
+            raise ValueError("Un contador distribuido necesita al menos 2 shards")
+        try:
+            self._inventory_ref(product_id, store_id).set({
+                'product_id': product_id,
+                'store_id': store_id,
+                'shards': int(shards),
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            }, merge=True)
+            invalidate(('inventory', store_id), ('shard_counts', store_id))
+            return True
+        except Exception:
+            logger.exception("Error activando contador distribuido")
+            return False
+
+    def disable_sharding(self, product_id: str, store_id: str) -> bool:
+        """Vuelve al modo de documento único trasladando el valor de los shards a la entrada.
+
+        Cada shard se descuenta y la entrada se incrementa en el mismo batch, con
+        `Increment` en ambos lados: los ajustes concurrentes que caigan en un shard
+        se conservan allí y se siguen sumando en la lectura.
+        """
         try:
-            inv_ref = db.collection('inventory').where('store_id', '==', store_id).get()
-            results = []
-            for inv in inv_ref:
-                d = inv.to_dict()
-                # obtener producto
-                prod = db.collection('products').document(d['product_id']).get()
-                prod_data = prod.to_dict() if prod.exists else {}
-                results.append({
-                    'product_id': d['product_id'],
-                    'sku': prod_data.get('sku'),
-                    'name': prod_data.get('name'),
-                    'quantity': d.get('quantity', 0),
-                })
-            return results
+            batch = db.batch()
+            moved = 0
+            for shard in self._inventory_ref(product_id, store_id).collection('shards').get():
+                qty = int(shard.to_dict().get('quantity', 0))
+                if qty:
+                    batch.set(shard.reference, {'quantity': firestore.Increment(-qty)}, merge=True)
+                    moved += qty
+            batch.set(self._inventory_ref(product_id, store_id), {
+                'product_id': product_id,
+                'store_id': store_id,
+                'quantity': firestore.Increment(moved),
+                'shards': 0,
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            }, merge=True)
+            batch.commit()
+            invalidate(('inventory', store_id), ('shard_counts', store_id))
+            return True
         except Exception:
-            logger.exception("Error obteniendo inventario")
-            return []
+            logger.exception("Error desactivando contador distribuido")
+            return False
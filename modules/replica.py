@@ -0,0 +1,208 @@
+"""Réplica en memoria de productos e inventario por tienda, mantenida con listeners.
+
+Con APP_REALTIME_REPLICA=1, cada tienda con al menos una sesión activa tiene
+listeners `on_snapshot` (productos, inventario y shards de stock de esa tienda) que actualizan una
+copia en el proceso a partir de los cambios, sin volver a consultar. Todas las
+sesiones de la tienda comparten la misma réplica; cada sesión toma un "lease" y,
+cuando la última lo suelta (o su session_state se libera), se cancelan los listeners.
+
+Las escrituras propias llegan a la réplica por el listener, normalmente en menos de
+un segundo, así que justo después de un ajuste la lectura puede ir un instante por
+detrás. Si los listeners no entregan su primer snapshot en READY_TIMEOUT (p. ej.
+falta el override de índice de `shards`), la réplica se marca como fallida, se
+cancelan sus listeners y las lecturas van por consulta sin volver a esperar hasta
+que la suelte la última sesión. El backend SQLite no tiene listeners: ahí la
+réplica nunca se activa y las lecturas siguen yendo a la caché normal.
+"""
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+from firebase_config import db
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('APP_REALTIME_REPLICA', '').strip().lower() in ('1', 'true', 'yes')
+# Tiempo máximo que se espera al primer snapshot antes de leer por consulta
+READY_TIMEOUT = float(os.environ.get('APP_REPLICA_READY_TIMEOUT', '5'))
+
+
+class StoreReplica:
+    """Productos e inventario de una tienda, actualizados desde los listeners."""
+
+    def __init__(self, store_id: str):
+        self.store_id = store_id
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self.inventory: Dict[str, Dict[str, Any]] = {}
+        self.shards: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._ready = {name: threading.Event() for name in ('products', 'inventory', 'shards')}
+        self._wait_lock = threading.Lock()
+        self.failed = False
+        self._watches = []
+
+    def start(self):
+        for name in ('products', 'inventory'):
+            query = db.collection(name).where('store_id', '==', self.store_id)
+            self._watches.append(query.on_snapshot(self._listener(name)))
+        shards = db.collection_group('shards').where('store_id', '==', self.store_id)
+        self._watches.append(shards.on_snapshot(self._listener('shards')))
+
+    def stop(self):
+        for watch in self._watches:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                logger.exception("Error cancelando listener de la tienda %s", self.store_id)
+        self._watches = []
+
+    def _listener(self, name: str):
+        target = getattr(self, name)
+
+        def on_snapshot(_docs, changes, _read_time):
+            # Corre en el hilo del listener de Firestore. Los shards de distintos
+            # productos comparten id ('0', '1', ...), así que se indexan por ruta.
+            with self._lock:
+                for change in changes:
+                    key = change.document.reference.path if name == 'shards' else change.document.id
+                    if change.type.name == 'REMOVED':
+                        target.pop(key, None)
+                    else:
+                        target[key] = change.document.to_dict()
+            self._ready[name].set()
+        return on_snapshot
+
+    def wait_ready(self, timeout: float = READY_TIMEOUT) -> bool:
+        return all(event.wait(timeout) for event in self._ready.values())
+
+    def is_ready(self) -> bool:
+        return all(event.is_set() for event in self._ready.values())
+
+    def ensure_ready(self) -> bool:
+        """Espera el primer snapshot una sola vez; si no llega, cancela los listeners y queda fallida."""
+        if self.failed:
+            return False
+        if self.is_ready():
+            return True
+        with self._wait_lock:
+            if not self.failed and not self.wait_ready():
+                self.failed = True
+                self.stop()
+                logger.warning("La réplica de la tienda %s no recibió su primer snapshot en %.1f s; "
+                               "se lee por consulta", self.store_id, READY_TIMEOUT)
+        return not self.failed
+
+    def product_list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{**data, 'id': pid} for pid, data in self.products.items()]
+
+    def inventory_snapshot(self):
+        """(documentos de inventario y shards, productos por id) copiados bajo el lock."""
+        with self._lock:
+            docs = [dict(d) for d in self.inventory.values()] + [dict(d) for d in self.shards.values()]
+            return docs, {pid: dict(d) for pid, d in self.products.items()}
+
+
+class _Registry:
+    """Réplicas activas por tienda con su número de sesiones."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._replicas: Dict[str, StoreReplica] = {}
+        self._refs: Dict[str, int] = {}
+
+    def acquire(self, store_id: str) -> Optional[StoreReplica]:
+        with self._lock:
+            replica = self._replicas.get(store_id)
+            if replica is None:
+                replica = StoreReplica(store_id)
+                try:
+                    replica.start()
+                except Exception:
+                    logger.exception("No se pudo iniciar la réplica de la tienda %s", store_id)
+                    replica.stop()
+                    return None
+                self._replicas[store_id] = replica
+            self._refs[store_id] = self._refs.get(store_id, 0) + 1
+            return replica
+
+    def release(self, store_id: str):
+        with self._lock:
+            refs = self._refs.get(store_id, 0) - 1
+            if refs > 0:
+                self._refs[store_id] = refs
+                return
+            self._refs.pop(store_id, None)
+            replica = self._replicas.pop(store_id, None)
+        if replica is not None:
+            replica.stop()
+            logger.info("Réplica de la tienda %s cerrada (sin sesiones)", store_id)
+
+    def get(self, store_id: str) -> Optional[StoreReplica]:
+        return self._replicas.get(store_id)
+
+    def active_stores(self) -> List[str]:
+        with self._lock:
+            return list(self._replicas)
+
+
+registry = _Registry()
+
+
+class Lease:
+    """Participación de una sesión en la réplica de una tienda.
+
+    Se guarda en session_state; si la sesión termina sin llamar a `close`, el
+    finalizador suelta la réplica cuando Streamlit libera el estado de la sesión.
+    """
+
+    def __init__(self, store_id: str, replica: StoreReplica):
+        self.store_id = store_id
+        self.replica = replica
+        self._finalizer = weakref.finalize(self, registry.release, store_id)
+
+    def close(self):
+        self._finalizer()
+
+
+def supported() -> bool:
+    """La réplica necesita listeners, que sólo ofrece Firestore."""
+    from firebase_config import storage_backend
+
+    return ENABLED and storage_backend() != 'sqlite'
+
+
+def attach_session(session_state, store_id: str) -> Optional[Lease]:
+    """Asegura que la sesión mantiene viva la réplica de `store_id` (y sólo esa)."""
+    if not supported():
+        return None
+    lease = session_state.get('_replica_lease')
+    if lease is not None and lease.store_id == store_id:
+        return lease
+    if lease is not None:
+        lease.close()
+    replica = registry.acquire(store_id)
+    if replica is None:
+        session_state.pop('_replica_lease', None)
+        return None
+    lease = Lease(store_id, replica)
+    session_state['_replica_lease'] = lease
+    return lease
+
+
+def detach_session(session_state):
+    lease = session_state.pop('_replica_lease', None)
+    if lease is not None:
+        lease.close()
+
+
+def replica_for(store_id: str) -> Optional[StoreReplica]:
+    """Réplica lista para leer de `store_id`, o None para leer por consulta."""
+    if not ENABLED:
+        return None
+    replica = registry.get(store_id)
+    if replica is None or not replica.ensure_ready():
+        return None
+    return replica
@@ -0,0 +1,288 @@
+"""Reportes de ventas y movimientos calculados en columnas (NumPy/pandas).
+
+Los movimientos de la tienda se leen por páginas de FETCH_PAGE_SIZE documentos
+(sólo producto, cambio, motivo y fecha) y se vuelcan a arreglos NumPy: producto y
+motivo como códigos enteros, cambio como int32 y día como índice desde el inicio
+del rango. Son 20 bytes por fila (un millón ≈ 20 MB), sin guardar los
+documentos. Ventas por día/semana, productos con más movimiento, rotación y
+desglose por motivo salen de group-bys vectorizados sobre esos arreglos.
+
+Los días ya compactados en `movement_rollups` (`modules.rollups`) entran como dos
+filas por bucket y motivo (entradas y salidas, con su número de movimientos); sólo
+lo posterior a la marca de agua se lee movimiento a movimiento.
+
+El resultado se cachea por (tienda, rango) durante APP_REPORT_TTL segundos. Las
+fechas son días UTC.
+"""
+import datetime
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from firebase_config import db
+from modules import rollups
+from modules.cache import read_through
+
+logger = logging.getLogger(__name__)
+
+FETCH_PAGE_SIZE = 5000
+# Páginas de rollup que un reporte procesa antes de calcularse (el resto se lee en crudo)
+ROLLUP_PAGES_PER_REPORT = 5
+REPORT_TTL = float(os.environ.get('APP_REPORT_TTL', '300'))
+DEFAULT_TOP = 10
+
+
+def _as_utc(value: datetime.date) -> datetime.datetime:
+    if isinstance(value, datetime.datetime):
+        return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+    return datetime.datetime(value.year, value.month, value.day, tzinfo=datetime.timezone.utc)
+
+
+class MovementColumns:
+    """Movimientos en arreglos paralelos que crecen por bloques (sin una lista de dicts).
+
+    `moves` es cuántos movimientos representa la fila: 1 para un movimiento leído
+    tal cual, el contador del bucket para las filas que salen de un rollup.
+    """
+
+    def __init__(self, start: datetime.datetime, capacity: int = FETCH_PAGE_SIZE):
+        self.start = start
+        self.size = 0
+        self.product = np.empty(capacity, dtype=np.int32)
+        # Los motivos son texto libre: int32 para no quedarse corto de códigos
+        self.reason = np.empty(capacity, dtype=np.int32)
+        self.change = np.empty(capacity, dtype=np.int32)
+        self.day = np.empty(capacity, dtype=np.int32)
+        self.moves = np.empty(capacity, dtype=np.int32)
+        self.product_ids: Dict[str, int] = {}
+        self.reasons: Dict[str, int] = {}
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        if needed <= len(self.product):
+            return
+        capacity = max(needed, 2 * len(self.product))
+        for name in ('product', 'reason', 'change', 'day', 'moves'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def extend(self, rows: Iterable[Tuple[str, int, str, int, int]]):
+        """Añade filas (product_id, cambio, motivo, día desde `start`, movimientos)."""
+        rows = list(rows)
+        self._reserve(len(rows))
+        n = self.size
+        for product_id, change, reason, day, moves in rows:
+            self.product[n] = self.product_ids.setdefault(product_id, len(self.product_ids))
+            self.reason[n] = self.reasons.setdefault(reason or 'sin motivo', len(self.reasons))
+            self.change[n] = change
+            self.day[n] = day
+            self.moves[n] = moves
+            n += 1
+        self.size = n
+
+    def day_of(self, ts: datetime.datetime) -> int:
+        return int((ts.timestamp() - self.start.timestamp()) // 86400)
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame con columnas categóricas product_id y reason (sin copiar los códigos)."""
+        n = self.size
+        return pd.DataFrame({
+            'product_id': pd.Categorical.from_codes(self.product[:n], list(self.product_ids)),
+            'reason': pd.Categorical.from_codes(self.reason[:n], list(self.reasons)),
+            'change': self.change[:n],
+            'day': self.day[:n],
+            'moves': self.moves[:n],
+        })
+
+
+def load_movements(store_id: str, start: datetime.datetime, end: Optional[datetime.datetime] = None,
+                   columns: Optional[MovementColumns] = None) -> MovementColumns:
+    """Lee los movimientos de la tienda en [start, end) por páginas ordenadas por fecha."""
+    query = (db.collection('movements')
+             .where('store_id', '==', store_id)
+             .where('timestamp', '>=', start))
+    if end is not None:
+        query = query.where('timestamp', '<', end)
+    query = query.order_by('timestamp').select(['product_id', 'change', 'reason', 'timestamp']).limit(FETCH_PAGE_SIZE)
+    if columns is None:
+        columns = MovementColumns(start)
+    last = None
+    while True:
+        page = (query.start_after(last) if last is not None else query).get()
+        if not page:
+            break
+        columns.extend(
+            (d.get('product_id'), int(d.get('change') or 0), d.get('reason'), columns.day_of(d['timestamp']), 1)
+            for d in (snap.to_dict() for snap in page) if d.get('timestamp') is not None
+        )
+        if len(page) < FETCH_PAGE_SIZE:
+            break
+        last = page[-1]
+    return columns
+
+
+def load_rollups(store_id: str, start: datetime.datetime, end: datetime.date, columns: MovementColumns) -> MovementColumns:
+    """Añade los buckets de [start, end] como filas de entradas y salidas por motivo."""
+    for bucket in rollups.get_buckets(store_id, start.date(), end):
+        day = (datetime.date.fromisoformat(bucket['day']) - start.date()).days
+        rows = []
+        for reason, values in (bucket.get('reasons') or {}).items():
+            count = int(values.get('count', 0))
+            units_in, units_out = int(values.get('in', 0)), int(values.get('out', 0))
+            # El número de movimientos va en una de las dos filas para no contarlo dos veces
+            if units_in or not units_out:
+                rows.append((bucket['product_id'], units_in, reason, day, count))
+                count = 0
+            if units_out:
+                rows.append((bucket['product_id'], -units_out, reason, day, count))
+        columns.extend(rows)
+    return columns
+
+
+def _period_labels(start: datetime.datetime, days: np.ndarray, freq: str) -> pd.DatetimeIndex:
+    dates = pd.to_datetime(start.date()) + pd.to_timedelta(days, unit='D')
+    if freq == 'W':
+        # Semana que empieza el lunes
+        return dates - pd.to_timedelta(dates.dayofweek, unit='D')
+    return dates
+
+
+def sales_by_period(frame: pd.DataFrame, start: datetime.datetime, freq: str = 'D') -> pd.DataFrame:
+    """Unidades vendidas por periodo ('D' o 'W') y producto, en formato largo."""
+    sales = frame[frame['reason'] == 'sale']
+    if sales.empty:
+        return pd.DataFrame(columns=['period', 'product_id', 'units'])
+    grouped = (pd.DataFrame({
+        'period': _period_labels(start, sales['day'].to_numpy(), freq),
+        'product_id': sales['product_id'],
+        'units': -sales['change'].to_numpy(),
+    }).groupby(['period', 'product_id'], observed=True, as_index=False)['units'].sum())
+    return grouped.sort_values(['period', 'units'], ascending=[True, False], ignore_index=True)
+
+
+def movement_totals(frame: pd.DataFrame) -> pd.DataFrame:
+    """Entradas, salidas, neto y número de movimientos por producto."""
+    change = frame['change'].to_numpy()
+    totals = pd.DataFrame({
+        'product_id': frame['product_id'],
+        'units_in': np.where(change > 0, change, 0),
+        'units_out': np.where(change < 0, -change, 0),
+        'sold': np.where((frame['reason'] == 'sale').to_numpy(), -change, 0),
+        'net': change,
+        'moves': frame['moves'].to_numpy(),
+    })
+    return totals.groupby('product_id', observed=True).sum()
+
+
+def top_movers(totals: pd.DataFrame, n: int = DEFAULT_TOP) -> pd.DataFrame:
+    """Productos con más unidades movidas (entradas + salidas)."""
+    moved = totals['units_in'] + totals['units_out']
+    return totals.assign(moved=moved).nlargest(n, 'moved').reset_index()
+
+
+def reason_breakdown(frame: pd.DataFrame) -> pd.DataFrame:
+    """Movimientos, entradas, salidas y neto por motivo."""
+    change = frame['change'].to_numpy()
+    return (pd.DataFrame({
+        'reason': frame['reason'],
+        'moves': frame['moves'].to_numpy(),
+        'units_in': np.where(change > 0, change, 0),
+        'units_out': np.where(change < 0, -change, 0),
+        'net': change,
+    }).groupby('reason', observed=True).sum().sort_values('moves', ascending=False).reset_index())
+
+
+def turnover(columns: MovementColumns, current_stock: Dict[str, int], days: int) -> pd.DataFrame:
+    """Rotación por producto: unidades vendidas / stock medio al cierre de cada día.
+
+    El cierre del día d es el stock actual menos el neto de los días posteriores,
+    así que un cambio del día e resta de los cierres de los min(e, days) días del
+    reporte anteriores a él. El stock medio es entonces
+    `actual - Σ cambio · min(día, days) / days`: una suma ponderada por producto
+    sobre las filas, sin matriz productos × días. `columns` debe llegar hasta hoy
+    para que la reconstrucción cuadre; `days` es cuántos días del principio entran
+    en el reporte.
+    """
+    n = columns.size
+    products = list(columns.product_ids)
+    if not n or not products:
+        return pd.DataFrame(columns=['product_id', 'sold', 'avg_stock', 'turnover'])
+    weights = columns.change[:n].astype(np.float64) * np.minimum(columns.day[:n], days)
+    shift = np.bincount(columns.product[:n], weights=weights, minlength=len(products))
+    now = np.array([current_stock.get(pid, 0) for pid in products], dtype=np.float64)
+    avg_stock = now - shift / days
+
+    is_sale = columns.reason[:n] == columns.reasons.get('sale', -1)
+    in_range = columns.day[:n] < days
+    mask = is_sale & in_range
+    sold = np.bincount(columns.product[:n][mask], weights=-columns.change[:n][mask], minlength=len(products))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(avg_stock > 0, sold / avg_stock, np.nan)
+    result = pd.DataFrame({'product_id': products, 'sold': sold.astype(np.int64), 'avg_stock': avg_stock.round(1), 'turnover': rate.round(2)})
+    return result.sort_values('turnover', ascending=False, na_position='last', ignore_index=True)
+
+
+def build_report(store_id: str, start: datetime.date, end: datetime.date, top: int = DEFAULT_TOP) -> Dict[str, Any]:
+    """Reporte de [start, end] (días incluidos): ventas diarias/semanales, top, rotación y motivos.
+
+    Se cubre desde `start` hasta hoy: lo posterior a `end` sólo sirve para
+    reconstruir el stock de los días del reporte. Antes se compacta lo pendiente
+    (como mucho ROLLUP_PAGES_PER_REPORT páginas); los días completos hasta la marca
+    de agua salen de los buckets y desde ese día se leen los movimientos.
+    """
+    from modules.products import ProductManagement
+
+    start_dt = _as_utc(start)
+    end_dt = _as_utc(end) + datetime.timedelta(days=1)
+    days = (end_dt - start_dt).days
+    try:
+        rollups.roll_up(store_id, max_pages=ROLLUP_PAGES_PER_REPORT)
+    except Exception:
+        logger.exception("Error compactando movimientos de la tienda %s", store_id)
+    columns = MovementColumns(start_dt)
+    watermark = rollups.get_rollup_state(store_id).get('last_timestamp')
+    raw_from = start_dt
+    if watermark is not None and watermark >= start_dt:
+        # El día de la marca está a medias en los buckets: desde ahí se lee todo en
+        # crudo (también lo del journal, cuyos buckets de esos días no se usan)
+        raw_from = _as_utc(watermark.astimezone(datetime.timezone.utc).date())
+        if raw_from > start_dt:
+            load_rollups(store_id, start_dt, raw_from.date() - datetime.timedelta(days=1), columns)
+    load_movements(store_id, raw_from, columns=columns)
+    frame = columns.frame()
+    in_range = frame[frame['day'] < days]
+
+    pm = ProductManagement()
+    names = {p['id']: p.get('name') for p in pm.get_products_by_store(store_id)}
+    stock = {item['product_id']: item['quantity'] for item in pm.get_inventory_for_store(store_id)}
+
+    def named(df: pd.DataFrame) -> pd.DataFrame:
+        if 'product_id' in df.columns:
+            df.insert(df.columns.get_loc('product_id') + 1, 'product_name', df['product_id'].astype(str).map(names))
+        return df
+
+    totals = movement_totals(in_range)
+    return {
+        'movements': int(in_range['moves'].sum()),
+        'units_sold': int(totals['sold'].sum()) if len(totals) else 0,
+        'daily': named(sales_by_period(in_range, start_dt, 'D')),
+        'weekly': named(sales_by_period(in_range, start_dt, 'W')),
+        'top_movers': named(top_movers(totals, top)),
+        'turnover': named(turnover(columns, stock, days)),
+        'reasons': reason_breakdown(in_range),
+    }
+
+
+def get_report(store_id: str, start: datetime.date, end: datetime.date) -> Optional[Dict[str, Any]]:
+    """`build_report` cacheado por (tienda, rango); None si la lectura falla."""
+    try:
+        return read_through(('report', store_id, start.isoformat(), end.isoformat()),
+                            lambda: build_report(store_id, start, end), ttl=REPORT_TTL)
+    except Exception:
+        logger.exception("Error generando reporte de movimientos")
+        return None
@@ -0,0 +1,167 @@
+"""Rollups diarios de movimientos: un documento por tienda, producto y día.
+
+`movement_rollups/{store_id}:{product_id}:{YYYY-MM-DD}` guarda neto, entradas,
+salidas y número de movimientos, en total y por motivo (`reasons.{motivo}`). Un
+año de un producto son 365 documentos en lugar de todos sus movimientos.
+
+`roll_up(store_id)` avanza desde la marca de agua guardada en
+`rollup_state/{store_id}` (timestamp e id del último movimiento procesado). Cada
+página suma sus movimientos a los buckets y mueve la marca en la misma transacción,
+así que cortar a mitad o lanzar dos procesos a la vez no cuenta nada dos veces.
+Sólo se procesan movimientos con más de APP_ROLLUP_LAG segundos, para no dejar
+atrás commits que aún están en vuelo.
+
+Los movimientos del journal local llegan con la hora original de la venta, que
+puede quedar detrás de la marca: el propio journal suma sus buckets en el batch
+que los crea (`queue_buckets`) y `roll_up` los salta (`journal_id`).
+"""
+import datetime
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from firebase_config import db, firestore, run_transaction
+from modules.cache import invalidate, invalidate_namespace, read_through
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_LAG = float(os.environ.get('APP_ROLLUP_LAG', '120'))
+# Movimientos por transacción: como mucho un bucket por movimiento más la marca de agua
+ROLLUP_PAGE_SIZE = 400
+
+
+def bucket_day(ts: datetime.datetime) -> str:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(datetime.timezone.utc)
+    return ts.date().isoformat()
+
+
+def bucket_id(store_id: str, product_id: str, day: str) -> str:
+    return f"{store_id}:{product_id}:{day}"
+
+
+def _state_ref(store_id: str):
+    return db.collection('rollup_state').document(store_id)
+
+
+def queue_buckets(batch, store_id: str, movements: Iterable[Tuple[str, Optional[str], int, str, datetime.datetime]]) -> int:
+    """Suma movimientos (product_id, nombre, cambio, motivo, timestamp) a sus buckets.
+
+    Agrupa en memoria y encola un `set(merge=True)` con incrementos por bucket;
+    devuelve cuántas escrituras encoló.
+    """
+    buckets: Dict[str, Dict[str, Any]] = {}
+    for product_id, product_name, change, reason, ts in movements:
+        day = bucket_day(ts)
+        bucket = buckets.setdefault(bucket_id(store_id, product_id, day), {
+            'store_id': store_id, 'product_id': product_id, 'product_name': product_name, 'day': day,
+            'net': 0, 'units_in': 0, 'units_out': 0, 'count': 0, 'reasons': {},
+        })
+        by_reason = bucket['reasons'].setdefault(reason or 'sin motivo', {'count': 0, 'in': 0, 'out': 0})
+        bucket['net'] += change
+        bucket['count'] += 1
+        by_reason['count'] += 1
+        if change > 0:
+            bucket['units_in'] += change
+            by_reason['in'] += change
+        else:
+            bucket['units_out'] -= change
+            by_reason['out'] -= change
+        if product_name:
+            bucket['product_name'] = product_name
+
+    for doc_id, bucket in buckets.items():
+        data = {k: bucket[k] for k in ('store_id', 'product_id', 'day') if bucket[k] is not None}
+        if bucket['product_name']:
+            data['product_name'] = bucket['product_name']
+        for field in ('net', 'units_in', 'units_out', 'count'):
+            data[field] = firestore.Increment(bucket[field])
+        data['reasons'] = {
+            reason: {k: firestore.Increment(v) for k, v in values.items() if v}
+            for reason, values in bucket['reasons'].items()
+        }
+        data['updated_at'] = firestore.SERVER_TIMESTAMP
+        batch.set(db.collection('movement_rollups').document(doc_id), data, merge=True)
+    return len(buckets)
+
+
+def get_state(store_id: str) -> Dict[str, Any]:
+    """Marca de agua de la tienda: {'last_timestamp', 'last_id'} (vacía si nunca se procesó)."""
+    snap = _state_ref(store_id).get()
+    return (snap.to_dict() or {}) if snap.exists else {}
+
+
+def _roll_up_page(transaction, store_id: str, cutoff: datetime.datetime, page_size: int) -> int:
+    refs = [_state_ref(store_id)]
+    state_snap = next(iter(transaction.get_all(refs)), None)
+    state = (state_snap.to_dict() or {}) if state_snap is not None and state_snap.exists else {}
+
+    query = (db.collection('movements')
+             .where('store_id', '==', store_id)
+             .where('timestamp', '<', cutoff)
+             .order_by('timestamp'))
+    if state.get('last_id'):
+        cursor = db.collection('movements').document(state['last_id']).get()
+        if cursor.exists:
+            query = query.start_after(cursor)
+        else:
+            query = query.where('timestamp', '>', state['last_timestamp'])
+    page = query.limit(page_size).get(transaction=transaction)
+    if not page:
+        return 0
+
+    rows = []
+    for snap in page:
+        d = snap.to_dict()
+        # Los del journal ya sumaron sus buckets al sincronizarse
+        if d.get('journal_id') or not d.get('product_id'):
+            continue
+        rows.append((d['product_id'], d.get('product_name'), int(d.get('change') or 0), d.get('reason'), d['timestamp']))
+    queue_buckets(transaction, store_id, rows)
+    last = page[-1]
+    transaction.set(_state_ref(store_id), {
+        'store_id': store_id,
+        'last_timestamp': last.to_dict()['timestamp'],
+        'last_id': last.id,
+        'updated_at': firestore.SERVER_TIMESTAMP,
+    })
+    return len(page)
+
+
+def roll_up(store_id: str, max_pages: Optional[int] = None, page_size: int = ROLLUP_PAGE_SIZE) -> int:
+    """Procesa los movimientos nuevos de la tienda; devuelve cuántos se leyeron.
+
+    Con `max_pages` se detiene antes (p. ej. para no bloquear la UI); lo que queda
+    se procesa en la siguiente llamada.
+    """
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=ROLLUP_LAG)
+    processed = 0
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        read = run_transaction(lambda transaction: _roll_up_page(transaction, store_id, cutoff, page_size))
+        processed += read
+        pages += 1
+        if read < page_size:
+            break
+    if processed:
+        invalidate(('rollup_state', store_id))
+        invalidate_namespace('rollups')
+    return processed
+
+
+def get_rollup_state(store_id: str) -> Dict[str, Any]:
+    return read_through(('rollup_state', store_id), lambda: get_state(store_id))
+
+
+def get_buckets(store_id: str, start: datetime.date, end: datetime.date, product_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Buckets de la tienda con día en [start, end]; opcionalmente de un solo producto."""
+    def load():
+        query = (db.collection('movement_rollups')
+                 .where('store_id', '==', store_id)
+                 .where('day', '>=', start.isoformat())
+                 .where('day', '<=', end.isoformat()))
+        if product_id is not None:
+            query = query.where('product_id', '==', product_id)
+        return [snap.to_dict() for snap in query.get()]
+
+    return read_through(('rollups', store_id, start.isoformat(), end.isoformat(), product_id), load)
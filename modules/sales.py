@@ -0,0 +1,232 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from firebase_config import db, firestore, run_transaction
+from modules import stats
+from modules.cache import forget_in_scope, invalidate, invalidate_namespace
+from modules.journal import get_journal
+from modules.products import ProductManagement
+
+logger = logging.getLogger(__name__)
+
+# Una venta escribe el ticket y el resumen de la tienda más inventario y movimiento
+# por línea; una transacción admite 500 escrituras.
+MAX_SALE_LINES = 248
+# Umbral a partir del cual un checkout se registra como lento (objetivo p95)
+SLOW_CHECKOUT_MS = 150
+# Firestore admite como máximo 30 valores en un filtro 'in'
+IN_QUERY_LIMIT = 30
+
+
+# Con el journal local, comprobación de stock y alta de la venta van juntas en el proceso
+_journal_checkout_lock = threading.Lock()
+
+
+class InsufficientStockError(Exception):
+    """Una línea pide más unidades de las que hay; aborta la transacción."""
+
+
+def _check_line(pid: str, pdata: Optional[Dict[str, Any]], store_id: str, stock: int, qty: int):
+    if not pdata or pdata.get('store_id') != store_id or not pdata.get('active', True):
+        raise InsufficientStockError(f"Producto {pid} no disponible en esta tienda")
+    if stock < qty:
+        raise InsufficientStockError(f"Stock insuficiente para {pdata.get('name')}: hay {stock}, se piden {qty}")
+
+
+def _sale_line(pid: str, pdata: Dict[str, Any], qty: int) -> Dict[str, Any]:
+    price = float(pdata.get('price', 0.0))
+    return {
+        'product_id': pid,
+        'sku': pdata.get('sku'),
+        'name': pdata.get('name'),
+        'quantity': qty,
+        'unit_price': price,
+        'subtotal': round(price * qty, 2),
+    }
+
+
+class SalesManagement:
+    """Ventas del punto de venta.
+
+    Colecciones usadas:
+    - sales: un documento por ticket con sus líneas, total y cajero
+    - inventory / movements: ver ProductManagement
+    """
+
+    def __init__(self):
+        self._products = ProductManagement()
+
+    @staticmethod
+    def _merge_lines(lines: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        quantities: Dict[str, int] = {}
+        for line in lines:
+            qty = int(line.get('quantity') or 0)
+            if qty <= 0:
+                raise ValueError(f"Cantidad inválida para {line.get('product_id')}: {qty}")
+            quantities[line['product_id']] = quantities.get(line['product_id'], 0) + qty
+        return quantities
+
+    @staticmethod
+    def _inventory_entries(transaction, store_id: str, product_ids: List[str]) -> Dict[str, list]:
+        """Entradas de inventario de los productos, incluidas las antiguas con id automático.
+
+        Es la misma definición de stock que `ProductManagement._load_inventory`: mientras
+        no se ejecute tools/migrate_inventory_ids.py un producto puede tener dos entradas.
+        """
+        entries: Dict[str, list] = {}
+        inventory = db.collection('inventory')
+        for i in range(0, len(product_ids), IN_QUERY_LIMIT):
+            query = inventory.where('store_id', '==', store_id).where('product_id', 'in', product_ids[i:i + IN_QUERY_LIMIT])
+            for snap in query.get(transaction=transaction):
+                entries.setdefault(snap.to_dict()['product_id'], []).append(snap)
+        return entries
+
+    def _checkout_txn(self, transaction, store_id: str, quantities: Dict[str, int], cashier: str,
+                      chosen: Dict[str, int], shard_counts: Dict[str, int]) -> Tuple[str, float]:
+        """Lee, valida y escribe la venta.
+
+        `chosen` es el shard que descontará cada producto con contador distribuido y
+        `shard_counts` cuántos shards tiene. Todos sus shards se leen dentro de la
+        transacción: un shard puede quedar negativo (el stock previo sigue en la
+        entrada), así que el elegido no basta para validar y leer el resto fuera
+        permitiría que dos ventas en shards distintos vendieran el mismo stock.
+        """
+        pm = self._products
+        product_ids = list(quantities)
+        # Una lectura (get_all) para precios y shards, y una consulta por cada
+        # 30 productos para sus entradas de inventario
+        refs = [db.collection('products').document(pid) for pid in product_ids]
+        refs += [pm._shard_ref(pid, store_id, i) for pid in chosen for i in range(shard_counts[pid])]
+        snaps = {snap.reference.path: snap for snap in transaction.get_all(refs)}
+        entries = self._inventory_entries(transaction, store_id, product_ids)
+
+        # Firestore exige leer todo antes de la primera escritura de la transacción
+        checked = []
+        for pid in product_ids:
+            product = snaps.get(db.collection('products').document(pid).path)
+            pdata = product.to_dict() if product is not None and product.exists else None
+            stock = 0
+            shards = 0
+            for entry in entries.get(pid, []):
+                edata = entry.to_dict() or {}
+                stock += int(edata.get('quantity', 0))
+                if entry.id == pm._inventory_ref(pid, store_id).id:
+                    shards = int(edata.get('shards') or 0)
+            index = chosen.get(pid)
+            if shards and pid in chosen and shards <= shard_counts[pid]:
+                for i in range(shard_counts[pid]):
+                    shard = snaps.get(pm._shard_ref(pid, store_id, i).path)
+                    if shard is not None and shard.exists:
+                        stock += int(shard.to_dict().get('quantity', 0))
+            elif shards:
+                # El modo cambió desde que se leyó la caché de shards: se consultan todos
+                for shard in pm._inventory_ref(pid, store_id).collection('shards').get(transaction=transaction):
+                    stock += int(shard.to_dict().get('quantity', 0))
+            if index is not None and index >= shards:
+                # El modo cambió desde que se eligió el shard: se descuenta de la entrada
+                index = None
+            _check_line(pid, pdata, store_id, stock, quantities[pid])
+            checked.append((pid, pdata, shards, index, stock))
+
+        sale_ref = db.collection('sales').document()
+        sale_lines: List[Dict[str, Any]] = []
+        for pid, pdata, shards, index, _ in checked:
+            qty = quantities[pid]
+            sale_lines.append(_sale_line(pid, pdata, qty))
+            pm._increment_stock(transaction, pid, store_id, -qty, shards, index)
+            pm._add_movement(pid, store_id, -qty, 'sale', cashier, product_name=pdata.get('name'), batch=transaction)
+        # Aquí el stock anterior es el leído: el resumen se ajusta sin recorrer el catálogo
+        stats.queue_delta(transaction, store_id, **stats.stock_deltas(
+            (-quantities[pid], pdata.get('price', 0.0), stock) for pid, pdata, _, _, stock in checked
+        ))
+
+        sale = self._sale_doc(store_id, sale_lines, cashier)
+        transaction.set(sale_ref, {**sale, 'created_at': firestore.SERVER_TIMESTAMP})
+        return sale_ref.id, sale['total']
+
+    @staticmethod
+    def _sale_doc(store_id: str, sale_lines: List[Dict[str, Any]], cashier: str) -> Dict[str, Any]:
+        return {
+            'store_id': store_id,
+            'cashier': cashier,
+            'lines': sale_lines,
+            'items': sum(line['quantity'] for line in sale_lines),
+            'total': round(sum(line['subtotal'] for line in sale_lines), 2),
+        }
+
+    def _checkout_journal(self, journal, store_id: str, quantities: Dict[str, int], cashier: str) -> Tuple[str, float]:
+        """Variante sin red: valida contra el catálogo y el inventario locales y encola la venta.
+
+        El stock incluye lo pendiente del journal; otra caja en otro proceso no se
+        ve hasta sincronizar, así que la comprobación es la mejor posible sin red.
+        """
+        pm = self._products
+        with _journal_checkout_lock:
+            products = {p['id']: p for p in pm.get_products_by_store(store_id)}
+            while True:
+                # El stock local es una cota inferior salvo que el hilo de sincronización
+                # confirme un grupo mientras se lee: en ese caso se vuelve a leer.
+                generation = journal.generation
+                forget_in_scope(('inventory', store_id))
+                stock = {item['product_id']: item['quantity'] for item in pm.get_inventory_for_store(store_id)}
+                try:
+                    sale_lines = []
+                    for pid, qty in quantities.items():
+                        _check_line(pid, products.get(pid), store_id, stock.get(pid, 0), qty)
+                        sale_lines.append(_sale_line(pid, products[pid], qty))
+                except InsufficientStockError:
+                    if journal.generation == generation:
+                        raise
+                    continue
+                if journal.generation == generation:
+                    break
+            sale = self._sale_doc(store_id, sale_lines, cashier)
+            movements = [{'product_id': line['product_id'], 'change': -line['quantity'], 'product_name': line['name']} for line in sale_lines]
+            return journal.append(store_id, movements, 'sale', cashier, sale=sale), sale['total']
+
+    def checkout(self, store_id: str, lines: List[Dict[str, Any]], cashier: str) -> Tuple[Optional[str], Optional[str]]:
+        """Cobra un ticket: venta, descuentos de inventario y movimientos en una transacción.
+
+        `lines` son dicts con 'product_id' y 'quantity' (las líneas repetidas se
+        suman). Precio y nombre se leen del producto dentro de la transacción, no
+        del carrito. Son tres round trips (productos y shards, entradas de inventario
+        de hasta 30 productos y commit). Con el journal local
+        activo (`modules.journal`) sólo se escribe en disco y se sincroniza después,
+        con la venta y sus movimientos en el mismo batch. Devuelve
+        (id de la venta, None) o (None, motivo) si no hay stock o falla.
+        """
+        started = time.perf_counter()
+        try:
+            quantities = self._merge_lines(lines)
+        except (KeyError, ValueError) as e:
+            return None, str(e)
+        if not quantities:
+            return None, "El ticket está vacío"
+        if len(quantities) > MAX_SALE_LINES:
+            return None, f"Un ticket admite como máximo {MAX_SALE_LINES} productos distintos"
+        journal = get_journal()
+        try:
+            if journal is not None:
+                sale_id, total = self._checkout_journal(journal, store_id, quantities, cashier)
+            else:
+                shard_counts = self._products._shard_counts(store_id)
+                chosen = {pid: random.randrange(shard_counts[pid]) for pid in quantities if shard_counts.get(pid, 0) > 1}
+                sale_id, total = run_transaction(
+                    lambda transaction: self._checkout_txn(transaction, store_id, quantities, cashier, chosen, shard_counts)
+                )
+        except InsufficientStockError as e:
+            return None, str(e)
+        except Exception:
+            logger.exception("Error registrando venta")
+            return None, "Error registrando la venta"
+        invalidate(('inventory', store_id))
+        invalidate_namespace('movements')
+        stats.invalidate_stats(store_id)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms > SLOW_CHECKOUT_MS:
+            logger.warning("Checkout lento: %.0f ms para %d líneas (venta %s)", elapsed_ms, len(quantities), sale_id)
+        logger.info("Venta %s registrada: %d líneas, total %.2f", sale_id, len(quantities), total)
+        return sale_id, None
@@ -0,0 +1,177 @@
+"""Índice de búsqueda en memoria del catálogo de cada tienda.
+
+Cada tienda tiene una lista ordenada de (término, id de producto) con las palabras
+del nombre y el SKU normalizados (minúsculas, sin acentos). Una búsqueda por prefijo
+es una bisección por término: con miles de productos tarda microsegundos y no hace
+ninguna lectura. El índice se construye una vez desde `get_products_by_store` y
+después se actualiza producto a producto en `create_product`/`update_product`.
+Los cambios hechos desde otro proceso se ven al reconstruirse, como mucho tras
+APP_SEARCH_INDEX_TTL segundos.
+"""
+import bisect
+import os
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+INDEX_TTL = float(os.environ.get('APP_SEARCH_INDEX_TTL', '300'))
+DEFAULT_LIMIT = 20
+
+
+def normalize(text: Any) -> str:
+    text = unicodedata.normalize('NFKD', str(text or '').lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def _terms(product: Dict[str, Any]) -> List[str]:
+    terms = set(normalize(product.get('name')).split())
+    sku = normalize(product.get('sku')).strip()
+    if sku:
+        terms.add(sku)
+    return sorted(terms)
+
+
+class ProductSearchIndex:
+    """Productos de una tienda indexados por prefijo de palabra del nombre y SKU."""
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        self._lock = threading.Lock()
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._by_sku: Dict[str, str] = {}
+        # (término, id) y (nombre normalizado, id), ambas ordenadas para bisección
+        self._postings: List[Tuple[str, str]] = []
+        self._names: List[Tuple[str, str]] = []
+        self.built_at = time.monotonic()
+        for product in products:
+            self._add(product, sort=False)
+        self._postings.sort()
+        self._names.sort()
+
+    def upsert(self, product: Dict[str, Any]):
+        with self._lock:
+            self._remove(product['id'])
+            self._add(product)
+
+    def remove(self, product_id: str):
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, product: Dict[str, Any], sort: bool = True):
+        pid = product['id']
+        terms = _terms(product)
+        self.products[pid] = product
+        self._terms[pid] = terms
+        sku = normalize(product.get('sku')).strip()
+        if sku:
+            self._by_sku[sku] = pid
+        entries = [(term, pid) for term in terms]
+        name = (normalize(product.get('name')).strip(), pid)
+        if sort:
+            for entry in entries:
+                bisect.insort(self._postings, entry)
+            bisect.insort(self._names, name)
+        else:
+            self._postings.extend(entries)
+            self._names.append(name)
+
+    def _remove(self, product_id: str):
+        old = self.products.pop(product_id, None)
+        if old is None:
+            return
+        for term in self._terms.pop(product_id, []):
+            self._delete(self._postings, (term, product_id))
+        self._delete(self._names, (normalize(old.get('name')).strip(), product_id))
+        sku = normalize(old.get('sku')).strip()
+        if self._by_sku.get(sku) == product_id:
+            del self._by_sku[sku]
+
+    @staticmethod
+    def _delete(items: List[Tuple[str, str]], entry: Tuple[str, str]):
+        i = bisect.bisect_left(items, entry)
+        if i < len(items) and items[i] == entry:
+            del items[i]
+
+    @staticmethod
+    def _range(items: List[Tuple[str, str]], prefix: str) -> Tuple[int, int]:
+        return bisect.bisect_left(items, (prefix, '')), bisect.bisect_left(items, (prefix + '\uffff', ''))
+
+    def _matches(self, pid: str, words: List[str]) -> bool:
+        terms = self._terms[pid]
+        return all(any(t.startswith(w) for t in terms) for w in words)
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+        """Hasta `limit` productos con alguna palabra del nombre/SKU que empieza por cada término.
+
+        Orden: SKU exacto, nombres que empiezan por la consulta (alfabético) y el
+        resto. Sólo se recorren las entradas necesarias para llenar `limit`, así que
+        el coste no depende de cuántos productos coinciden.
+        """
+        q = normalize(query).strip()
+        words = q.split()
+        if not words:
+            return []
+        found: List[str] = []
+        seen = set()
+
+        def take(pid: str) -> bool:
+            if pid not in seen:
+                seen.add(pid)
+                found.append(pid)
+            return len(found) >= limit
+
+        with self._lock:
+            exact = self._by_sku.get(q)
+            if exact is not None and take(exact):
+                return [self.products[pid] for pid in found]
+            lo, hi = self._range(self._names, q)
+            for _, pid in self._names[lo:hi]:
+                if take(pid):
+                    return [self.products[pid] for pid in found]
+            # Se recorre la palabra más selectiva y se comprueban las demás
+            ranges = sorted((self._range(self._postings, w), w) for w in words)
+            (lo, hi), word = min(ranges, key=lambda r: r[0][1] - r[0][0])
+            others = [w for w in words if w != word]
+            for i in range(lo, hi):
+                pid = self._postings[i][1]
+                if pid not in seen and self._matches(pid, others) and take(pid):
+                    break
+            return [self.products[pid] for pid in found]
+
+
+_indexes: Dict[str, ProductSearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for(store_id: str) -> ProductSearchIndex:
+    """Índice de la tienda, construido en el primer uso y renovado tras INDEX_TTL."""
+    index = _indexes.get(store_id)
+    if index is not None and time.monotonic() - index.built_at < INDEX_TTL:
+        return index
+    from modules.products import ProductManagement
+
+    index = ProductSearchIndex(ProductManagement().get_products_by_store(store_id))
+    with _indexes_lock:
+        _indexes[store_id] = index
+    return index
+
+
+def search_products(store_id: str, query: str, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+    return index_for(store_id).search(query, limit)
+
+
+def product_changed(store_id: str, product: Dict[str, Any]):
+    """Actualiza el índice de la tienda si ya está construido (si no, se construirá al buscar)."""
+    index = _indexes.get(store_id)
+    if index is not None:
+        index.upsert(product)
+
+
+def drop(store_id: Optional[str] = None):
+    """Descarta el índice de una tienda (o todos) tras cambios masivos como una importación."""
+    with _indexes_lock:
+        if store_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(store_id, None)
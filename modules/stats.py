@@ -0,0 +1,137 @@
+"""Resumen por tienda en `store_stats/{store_id}`, mantenido con incrementos.
+
+Campos: sku_count, total_units, stock_value (precio × cantidad), low_stock_count
+(productos con cantidad <= LOW_STOCK_THRESHOLD) y employee_count. Las escrituras
+de productos, stock, ventas y empleados encolan su `Increment` en el mismo batch o
+transacción que el cambio, en uno de los STATS_SHARDS documentos
+`store_stats/{store_id}/deltas/{n}` elegido al azar: como con el contador de stock
+distribuido, un documento por tienda admitiría ~1 escritura/s sostenida y todas las
+ventas de la tienda chocarían en él. El resumen es el documento base (el último
+cálculo completo) más la suma de los deltas: una lectura del documento y una
+consulta, cacheadas.
+
+low_stock_count se ajusta con la cantidad anterior que conoce quien escribe (en
+ajustes sueltos, la de la entrada de inventario leída junto al producto; no la hay
+con contador distribuido), por lo que puede derivar un poco;
+`tools/recompute_store_stats.py` recalcula todo desde cero. Una tienda cuyo
+documento nunca se calculó (sin `computed_at`) se calcula en la primera lectura.
+"""
+import logging
+import os
+import random
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from firebase_config import db, firestore
+from modules.cache import invalidate, read_through
+
+logger = logging.getLogger(__name__)
+
+LOW_STOCK_THRESHOLD = int(os.environ.get('APP_LOW_STOCK_THRESHOLD', '5'))
+FIELDS = ('sku_count', 'total_units', 'stock_value', 'low_stock_count', 'employee_count')
+# Documentos entre los que se reparten los incrementos del resumen de cada tienda
+STATS_SHARDS = int(os.environ.get('APP_STATS_SHARDS', '10'))
+
+
+def stats_ref(store_id: str):
+    return db.collection('store_stats').document(store_id)
+
+
+def deltas_ref(store_id: str):
+    return stats_ref(store_id).collection('deltas')
+
+
+def low_stock_delta(old_quantity: Optional[int], new_quantity: int) -> int:
+    """+1 si el producto entra en stock bajo, -1 si sale, 0 si no cambia (None = producto nuevo)."""
+    was_low = 0 if old_quantity is None else int(old_quantity <= LOW_STOCK_THRESHOLD)
+    return int(new_quantity <= LOW_STOCK_THRESHOLD) - was_low
+
+
+def stock_deltas(lines: Iterable[Tuple[int, float, Optional[int]]]) -> Dict[str, float]:
+    """Deltas de un cambio de stock a partir de (cambio, precio, cantidad anterior) por producto."""
+    deltas = {'total_units': 0, 'stock_value': 0.0, 'low_stock_count': 0}
+    for change, price, old_quantity in lines:
+        deltas['total_units'] += change
+        deltas['stock_value'] += float(price) * change
+        if old_quantity is not None:
+            deltas['low_stock_count'] += low_stock_delta(old_quantity, old_quantity + change)
+    deltas['stock_value'] = round(deltas['stock_value'], 2)
+    return deltas
+
+
+def queue_delta(batch, store_id: str, **deltas: float):
+    """Encola en `batch` (o transacción) los incrementos de los campos indicados en un delta al azar."""
+    data: Dict[str, Any] = {k: firestore.Increment(v) for k, v in deltas.items() if v}
+    if not data:
+        return
+    data['updated_at'] = firestore.SERVER_TIMESTAMP
+    batch.set(deltas_ref(store_id).document(str(random.randrange(STATS_SHARDS))), data, merge=True)
+
+
+def read_store_stats(store_id: str) -> Optional[Dict[str, Any]]:
+    """Resumen guardado (documento base más deltas) o None si nunca se calculó."""
+    snap = stats_ref(store_id).get()
+    data = (snap.to_dict() or {}) if snap.exists else {}
+    if 'computed_at' not in data:
+        return None
+    stats = {field: data.get(field, 0) for field in FIELDS}
+    for delta in deltas_ref(store_id).get():
+        values = delta.to_dict() or {}
+        for field in FIELDS:
+            stats[field] += values.get(field, 0)
+    stats['stock_value'] = round(stats['stock_value'], 2)
+    return stats
+
+
+def get_store_stats(store_id: str) -> Dict[str, Any]:
+    """Resumen de la tienda (documento y deltas, cacheado como el resto de lecturas)."""
+    def load():
+        stats = read_store_stats(store_id)
+        if stats is None:
+            # Tienda anterior al resumen: los incrementos no bastan, se calcula una vez
+            return write_store_stats(store_id, compute_store_stats(store_id))
+        return stats
+
+    try:
+        return read_through(('store_stats', store_id), load)
+    except Exception:
+        logger.exception("Error obteniendo resumen de la tienda")
+        return {field: 0 for field in FIELDS}
+
+
+def invalidate_stats(store_id: str):
+    invalidate(('store_stats', store_id))
+
+
+def compute_store_stats(store_id: str) -> Dict[str, Any]:
+    """Calcula el resumen recorriendo productos, inventario y empleados de la tienda."""
+    from modules.products import ProductManagement
+
+    pm = ProductManagement()
+    products = {p.id: p.to_dict() for p in db.collection('products').where('store_id', '==', store_id).stream()}
+    quantities = {item['product_id']: item['quantity'] for item in pm._load_inventory(store_id)}
+    employees = db.collection('employees').where('store_id', '==', store_id).count().get()
+    return {
+        'sku_count': len(products),
+        'total_units': sum(quantities.get(pid, 0) for pid in products),
+        'stock_value': round(sum(float(p.get('price', 0.0)) * quantities.get(pid, 0) for pid, p in products.items()), 2),
+        'low_stock_count': sum(1 for pid in products if quantities.get(pid, 0) <= LOW_STOCK_THRESHOLD),
+        'employee_count': int(employees[0][0].value),
+    }
+
+
+def write_store_stats(store_id: str, stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Guarda `stats` como documento base y borra los deltas, que ya incluye, en un batch."""
+    now = firestore.SERVER_TIMESTAMP
+    batch = db.batch()
+    batch.set(stats_ref(store_id), {**stats, 'store_id': store_id, 'updated_at': now, 'computed_at': now})
+    for delta in deltas_ref(store_id).get():
+        batch.delete(delta.reference)
+    batch.commit()
+    return stats
+
+
+def recompute_store_stats(store_id: str) -> Dict[str, Any]:
+    """Reescribe `store_stats/{store_id}` con valores calculados desde cero y vacía sus deltas."""
+    stats = write_store_stats(store_id, compute_store_stats(store_id))
+    invalidate_stats(store_id)
+    return stats
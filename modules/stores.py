@@ -1,8 +1,16 @@
 import streamlit as st
-from firebase_admin import firestore
-from firebase_config import get_firestore_client
+from firebase_config import db, firestore
+from modules.cache import invalidate, read_through
 
-db = get_firestore_client()
+
+def new_store_data(store_name, store_address, owner_email):
+    return {
+        'name': store_name,
+        'address': store_address,
+        'owner_email': owner_email,
+        'created_at': firestore.SERVER_TIMESTAMP,
+        'active': True
+    }
 
 
 class StoreManagement:
@@ -12,14 +20,8 @@ class StoreManagement:
 
     def create_store(self, store_name, store_address, owner_email):
         try:
-            store_data = {
-                'name': store_name,
-                'address': store_address,
-                'owner_email': owner_email,
-                'created_at': firestore.SERVER_TIMESTAMP,
-                'active': True
-            }
-            store_ref = self.db.collection('stores').add(store_data)
+            store_ref = self.db.collection('stores').add(new_store_data(store_name, store_address, owner_email))
+            invalidate(('stores_by_owner', owner_email))
             return store_ref[1].id  # Retorna el ID del documento
         except Exception as e:
             st.error(f"Error creando tienda: {e}")
@@ -27,16 +29,21 @@ class StoreManagement:
 
     def get_store_by_owner(self, owner_email):
         try:
-            stores_ref = self.db.collection('stores').where('owner_email', '==', owner_email).get()
-            return [store.to_dict() for store in stores_ref]
+            return read_through(
+                ('stores_by_owner', owner_email),
+                lambda: [store.to_dict() for store in self.db.collection('stores').where('owner_email', '==', owner_email).get()],
+            )
         except Exception as e:
             st.error(f"Error obteniendo tiendas: {e}")
             return []
 
     def get_store_by_id(self, store_id):
         try:
-            store_ref = self.db.collection('stores').document(store_id).get()
-            return store_ref.to_dict() if store_ref.exists else None
+            def load():
+                store_ref = self.db.collection('stores').document(store_id).get()
+                return store_ref.to_dict() if store_ref.exists else None
+
+            return read_through(('store', store_id), load)
         except Exception as e:
             st.error(f"Error obteniendo tienda: {e}")
             return None
@@ -1,14 +1,16 @@
 import base64
+import functools
+import hashlib
+import io
 import logging
 import os
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
-import streamlit as st
-
-from firebase_config import get_firestore_client
+from firebase_config import db, firestore
+from modules.cache import invalidate, read_through
 
 logger = logging.getLogger(__name__)
-db = get_firestore_client()
 
 # Valores por defecto del tema según la paleta proporcionada por el usuario
 # Background: #F2F1D9, Texto: #212A3E, Contraste: #F28C4F
@@ -35,76 +37,184 @@ DEFAULT_LOGO_B64 = (
     'A2QkAAAAAElFTkSuQmCC'
 )
 
+# Lado mayor de la miniatura del logo (el CSS lo muestra a 56-160 px; x2 para pantallas HiDPI)
+LOGO_MAX_PX = int(os.environ.get('APP_LOGO_MAX_PX', '320'))
+
+
+def _mime(data: bytes) -> str:
+    return 'image/jpeg' if data[:2] == b'\xff\xd8' else 'image/png'
+
+
+def make_logo_thumbnail(logo_bytes: bytes) -> Tuple[bytes, str]:
+    """Reduce el logo a LOGO_MAX_PX de lado mayor (PNG); devuelve (bytes, tipo MIME).
+
+    Sin Pillow, o si la imagen no se puede abrir o la miniatura no es más chica, se
+    devuelve el original.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return logo_bytes, _mime(logo_bytes)
+    try:
+        with Image.open(io.BytesIO(logo_bytes)) as img:
+            img.thumbnail((LOGO_MAX_PX, LOGO_MAX_PX))
+            if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                img = img.convert('RGBA')
+            out = io.BytesIO()
+            img.save(out, format='PNG', optimize=True)
+    except Exception:
+        logger.exception("No se pudo generar la miniatura del logo")
+        return logo_bytes, _mime(logo_bytes)
+    thumb = out.getvalue()
+    if len(thumb) >= len(logo_bytes):
+        return logo_bytes, _mime(logo_bytes)
+    return thumb, 'image/png'
+
+
+# Miniaturas por hash de contenido: son inmutables, así que no caducan
+_logo_uris: Dict[str, str] = {}
+_logo_uris_lock = threading.Lock()
+
+
+def _remember_logo(logo_hash: str, uri: str):
+    with _logo_uris_lock:
+        _logo_uris[logo_hash] = uri
+
+
+def _local_asset(logo_bytes: bytes) -> str:
+    """Miniatura en memoria (sin guardarla en Firestore); devuelve su hash."""
+    thumb, mime = make_logo_thumbnail(logo_bytes)
+    logo_hash = hashlib.sha256(thumb).hexdigest()[:32]
+    _remember_logo(logo_hash, f"data:{mime};base64,{base64.b64encode(thumb).decode('utf-8')}")
+    return logo_hash
+
+
+def store_logo(logo_bytes: bytes) -> str:
+    """Guarda la miniatura del logo en `theme_assets/{hash}` y devuelve el hash.
+
+    El id es el hash del contenido: subir el mismo logo (o el de otra tienda igual)
+    reescribe el mismo documento.
+    """
+    thumb, mime = make_logo_thumbnail(logo_bytes)
+    logo_hash = hashlib.sha256(thumb).hexdigest()[:32]
+    b64 = base64.b64encode(thumb).decode('utf-8')
+    db.collection('theme_assets').document(logo_hash).set({'b64': b64, 'mime': mime, 'size': len(thumb)})
+    _remember_logo(logo_hash, f"data:{mime};base64,{b64}")
+    return logo_hash
+
+
+def logo_data_uri(logo_hash: Optional[str]) -> str:
+    """Data URI de la miniatura; se lee de Firestore una vez por proceso y hash."""
+    if not logo_hash:
+        return _logo_uris[default_logo_hash()]
+    uri = _logo_uris.get(logo_hash)
+    if uri is not None:
+        return uri
+    try:
+        doc = db.collection('theme_assets').document(logo_hash).get()
+    except Exception:
+        logger.exception("Error leyendo logo %s", logo_hash)
+        doc = None
+    if doc is None or not doc.exists:
+        return _logo_uris[default_logo_hash()]
+    data = doc.to_dict()
+    uri = f"data:{data.get('mime', 'image/png')};base64,{data['b64']}"
+    _remember_logo(logo_hash, uri)
+    return uri
+
+
+@functools.lru_cache(maxsize=1)
+def default_logo_hash() -> str:
+    """Logo local (assets/logo.*) o el placeholder, leído y reducido una vez por proceso."""
+    for p in DEFAULT_LOGO_PATHS:
+        if os.path.exists(p):
+            try:
+                with open(p, 'rb') as f:
+                    return _local_asset(f.read())
+            except Exception:
+                logger.exception("No se pudo leer logo local desde %s", p)
+    return _local_asset(base64.b64decode(DEFAULT_LOGO_B64))
+
+
+def theme_hash(palette: List[str], dark_mode: bool, logo_hash: Optional[str]) -> str:
+    return hashlib.sha1(f"{'|'.join(palette)}|{int(dark_mode)}|{logo_hash or ''}".encode('utf-8')).hexdigest()[:16]
+
+
+def _theme(palette: List[str], dark_mode: bool, logo_hash: Optional[str]) -> Dict[str, Any]:
+    palette = list(palette or DEFAULT_PALETTE)[:6]
+    return {
+        'palette': palette,
+        'dark_mode': bool(dark_mode),
+        'logo_hash': logo_hash,
+        'theme_hash': theme_hash(palette, bool(dark_mode), logo_hash),
+    }
+
 
 def save_theme(store_id: str, palette: List[str], dark_mode: bool, logo_bytes: Optional[bytes] = None) -> bool:
-    """Guarda la paleta y opciones de tema en Firestore bajo collection `settings` document store_id."""
+    """Guarda la paleta y opciones de tema en Firestore bajo collection `settings` document store_id.
+
+    El logo se reduce (`make_logo_thumbnail`) y se guarda aparte en `theme_assets`;
+    `settings` sólo guarda su hash, así que el documento que se lee en cada carga
+    pesa unos cientos de bytes.
+    """
     try:
         data: Dict[str, Any] = {'palette': palette[:6], 'dark_mode': bool(dark_mode)}
         if logo_bytes:
-            data['logo_b64'] = base64.b64encode(logo_bytes).decode('utf-8')
+            data['logo_hash'] = store_logo(logo_bytes)
+            data['logo_b64'] = firestore.DELETE_FIELD
         db.collection('settings').document(store_id).set(data, merge=True)
+        invalidate(('theme', store_id))
         return True
     except Exception as e:
         logger.exception("Error guardando tema: %s", e)
         return False
 
 
+def _migrate_legacy_logo(store_id: str) -> Optional[str]:
+    """Pasa un `logo_b64` a tamaño completo (formato anterior) a `theme_assets`."""
+    ref = db.collection('settings').document(store_id)
+    legacy = ref.get(field_paths=['logo_b64'])
+    logo_b64 = (legacy.to_dict() or {}).get('logo_b64') if legacy.exists else None
+    if not logo_b64:
+        return None
+    logo_bytes = base64.b64decode(logo_b64)
+    try:
+        logo_hash = store_logo(logo_bytes)
+        ref.set({'logo_hash': logo_hash, 'logo_b64': firestore.DELETE_FIELD}, merge=True)
+        return logo_hash
+    except Exception:
+        logger.exception("No se pudo migrar el logo de la tienda %s", store_id)
+        return _local_asset(logo_bytes)
+
+
+def _read_theme(store_id: str) -> Dict[str, Any]:
+    # Sólo los campos pequeños: un logo antiguo puede acercarse al límite de 1 MiB
+    doc = db.collection('settings').document(store_id).get(field_paths=['palette', 'dark_mode', 'logo_hash'])
+    if not doc.exists:
+        return _theme(DEFAULT_PALETTE, DEFAULT_DARK, None)
+    data = doc.to_dict() or {}
+    dark = data.get('dark_mode') if 'dark_mode' in data else DEFAULT_DARK
+    logo_hash = data.get('logo_hash') or _migrate_legacy_logo(store_id)
+    return _theme(data.get('palette'), dark, logo_hash)
+
+
 def load_theme(store_id: str) -> Dict[str, Any]:
     """Carga el tema guardado para la tienda. Si no existe, devuelve los valores por defecto.
 
-    Devuelve siempre un dict con al menos 'palette' y 'dark_mode' y opcionalmente 'logo_b64'.
+    Devuelve un dict con 'palette', 'dark_mode', 'logo_hash' (None = logo local o
+    placeholder) y 'theme_hash'. Se sirve desde la caché compartida; `save_theme`
+    invalida la entrada de la tienda.
     """
     try:
-        doc = db.collection('settings').document(store_id).get()
-        if doc.exists:
-            data = doc.to_dict()
-            # Normalizar y rellenar con defaults si faltan campos
-            palette = data.get('palette') or DEFAULT_PALETTE
-            dark = data.get('dark_mode') if 'dark_mode' in data else DEFAULT_DARK
-            logo = data.get('logo_b64') if data.get('logo_b64') else None
-            # Si no hay logo en Firestore, intentar leer un logo local
-            if not logo:
-                for p in DEFAULT_LOGO_PATHS:
-                    if os.path.exists(p):
-                        try:
-                            with open(p, 'rb') as f:
-                                logo = base64.b64encode(f.read()).decode('utf-8')
-                                break
-                        except Exception:
-                            logger.exception("No se pudo leer logo local desde %s", p)
-            if not logo:
-                logo = DEFAULT_LOGO_B64
-            return {'palette': palette[:6], 'dark_mode': bool(dark), 'logo_b64': logo}
-        # si no existe documento, intentar cargar logo local o devolver defaults
-        logo = None
-        for p in DEFAULT_LOGO_PATHS:
-            if os.path.exists(p):
-                try:
-                    with open(p, 'rb') as f:
-                        logo = base64.b64encode(f.read()).decode('utf-8')
-                        break
-                except Exception:
-                    logger.exception("No se pudo leer logo local desde %s", p)
-        if not logo:
-            logo = DEFAULT_LOGO_B64
-        return {'palette': DEFAULT_PALETTE, 'dark_mode': DEFAULT_DARK, 'logo_b64': logo}
+        return read_through(('theme', store_id), lambda: _read_theme(store_id))
     except Exception as e:
         logger.exception("Error cargando tema: %s", e)
-        return {'palette': DEFAULT_PALETTE, 'dark_mode': DEFAULT_DARK, 'logo_b64': DEFAULT_LOGO_B64}
+        return _theme(DEFAULT_PALETTE, DEFAULT_DARK, None)
 
 
-def apply_theme(theme: Optional[Dict[str, Any]] = None):
-    """Inyecta CSS simple en la app Streamlit usando la paleta.
-
-    Si `theme` es None, se aplican los valores por defecto.
-    """
-    if theme is None:
-        theme = {'palette': DEFAULT_PALETTE, 'dark_mode': DEFAULT_DARK, 'logo_b64': DEFAULT_LOGO_B64}
-
-    palette = (theme.get('palette') or DEFAULT_PALETTE)[:6]
-    dark = bool(theme.get('dark_mode', DEFAULT_DARK))
-    logo_b64 = theme.get('logo_b64') or DEFAULT_LOGO_B64
-
+@functools.lru_cache(maxsize=128)
+def compile_css(palette: Tuple[str, ...], dark: bool) -> str:
+    """Bloque `<style>` del tema; se arma una vez por (paleta, modo) y proceso."""
     # Construir variables CSS
     css_vars = []
     for i, c in enumerate(palette, start=1):
@@ -181,8 +291,29 @@ def apply_theme(theme: Optional[Dict[str, Any]] = None):
     }
     """
 
-    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    return f"<style>{css}</style>"
+
+
+def apply_theme(theme: Optional[Dict[str, Any]] = None):
+    """Inyecta CSS simple en la app Streamlit usando la paleta.
+
+    Si `theme` es None, se aplican los valores por defecto. El CSS sale de
+    `compile_css` y el logo de la caché por hash: en una re-ejecución con el mismo
+    tema no se arma ni se codifica nada.
+    """
+    # Import diferido: los scripts de tools/ usan save_theme sin cargar Streamlit
+    import streamlit as st
+
+    if theme is None:
+        theme = _theme(DEFAULT_PALETTE, DEFAULT_DARK, None)
+
+    palette = tuple((theme.get('palette') or DEFAULT_PALETTE)[:6])
+    dark = bool(theme.get('dark_mode', DEFAULT_DARK))
+    st.markdown(compile_css(palette, dark), unsafe_allow_html=True)
 
-    # Guardar logo en session_state para mostrarlo desde UI cuando se necesite
-    if logo_b64:
-        st.session_state['theme_logo'] = f"data:image/png;base64,{logo_b64}"
+    # Guardar logo en session_state para mostrarlo desde UI cuando se necesite; el
+    # data URI es el mismo objeto compartido por todas las sesiones con ese logo
+    logo_hash = theme.get('logo_hash') or default_logo_hash()
+    if st.session_state.get('theme_logo_hash') != logo_hash:
+        st.session_state['theme_logo'] = logo_data_uri(logo_hash)
+        st.session_state['theme_logo_hash'] = logo_hash
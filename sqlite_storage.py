@@ -0,0 +1,617 @@
+"""Backend de almacenamiento local en SQLite con la interfaz del cliente Firestore.
+
+Implementa el subconjunto de la API de `google.cloud.firestore.Client` que usan los
+módulos de la app (colecciones y subcolecciones, `document`, `add`, `set` con
+`merge`, `update`, `create`, `delete`, `where`/`order_by`/`limit`/`start_after`,
+`get`/`stream`, `count`, `get_all`, `batch`, transacciones (`transaction().run`) y los centinelas `SERVER_TIMESTAMP`,
+`Increment`, `DELETE_FIELD`, `ArrayUnion`/`ArrayRemove`). Así el mismo código de
+negocio funciona contra Firestore o contra un archivo local; ver
+`firebase_config.get_firestore_client` y la variable de entorno STORAGE_BACKEND.
+
+Todos los documentos viven en una tabla `documents` (path, colección, JSON) con
+columnas generadas e índices sobre `store_id`, `product_id` y `timestamp`, que son
+los campos por los que filtran y ordenan las consultas de la app.
+"""
+import base64
+import copy
+import datetime
+import json
+import logging
+import random
+import sqlite3
+import string
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from google.cloud.firestore_v1 import transforms as _transforms
+except Exception:  # pragma: no cover - el backend local no requiere google-cloud-firestore
+    _transforms = None
+
+try:
+    from google.api_core.exceptions import AlreadyExists, NotFound
+except Exception:  # pragma: no cover
+    class AlreadyExists(Exception):
+        pass
+
+    class NotFound(Exception):
+        pass
+
+logger = logging.getLogger(__name__)
+
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+DOCUMENT_ID = '__name__'
+
+# Marcas para conservar tipos que JSON no tiene; las fechas se guardan en ISO UTC
+# de ancho fijo, de modo que el orden de texto coincide con el orden cronológico.
+_TS_PREFIX = '\x1ets:'
+_BYTES_PREFIX = '\x1eb64:'
+_TS_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+# Campos con columna generada e índice propio
+_INDEXED_COLUMNS = {'store_id': 'store_id', 'product_id': 'product_id', 'timestamp': 'ts'}
+
+# Tamaño de página con el que `stream()` recorre resultados sin cargarlos todos
+STREAM_PAGE_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    collection_id TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    create_time TEXT NOT NULL,
+    update_time TEXT NOT NULL,
+    store_id GENERATED ALWAYS AS (json_extract(data, '$.store_id')) VIRTUAL,
+    product_id GENERATED ALWAYS AS (json_extract(data, '$.product_id')) VIRTUAL,
+    ts GENERATED ALWAYS AS (json_extract(data, '$.timestamp')) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_collection_id ON documents(collection_id);
+CREATE INDEX IF NOT EXISTS idx_documents_store ON documents(collection, store_id);
+CREATE INDEX IF NOT EXISTS idx_documents_product ON documents(collection, product_id, store_id);
+CREATE INDEX IF NOT EXISTS idx_documents_store_ts ON documents(collection, store_id, ts);
+"""
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _auto_id() -> str:
+    alphabet = string.ascii_letters + string.digits
+    return ''.join(random.choice(alphabet) for _ in range(20))
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return _TS_PREFIX + value.astimezone(datetime.timezone.utc).strftime(_TS_FORMAT)
+    if isinstance(value, bytes):
+        return _BYTES_PREFIX + base64.b64encode(value).decode('ascii')
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, str):
+        if value.startswith(_TS_PREFIX):
+            return datetime.datetime.strptime(value[len(_TS_PREFIX):], _TS_FORMAT).replace(tzinfo=datetime.timezone.utc)
+        if value.startswith(_BYTES_PREFIX):
+            return base64.b64decode(value[len(_BYTES_PREFIX):])
+        return value
+    if isinstance(value, dict):
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _is_sentinel(value: Any, name: str) -> bool:
+    return _transforms is not None and value is getattr(_transforms, name, None)
+
+
+def _resolve(value: Any, current: Any, now: datetime.datetime) -> Any:
+    """Aplica un centinela de Firestore sobre el valor actual del campo."""
+    if _is_sentinel(value, 'SERVER_TIMESTAMP'):
+        return now
+    if _transforms is not None:
+        if isinstance(value, _transforms.Increment):
+            base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+            return base + value.value
+        if isinstance(value, _transforms.ArrayUnion):
+            result = list(current) if isinstance(current, list) else []
+            result.extend(v for v in value.values if v not in result)
+            return result
+        if isinstance(value, _transforms.ArrayRemove):
+            return [v for v in (current if isinstance(current, list) else []) if v not in value.values]
+    if isinstance(value, dict):
+        base = current if isinstance(current, dict) else {}
+        return {k: _resolve(v, base.get(k), now) for k, v in value.items() if not _is_sentinel(v, 'DELETE_FIELD')}
+    return value
+
+
+def _merge(current: Dict[str, Any], data: Dict[str, Any], now: datetime.datetime) -> Dict[str, Any]:
+    """`set(..., merge=True)`: los mapas anidados se combinan en vez de reemplazarse."""
+    result = dict(current)
+    for key, value in data.items():
+        if _is_sentinel(value, 'DELETE_FIELD'):
+            result.pop(key, None)
+        elif isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = _merge(result[key], value, now)
+        else:
+            result[key] = _resolve(value, result.get(key), now)
+    return result
+
+
+def _update(current: Dict[str, Any], data: Dict[str, Any], now: datetime.datetime) -> Dict[str, Any]:
+    """`update(...)`: las claves con puntos son rutas a campos anidados."""
+    result = copy.deepcopy(current)
+    for key, value in data.items():
+        parts = key.split('.')
+        target = result
+        for part in parts[:-1]:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        if _is_sentinel(value, 'DELETE_FIELD'):
+            target.pop(parts[-1], None)
+        else:
+            target[parts[-1]] = _resolve(value, target.get(parts[-1]), now)
+    return result
+
+
+def _get_field(data: Dict[str, Any], field_path: str) -> Any:
+    value: Any = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _field_expr(field_path: str) -> str:
+    if field_path == DOCUMENT_ID:
+        return 'doc_id'
+    if field_path in _INDEXED_COLUMNS:
+        return _INDEXED_COLUMNS[field_path]
+    json_path = '$' + ''.join('."' + part.replace('"', '""') + '"' for part in field_path.split('.'))
+    return "json_extract(data, '" + json_path.replace("'", "''") + "')"
+
+
+def _bind(value: Any) -> Any:
+    value = _encode(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class WriteResult:
+    def __init__(self, update_time: datetime.datetime):
+        self.update_time = update_time
+
+
+class AggregationResult:
+    def __init__(self, alias: str, value: Any):
+        self.alias = alias
+        self.value = value
+
+
+class DocumentSnapshot:
+    def __init__(self, reference: 'DocumentReference', data: Optional[Dict[str, Any]],
+                 create_time: Optional[datetime.datetime] = None, update_time: Optional[datetime.datetime] = None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        if field_path == DOCUMENT_ID:
+            return self.reference.id
+        return _get_field(self._data or {}, field_path)
+
+
+class DocumentReference:
+    def __init__(self, client: 'SQLiteClient', path: str):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self) -> 'CollectionReference':
+        return CollectionReference(self._client, self.path.rsplit('/', 1)[0])
+
+    def collection(self, collection_id: str) -> 'CollectionReference':
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths=None, transaction=None) -> DocumentSnapshot:
+        return self._client._get_snapshots([self])[0]
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> WriteResult:
+        return self._client._commit([('set', self, document_data, merge)])[0]
+
+    def update(self, field_updates: Dict[str, Any]) -> WriteResult:
+        return self._client._commit([('update', self, field_updates, False)])[0]
+
+    def create(self, document_data: Dict[str, Any]) -> WriteResult:
+        return self._client._commit([('create', self, document_data, False)])[0]
+
+    def delete(self) -> WriteResult:
+        return self._client._commit([('delete', self, None, False)])[0]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+
+class Query:
+    def __init__(self, client: 'SQLiteClient', collection: str, all_descendants: bool = False):
+        self._client = client
+        self._collection = collection
+        self._all_descendants = all_descendants
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._orders: List[Tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._offset: int = 0
+        self._cursor: Optional[Tuple[Any, bool]] = None
+
+    def _copy(self) -> 'Query':
+        q = Query(self._client, self._collection, self._all_descendants)
+        q._filters = list(self._filters)
+        q._orders = list(self._orders)
+        q._limit = self._limit
+        q._offset = self._offset
+        q._cursor = self._cursor
+        return q
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None, *, filter=None) -> 'Query':
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        q = self._copy()
+        q._filters.append((field_path, op_string, value))
+        return q
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> 'Query':
+        q = self._copy()
+        q._orders.append((field_path, direction))
+        return q
+
+    def limit(self, count: int) -> 'Query':
+        q = self._copy()
+        q._limit = count
+        return q
+
+    def offset(self, num_to_skip: int) -> 'Query':
+        q = self._copy()
+        q._offset = num_to_skip
+        return q
+
+    def select(self, field_paths: Iterable[str]) -> 'Query':
+        # Las proyecciones no ahorran nada en local: se devuelven documentos completos
+        return self._copy()
+
+    def start_after(self, document_fields_or_snapshot) -> 'Query':
+        q = self._copy()
+        q._cursor = (document_fields_or_snapshot, False)
+        return q
+
+    def start_at(self, document_fields_or_snapshot) -> 'Query':
+        q = self._copy()
+        q._cursor = (document_fields_or_snapshot, True)
+        return q
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        # Como Firestore: se desempata por id de documento en la dirección del último orden
+        orders = list(self._orders)
+        if not any(f == DOCUMENT_ID for f, _ in orders):
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else ASCENDING))
+        return orders
+
+    def _where_sql(self) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if self._all_descendants:
+            clauses.append('collection_id = ?')
+        else:
+            clauses.append('collection = ?')
+        params.append(self._collection)
+
+        for field_path, op, value in self._filters:
+            expr = _field_expr(field_path)
+            if op == '==' and value is None:
+                clauses.append(f'{expr} IS NULL')
+            elif op in ('==', '<', '<=', '>', '>='):
+                clauses.append(f'{expr} {"=" if op == "==" else op} ?')
+                params.append(_bind(value))
+            elif op == '!=':
+                clauses.append(f'({expr} IS NOT NULL AND {expr} != ?)')
+                params.append(_bind(value))
+            elif op in ('in', 'not-in'):
+                values = list(value)
+                if not values:
+                    clauses.append('0' if op == 'in' else '1')
+                    continue
+                marks = ','.join('?' for _ in values)
+                clauses.append(f'{expr} {"IN" if op == "in" else "NOT IN"} ({marks})')
+                params.extend(_bind(v) for v in values)
+            elif op in ('array_contains', 'array_contains_any'):
+                values = [value] if op == 'array_contains' else list(value)
+                marks = ','.join('?' for _ in values)
+                clauses.append(f"EXISTS (SELECT 1 FROM json_each({expr}) WHERE json_each.value IN ({marks}))")
+                params.extend(_bind(v) for v in values)
+            else:
+                raise ValueError(f"Operador no soportado en el backend SQLite: {op}")
+
+        for field_path, _ in self._orders:
+            if field_path != DOCUMENT_ID:
+                clauses.append(f'{_field_expr(field_path)} IS NOT NULL')
+
+        if self._cursor is not None:
+            cursor_sql, cursor_params = self._cursor_sql()
+            clauses.append(cursor_sql)
+            params.extend(cursor_params)
+        return clauses, params
+
+    def _cursor_sql(self) -> Tuple[str, List[Any]]:
+        cursor, inclusive = self._cursor
+        orders = self._effective_orders()
+        if isinstance(cursor, DocumentSnapshot):
+            values = [cursor.get(f) for f, _ in orders]
+        elif isinstance(cursor, dict):
+            orders = [(f, d) for f, d in orders if f in cursor]
+            values = [cursor[f] for f, _ in orders]
+        else:
+            raise TypeError("El cursor debe ser un DocumentSnapshot o un dict de campos")
+
+        # Comparación lexicográfica sobre la tupla de campos de orden
+        alternatives: List[str] = []
+        params: List[Any] = []
+        for i, (field_path, direction) in enumerate(orders):
+            parts = []
+            for j in range(i):
+                parts.append(f'{_field_expr(orders[j][0])} = ?')
+                params.append(_bind(values[j]))
+            parts.append(f'{_field_expr(field_path)} {"<" if direction == DESCENDING else ">"} ?')
+            params.append(_bind(values[i]))
+            alternatives.append('(' + ' AND '.join(parts) + ')')
+        if inclusive:
+            parts = []
+            for (field_path, _), value in zip(orders, values):
+                parts.append(f'{_field_expr(field_path)} = ?')
+                params.append(_bind(value))
+            alternatives.append('(' + ' AND '.join(parts) + ')')
+        return '(' + ' OR '.join(alternatives) + ')', params
+
+    def get(self, transaction=None) -> List[DocumentSnapshot]:
+        clauses, params = self._where_sql()
+        order_sql = ', '.join(
+            f'{_field_expr(f)} {"DESC" if d == DESCENDING else "ASC"}' for f, d in self._effective_orders()
+        )
+        sql = f"SELECT path, data, create_time, update_time FROM documents WHERE {' AND '.join(clauses)} ORDER BY {order_sql}"
+        if self._limit is not None or self._offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params.extend([self._limit if self._limit is not None else -1, self._offset])
+        rows = self._client._execute(sql, params)
+        return [self._client._snapshot_from_row(row) for row in rows]
+
+    def stream(self, transaction=None) -> Iterator[DocumentSnapshot]:
+        """Recorre los resultados por páginas de STREAM_PAGE_SIZE (memoria acotada)."""
+        remaining = self._limit
+        query = self
+        while True:
+            page_size = STREAM_PAGE_SIZE if remaining is None else min(STREAM_PAGE_SIZE, remaining)
+            if page_size <= 0:
+                return
+            page = query.limit(page_size).get()
+            yield from page
+            if len(page) < page_size:
+                return
+            if remaining is not None:
+                remaining -= len(page)
+            query = query.offset(0).start_after(page[-1])
+
+    def count(self, alias: Optional[str] = None) -> 'AggregationQuery':
+        return AggregationQuery(self, alias or 'count')
+
+
+class AggregationQuery:
+    def __init__(self, query: Query, alias: str):
+        self._query = query
+        self._alias = alias
+
+    def get(self, transaction=None) -> List[List[AggregationResult]]:
+        q = self._query
+        clauses, params = q._where_sql()
+        sql = f"SELECT COUNT(*) FROM documents WHERE {' AND '.join(clauses)}"
+        if q._limit is not None:
+            sql = f"SELECT COUNT(*) FROM (SELECT 1 FROM documents WHERE {' AND '.join(clauses)} LIMIT ?)"
+            params.append(q._limit)
+        count = self._query._client._execute(sql, params)[0][0]
+        return [[AggregationResult(self._alias, count)]]
+
+
+class CollectionReference(Query):
+    def __init__(self, client: 'SQLiteClient', path: str):
+        super().__init__(client, path)
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, f"{self.path}/{document_id or _auto_id()}")
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None) -> Tuple[datetime.datetime, DocumentReference]:
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+
+class WriteBatch:
+    def __init__(self, client: 'SQLiteClient'):
+        self._client = client
+        self._ops: List[Tuple[str, DocumentReference, Any, bool]] = []
+
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        self._ops.append(('set', reference, document_data, merge))
+
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any]):
+        self._ops.append(('update', reference, field_updates, False))
+
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]):
+        self._ops.append(('create', reference, document_data, False))
+
+    def delete(self, reference: DocumentReference):
+        self._ops.append(('delete', reference, None, False))
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def commit(self) -> List[WriteResult]:
+        ops, self._ops = self._ops, []
+        return self._client._commit(ops)
+
+
+class Transaction(WriteBatch):
+    """Transacción: las lecturas y el commit ocurren con el lock del cliente tomado.
+
+    Un único proceso escribe en el archivo, así que serializar basta para que las
+    lecturas sigan siendo válidas al confirmar y no hace falta reintentar.
+    """
+
+    def get_all(self, references: Iterable[DocumentReference]) -> Iterator[DocumentSnapshot]:
+        return iter(self._client._get_snapshots(list(references)))
+
+    def run(self, fn):
+        """Ejecuta `fn(transaction)` y confirma sus escrituras de forma atómica."""
+        with self._client._lock:
+            try:
+                result = fn(self)
+            except Exception:
+                self._ops = []
+                raise
+            self.commit()
+            return result
+
+
+class SQLiteClient:
+    """Cliente con la forma de `firestore.Client` respaldado por un archivo SQLite."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def collection(self, *collection_path: str) -> CollectionReference:
+        return CollectionReference(self, '/'.join(collection_path))
+
+    def collection_group(self, collection_id: str) -> Query:
+        return Query(self, collection_id, all_descendants=True)
+
+    def document(self, *document_path: str) -> DocumentReference:
+        return DocumentReference(self, '/'.join(document_path))
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self, **kwargs) -> Transaction:
+        return Transaction(self)
+
+    def get_all(self, references: Iterable[DocumentReference], field_paths=None, transaction=None) -> Iterator[DocumentSnapshot]:
+        yield from self._get_snapshots(list(references))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # -- internos -------------------------------------------------------------
+
+    def _execute(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, list(params)).fetchall()
+
+    def _snapshot_from_row(self, row) -> DocumentSnapshot:
+        path, data, create_time, update_time = row
+        return DocumentSnapshot(
+            DocumentReference(self, path), _decode(json.loads(data)),
+            _decode(create_time), _decode(update_time),
+        )
+
+    def _get_snapshots(self, refs: List[DocumentReference]) -> List[DocumentSnapshot]:
+        if not refs:
+            return []
+        found: Dict[str, DocumentSnapshot] = {}
+        paths = list(dict.fromkeys(r.path for r in refs))
+        # SQLite limita el número de parámetros por sentencia
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            marks = ','.join('?' for _ in chunk)
+            for row in self._execute(f"SELECT path, data, create_time, update_time FROM documents WHERE path IN ({marks})", chunk):
+                found[row[0]] = self._snapshot_from_row(row)
+        return [found.get(r.path) or DocumentSnapshot(r, None) for r in refs]
+
+    def _commit(self, ops: List[Tuple[str, DocumentReference, Any, bool]]) -> List[WriteResult]:
+        """Aplica las escrituras de forma atómica: o todas o ninguna."""
+        now = _now()
+        stamp = _encode(now)
+        results: List[WriteResult] = []
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                for kind, ref, data, merge in ops:
+                    row = cur.execute('SELECT data, create_time FROM documents WHERE path = ?', (ref.path,)).fetchone()
+                    current = _decode(json.loads(row[0])) if row else None
+                    if kind == 'delete':
+                        cur.execute('DELETE FROM documents WHERE path = ?', (ref.path,))
+                        results.append(WriteResult(now))
+                        continue
+                    if kind == 'create' and current is not None:
+                        raise AlreadyExists(f"Document already exists: {ref.path}")
+                    if kind == 'update':
+                        if current is None:
+                            raise NotFound(f"No document to update: {ref.path}")
+                        new = _update(current, data, now)
+                    elif kind == 'set' and merge and current is not None:
+                        new = _merge(current, data, now)
+                    else:
+                        new = _resolve(data, {}, now)
+                    collection = ref.path.rsplit('/', 1)[0]
+                    cur.execute(
+                        'INSERT INTO documents (path, collection, collection_id, doc_id, data, create_time, update_time) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT(path) DO UPDATE SET data = excluded.data, update_time = excluded.update_time',
+                        (ref.path, collection, collection.rsplit('/', 1)[-1], ref.id,
+                         json.dumps(_encode(new)), row[1] if row else stamp, stamp),
+                    )
+                    results.append(WriteResult(now))
+                cur.execute('COMMIT')
+            except Exception:
+                cur.execute('ROLLBACK')
+                raise
+        return results
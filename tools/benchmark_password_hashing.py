@@ -0,0 +1,105 @@
+"""Benchmark password hashing parameter sets under a login burst.
+
+Simulates `--logins` logins arriving at once from `--concurrency` sessions, each
+verifying a password through a pool of `--workers` hashing threads (the app uses
+APP_HASH_WORKERS, see `modules.passwords`). For every parameter set it reports the
+sustained logins/sec, the p50/p95/max latency a user sees (queue wait included) and
+the memory one hash needs. Pick the most expensive set whose p95 is acceptable on
+the production host, then set APP_PASSWORD_SCHEME and its parameters.
+
+No database access: it only exercises the hashing code.
+
+Usage example (from the project root):
+  python -m tools.benchmark_password_hashing
+  python -m tools.benchmark_password_hashing --workers 2 --concurrency 20 --logins 60 \
+      --params scrypt:n=16384,r=8,p=1 --params pbkdf2_sha256:iterations=310000
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+try:
+    from modules.passwords import PasswordHasher, _verify, configured_hasher
+except Exception as e:  # pragma: no cover - friendly error for missing project path
+    print("Error importing project utilities. Make sure you run this from the project root and you have Python path configured.")
+    print("Import error:", e)
+    raise
+
+DEFAULT_SETS = [
+    'scrypt:n=8192,r=8,p=1',
+    'scrypt:n=16384,r=8,p=1',
+    'scrypt:n=32768,r=8,p=1',
+    'pbkdf2_sha256:iterations=310000',
+    'pbkdf2_sha256:iterations=600000',
+]
+
+
+def parse_params(spec: str) -> PasswordHasher:
+    scheme, _, encoded = spec.partition(':')
+    params = {k: int(v) for k, v in (item.split('=') for item in encoded.split(',') if item)}
+    return PasswordHasher(scheme, params)
+
+
+def memory_mib(hasher: PasswordHasher) -> float:
+    if hasher.scheme == 'scrypt':
+        return 128 * hasher.params['n'] * hasher.params['r'] / (1024 * 1024)
+    return 0.0
+
+
+def run(hasher: PasswordHasher, logins: int, concurrency: int, workers: int) -> dict:
+    stored = hasher.hash('correct horse battery staple')
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def login() -> float:
+        started = time.perf_counter()
+        ok = pool.submit(_verify, 'correct horse battery staple', stored).result()
+        assert ok
+        return time.perf_counter() - started
+
+    latencies: List[float] = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as sessions:
+        latencies.extend(sessions.map(lambda _: login(), range(logins)))
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    latencies.sort()
+    return {
+        'rate': logins / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[max(0, int(round(0.95 * len(latencies))) - 1)] * 1000,
+        'max': latencies[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logins/sec and p95 latency per password hashing parameter set.")
+    parser.add_argument('--params', action='append', help='Parameter set, e.g. scrypt:n=16384,r=8,p=1 (repeatable)')
+    parser.add_argument('--logins', type=int, default=40, help='Logins in the burst (default: 40)')
+    parser.add_argument('--concurrency', type=int, default=10, help='Sessions logging in at once (default: 10)')
+    parser.add_argument('--workers', type=int, default=2, help='Hashing threads, like APP_HASH_WORKERS (default: 2)')
+    args = parser.parse_args()
+
+    specs = args.params or DEFAULT_SETS
+    current = configured_hasher().label()
+    print(f"Burst of {args.logins} logins, {args.concurrency} concurrent sessions, {args.workers} hashing workers")
+    print(f"{'parameters':<40} {'mem MiB':>8} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for spec in specs:
+        try:
+            hasher = parse_params(spec)
+        except (ValueError, KeyError) as e:
+            print(f"Invalid parameter set {spec!r}: {e}")
+            sys.exit(2)
+        result = run(hasher, args.logins, args.concurrency, args.workers)
+        marker = ' (configured)' if hasher.label() == current else ''
+        print(f"{hasher.label() + marker:<40} {memory_mib(hasher):>8.0f} {result['rate']:>9.1f} "
+              f"{result['p50']:>8.0f} {result['p95']:>8.0f} {result['max']:>8.0f}")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Import a product catalog (CSV or JSONL) into Firestore for one store.
+
+Usage example (from the project root):
+  python -m tools.import_products --store-id STORE123 --file catalog.csv
+  python -m tools.import_products --store-id STORE123 --file catalog.jsonl --checkpoint catalog.ckpt
+
+CSV files need a header row with: sku,name,price[,description,quantity]. JSONL files hold one
+object per line with the same keys. The file is streamed row by row, so memory use does not
+depend on its size. Products, initial inventory and `initial` movements are written through
+Firestore's BulkWriter. With --checkpoint the last committed row is stored every few hundred
+rows; re-running the same command after a crash resumes from there. If a block has failed
+writes the checkpoint stops advancing, so re-running retries them. Rows for products that
+already exist only update their sku, name, price and description; stock and the `initial`
+movement are written once, when the product is created.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+try:
+    from modules.catalog_import import import_products, iter_rows
+except Exception as e:  # pragma: no cover - friendly error for missing firebase/config
+    print("Error importing project import utilities. Make sure you run this from the project root and you have Python path configured.")
+    print("Import error:", e)
+    raise
+
+
+def print_progress(report):
+    print(f"  rows={report.rows} imported={report.imported} invalid={report.invalid} "
+          f"skipped={report.skipped} ({report.rows_per_sec:.0f} rows/s)", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a CSV/JSONL product catalog into Firestore.")
+    parser.add_argument('--store-id', required=True, help='Target store id')
+    parser.add_argument('--file', required=True, help='Path to the .csv or .jsonl catalog')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format (default: from the extension)')
+    parser.add_argument('--checkpoint', required=False, help='Checkpoint file used to resume an interrupted import')
+    parser.add_argument('--user', default='system', help='User recorded on the initial movements')
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.file)
+    if not os.path.exists(path):
+        print(f"Catalog file not found: {path}")
+        sys.exit(2)
+    fmt = args.format or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+
+    print(f"Importing {fmt} catalog into store: {args.store_id}")
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        report = import_products(args.store_id, iter_rows(f, fmt), user_email=args.user,
+                                 checkpoint_path=args.checkpoint, on_progress=print_progress)
+
+    print(f"Done in {report.elapsed:.1f}s: {report.imported} imported, {report.invalid} invalid, "
+          f"{report.skipped} skipped (already imported), {report.failed_writes} failed writes.")
+    for err in report.errors:
+        print(f"  - {err}")
+    sys.exit(3 if report.failed_writes else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Migrate `inventory` documents with auto-generated ids to deterministic ids.
+
+New code keys inventory entries as `{store_id}__{product_id}` (see
+`modules.products.inventory_doc_id`) so stock changes need no query. This script
+moves legacy auto-id documents to their deterministic id. If a product already
+has a deterministic document (written by the new code before the migration ran),
+the quantities are added together, which matches what the app shows meanwhile.
+
+Usage example (from the project root):
+  python -m tools.migrate_inventory_ids --dry-run
+  python -m tools.migrate_inventory_ids --store-id STORE123
+
+Writes are committed in batches of at most 500 operations.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Dict, List
+
+try:
+    from firebase_config import firestore, get_firestore_client
+    from modules.products import inventory_doc_id
+except Exception as e:  # pragma: no cover - friendly error for missing firebase/config
+    print("Error importing project utilities. Make sure you run this from the project root and you have Python path configured.")
+    print("Import error:", e)
+    raise
+
+BATCH_LIMIT = 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inventory docs to deterministic {store_id}__{product_id} ids.")
+    parser.add_argument('--store-id', required=False, help='Only migrate this store (default: all stores)')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    args = parser.parse_args()
+
+    db = get_firestore_client()
+    query = db.collection('inventory')
+    if args.store_id:
+        query = query.where('store_id', '==', args.store_id)
+
+    # Group legacy docs by their target id
+    legacy: Dict[str, List] = {}
+    for snap in query.stream():
+        d = snap.to_dict()
+        if not d.get('store_id') or not d.get('product_id'):
+            print(f"Skipping malformed inventory doc {snap.id}")
+            continue
+        target = inventory_doc_id(d['store_id'], d['product_id'])
+        if snap.id != target:
+            legacy.setdefault(target, []).append(snap)
+
+    print(f"Legacy inventory entries to migrate: {len(legacy)}")
+    if args.dry_run or not legacy:
+        sys.exit(0)
+
+    batch = db.batch()
+    ops = 0
+    migrated = 0
+    for target, snaps in legacy.items():
+        if len(snaps) > 1:
+            print(f"Warning: {len(snaps)} legacy docs for {target}; quantities will be added")
+        first = snaps[0].to_dict()
+        total = sum(int(s.to_dict().get('quantity', 0)) for s in snaps)
+        # One write for the target plus one delete per legacy doc
+        if ops + 1 + len(snaps) > BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            ops = 0
+        batch.set(db.collection('inventory').document(target), {
+            'product_id': first['product_id'],
+            'store_id': first['store_id'],
+            'quantity': firestore.Increment(total),
+            'updated_at': firestore.SERVER_TIMESTAMP,
+        }, merge=True)
+        for s in snaps:
+            batch.delete(s.reference)
+        ops += 1 + len(snaps)
+        migrated += 1
+    if ops:
+        batch.commit()
+
+    print(f"Migrated {migrated} inventory entries.")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
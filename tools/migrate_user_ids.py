@@ -0,0 +1,97 @@
+"""Migrate `users` documents with auto-generated ids to email-keyed ids.
+
+New code keys users as `users/{normalized email}` (see
+`modules.autenticacion.user_doc_id`) so login is a single document read. This
+script moves legacy auto-id documents to their email id, lower-casing the stored
+email and keeping the old id in `legacy_uid`. If an email already has an
+email-keyed document (for example a duplicate registration), the legacy document is
+reported and left untouched. `stores.owner_email` is lower-cased too, since owners
+are matched to their stores by the email stored in the user document. After
+migrating, set APP_LEGACY_USER_LOOKUP=0 to stop the fallback query on unknown emails.
+
+Usage example (from the project root):
+  python -m tools.migrate_user_ids --dry-run
+  python -m tools.migrate_user_ids
+
+Writes are committed in batches of at most 500 operations.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+try:
+    from firebase_config import get_firestore_client
+    from modules.autenticacion import normalize_email, user_doc_id
+except Exception as e:  # pragma: no cover - friendly error for missing firebase/config
+    print("Error importing project utilities. Make sure you run this from the project root and you have Python path configured.")
+    print("Import error:", e)
+    raise
+
+BATCH_LIMIT = 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move user docs to email-keyed users/{email} ids.")
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    args = parser.parse_args()
+
+    db = get_firestore_client()
+    users = db.collection('users')
+
+    snaps = list(users.stream())
+    existing = {snap.id for snap in snaps}
+    moves = []
+    conflicts = 0
+    for snap in snaps:
+        d = snap.to_dict()
+        if not d.get('email'):
+            print(f"Skipping user doc {snap.id} without email")
+            continue
+        target = user_doc_id(d['email'])
+        if snap.id == target:
+            continue
+        if target in existing:
+            conflicts += 1
+            print(f"Conflict: {snap.id} ({d['email']}) already has an email-keyed document; left as is")
+            continue
+        existing.add(target)
+        moves.append((snap, target))
+
+    stores = []
+    for snap in db.collection('stores').stream():
+        owner_email = snap.to_dict().get('owner_email')
+        if owner_email and owner_email != normalize_email(owner_email):
+            stores.append((snap.reference, normalize_email(owner_email)))
+
+    print(f"Legacy users to migrate: {len(moves)}; conflicts: {conflicts}; store owner emails to normalize: {len(stores)}")
+    if args.dry_run or not (moves or stores):
+        sys.exit(1 if conflicts else 0)
+
+    batch = db.batch()
+    ops = 0
+    for snap, target in moves:
+        d = snap.to_dict()
+        batch.create(users.document(target), {**d, 'email': normalize_email(d['email']), 'legacy_uid': snap.id})
+        batch.delete(snap.reference)
+        ops += 2
+        if ops + 2 > BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            ops = 0
+    for ref, owner_email in stores:
+        batch.update(ref, {'owner_email': owner_email})
+        ops += 1
+        if ops >= BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            ops = 0
+    if ops:
+        batch.commit()
+
+    print("Users migrated.")
+    sys.exit(1 if conflicts else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Rebuild the `sku_index` collection from `products`.
+
+`get_product_by_sku` resolves a barcode scan with a single read of
+`sku_index/{store_id}:{sku}` (see `modules.products.sku_index_id`). Products created
+before the index existed have no entry; this script writes one for every product
+and reports SKUs that are used by more than one product in the same store. For a
+duplicated SKU the index keeps the oldest product; rename the others and run the
+script again. Index entries whose product no longer exists are deleted.
+
+Usage example (from the project root):
+  python -m tools.rebuild_sku_index --dry-run
+  python -m tools.rebuild_sku_index --store-id STORE123
+
+Writes are committed in batches of at most 500 operations.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Dict, List, Tuple
+
+try:
+    from firebase_config import get_firestore_client
+    from modules.products import BATCH_LIMIT, normalize_sku, sku_index_entry, sku_index_id
+except Exception as e:  # pragma: no cover - friendly error for missing firebase/config
+    print("Error importing project utilities. Make sure you run this from the project root and you have Python path configured.")
+    print("Import error:", e)
+    raise
+
+
+def _created(snap) -> float:
+    created = snap.to_dict().get('created_at')
+    return created.timestamp() if hasattr(created, 'timestamp') else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild sku_index/{store_id}:{sku} entries from products.")
+    parser.add_argument('--store-id', required=False, help='Only rebuild this store (default: all stores)')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    args = parser.parse_args()
+
+    db = get_firestore_client()
+    products = db.collection('products')
+    index = db.collection('sku_index')
+    if args.store_id:
+        products = products.where('store_id', '==', args.store_id)
+        index = index.where('store_id', '==', args.store_id)
+
+    by_key: Dict[Tuple[str, str], List] = {}
+    skipped = 0
+    for snap in products.stream():
+        d = snap.to_dict()
+        sku = normalize_sku(d.get('sku'))
+        if not d.get('store_id') or not sku:
+            skipped += 1
+            continue
+        by_key.setdefault((d['store_id'], sku), []).append(snap)
+
+    duplicates = {key: snaps for key, snaps in by_key.items() if len(snaps) > 1}
+    for (store_id, sku), snaps in sorted(duplicates.items()):
+        ids = ', '.join(s.id for s in sorted(snaps, key=_created))
+        print(f"Duplicate SKU {sku!r} in store {store_id}: {ids} (keeping the first)")
+
+    wanted = {sku_index_id(store_id, sku): min(snaps, key=_created) for (store_id, sku), snaps in by_key.items()}
+    stale = [snap.reference for snap in index.stream() if snap.id not in wanted]
+
+    print(f"Products without SKU/store skipped: {skipped}")
+    print(f"Index entries to write: {len(wanted)}; stale entries to delete: {len(stale)}; duplicate SKUs: {len(duplicates)}")
+    if args.dry_run:
+        sys.exit(0)
+
+    batch = db.batch()
+    ops = 0
+    for doc_id, snap in wanted.items():
+        batch.set(db.collection('sku_index').document(doc_id), sku_index_entry(snap.id, snap.to_dict()))
+        ops += 1
+        if ops >= BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            ops = 0
+    for ref in stale:
+        batch.delete(ref)
+        ops += 1
+        if ops >= BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            ops = 0
+    if ops:
+        batch.commit()
+
+    print("SKU index rebuilt.")
+    sys.exit(1 if duplicates else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Recompute `store_stats/{store_id}` from products, inventory and employees.
+
+The owner summary reads one `store_stats` document per store plus its
+`deltas` subcollection, where every product, stock, sale and employee write adds
+its `Increment` (see `modules.stats`). `low_stock_count` is adjusted from the previous quantity each
+writer reads from the inventory entries it writes; it can drift under concurrent
+adjustments and is not adjusted for sharded stock counters or legacy auto-id
+inventory entries. Writes made by older app versions never touched the document;
+this script rebuilds the counters from the source collections and prints the
+differences against what was stored.
+
+Usage example (from the project root):
+  python -m tools.recompute_store_stats --dry-run
+  python -m tools.recompute_store_stats --store-id STORE123
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+try:
+    from firebase_config import get_firestore_client
+    from modules.stats import FIELDS, compute_store_stats, read_store_stats, write_store_stats
+except Exception as e:  # pragma: no cover - friendly error for missing firebase/config
+    print("Error importing project utilities. Make sure you run this from the project root and you have Python path configured.")
+    print("Import error:", e)
+    raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute store_stats/{store_id} summary documents.")
+    parser.add_argument('--store-id', required=False, help='Only recompute this store (default: all stores)')
+    parser.add_argument('--dry-run', action='store_true', help='Report the differences without writing')
+    args = parser.parse_args()
+
+    db = get_firestore_client()
+    store_ids = [args.store_id] if args.store_id else [snap.id for snap in db.collection('stores').stream()]
+
+    drifted = 0
+    for store_id in store_ids:
+        stored = read_store_stats(store_id) or {}
+        stats = compute_store_stats(store_id)
+        diffs = [f"{field} {stored.get(field)!r} -> {stats[field]!r}" for field in FIELDS if stored.get(field) != stats[field]]
+        if diffs:
+            drifted += 1
+            print(f"Store {store_id}: " + ", ".join(diffs))
+        if not args.dry_run:
+            write_store_stats(store_id, stats)
+
+    print(f"Stores checked: {len(store_ids)}; with differences: {drifted}")
+    if not args.dry_run:
+        print("Store summaries recomputed.")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Compact `movements` into daily `movement_rollups` buckets.
+
+Each bucket (`{store_id}:{product_id}:{YYYY-MM-DD}`) holds the net change, units in,
+units out and movement count for one product and day, in total and per reason.
+Processing resumes from the high-water mark in `rollup_state/{store_id}`; each page
+of movements and the mark advance in the same transaction, so the script can be
+interrupted and re-run at any time (e.g. from cron every few minutes). Sales
+reports also roll up a few pages before computing (`modules.reports`).
+
+Usage example (from the project root):
+  python -m tools.rollup_movements --dry-run
+  python -m tools.rollup_movements --store-id STORE123
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+try:
+    from firebase_config import get_firestore_client
+    from modules.rollups import get_state, roll_up
+except Exception as e:  # pragma: no cover - friendly error for missing firebase/config
+    print("Error importing project utilities. Make sure you run this from the project root and you have Python path configured.")
+    print("Import error:", e)
+    raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up movements into daily per-product buckets.")
+    parser.add_argument('--store-id', required=False, help='Only roll up this store (default: all stores)')
+    parser.add_argument('--max-pages', type=int, default=None, help='Stop each store after this many pages')
+    parser.add_argument('--dry-run', action='store_true', help='Show the current high-water marks without writing')
+    args = parser.parse_args()
+
+    db = get_firestore_client()
+    store_ids = [args.store_id] if args.store_id else [snap.id for snap in db.collection('stores').stream()]
+
+    total = 0
+    for store_id in store_ids:
+        state = get_state(store_id)
+        if args.dry_run:
+            print(f"Store {store_id}: high-water mark {state.get('last_timestamp') or 'none'}")
+            continue
+        started = time.perf_counter()
+        processed = roll_up(store_id, max_pages=args.max_pages)
+        total += processed
+        print(f"Store {store_id}: {processed} movements rolled up in {time.perf_counter() - started:.1f}s "
+              f"(mark now {get_state(store_id).get('last_timestamp') or 'none'})")
+
+    if not args.dry_run:
+        print(f"Movements rolled up: {total}")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,9 @@
 Usage example:
   python tools\set_store_theme.py --store-id STORE123 --logo-path "C:\\Users\\Biblio\\Documents\\logo.jpg" --palette "#212A3E,#59788E,#F28C4F" --dark
 
-This script re-uses `modules.theme.save_theme` so it will use the same storage format as the app.
+This script re-uses `modules.theme.save_theme` so it will use the same storage format as the app:
+the logo is downscaled to a PNG thumbnail (APP_LOGO_MAX_PX, default 320 px) stored in
+`theme_assets/{content hash}`, and `settings/{store_id}` only keeps the hash.
 Make sure your Firebase credentials are available (ServiceAccountKey.json in the project root or
 the env var GOOGLE_APPLICATION_CREDENTIALS / FIREBASE_CREDENTIALS pointing to the JSON key).
 """
@@ -57,7 +59,7 @@ def main():
     print(f"Saving theme for store: {args.store_id}")
     ok = save_theme(args.store_id, palette, args.dark, logo_bytes)
     if ok:
-        print("Theme saved successfully to Firestore (collection 'settings').")
+        print(f"Theme saved successfully to Firestore (collection 'settings'); logo {len(logo_bytes)} bytes before thumbnailing.")
         print("You can now open the app and the store should pick up the logo and palette on login/load.")
         sys.exit(0)
     else: